@@ -0,0 +1,375 @@
+from datetime import datetime
+import database
+import log_writer
+import accessory_ledger
+import gate_registry
+import guest_passes
+import plate_index
+import presence_tracker
+import metrics
+from auth_cache import roster_cache
+
+# Gate used when a request does not name one
+DEFAULT_GATE_ID = gate_registry.DEFAULT_GATE_ID
+
+# Accept plates within one edit (or O/0, I/1, spacing differences) of a registered plate
+FUZZY_PLATE_MATCHING = True
+
+# Refuse a second entry from anyone already recorded as on campus
+ANTI_PASSBACK = True
+
+# Reason given for any request refused because the gate is locked down
+LOCKDOWN_REASON = "The gate is currently on lockdown. Access denied."
+
+# Largest number of values bound in one IN (...) query when loading a snapshot
+IN_CHUNK_SIZE = 500
+
+# Lookups made on a roster cache miss
+USER_EXISTS_SQL = {
+    'student': "SELECT * FROM Student WHERE student_id = ?",
+    'staff': "SELECT * FROM Staff WHERE staff_id = ?",
+}
+VEHICLE_ID_SQL = "SELECT vehicle_id FROM Vehicle WHERE license_plate = ?"
+ACCESSORY_EXISTS_SQL = "SELECT * FROM Accessories WHERE type = ?"
+
+# Guest lookups by name: a pass valid right now, or the latest pass whatever its state
+GUEST_FIELDS = ('guest_id', 'name', 'contact', 'id_number', 'age', 'office_visiting', 'person_visiting')
+ACTIVE_GUEST_SQL = f"""
+    SELECT {', '.join(GUEST_FIELDS)}
+    FROM Guests WHERE LOWER(name) = LOWER(?) AND expired = 0 AND valid_from <= ? AND valid_until > ?
+    ORDER BY valid_from DESC LIMIT 1
+"""
+LATEST_GUEST_SQL = f"""
+    SELECT {', '.join(GUEST_FIELDS)}
+    FROM Guests WHERE LOWER(name) = LOWER(?) ORDER BY guest_id DESC LIMIT 1
+"""
+
+# Snapshot queries; {} is filled with one ? per value by fetch_in
+LOCKED_GATES_SQL = "SELECT gate_id FROM Gate_Status WHERE is_locked_down"
+SNAPSHOT_STUDENTS_SQL = "SELECT student_id FROM Student WHERE student_id IN ({})"
+SNAPSHOT_STAFF_SQL = "SELECT staff_id FROM Staff WHERE staff_id IN ({})"
+SNAPSHOT_VEHICLES_SQL = "SELECT license_plate, vehicle_id FROM Vehicle WHERE license_plate IN ({})"
+ACCESSORY_TYPES_SQL = "SELECT DISTINCT type FROM Accessories WHERE type IN ({})"
+
+# Function to check if the user exists (answered from the roster cache when possible)
+@metrics.instrument('user_exists')
+def user_exists(user_id, user_type):
+    return roster_cache.lookup(('user', user_type, user_id), lambda: query_user_exists(user_id, user_type))
+
+# Direct database check used on a cache miss
+@metrics.instrument('query_user_exists')
+def query_user_exists(user_id, user_type):
+    if user_type not in USER_EXISTS_SQL:
+        return False
+    return database.fetch_one(USER_EXISTS_SQL[user_type], (user_id,)) is not None
+
+# Look up the vehicle_id for a plate (None if the vehicle is not registered).
+# Plates that do not match exactly go through the OCR-tolerant plate index.
+@metrics.instrument('find_vehicle')
+def find_vehicle(license_plate):
+    vehicle_id = roster_cache.lookup(('vehicle', license_plate), lambda: query_vehicle_id(license_plate))
+    if vehicle_id is None and FUZZY_PLATE_MATCHING:
+        vehicle_id = plate_index.shared_index().find_unique(license_plate)
+    return vehicle_id
+
+# Direct database lookup used on a cache miss
+@metrics.instrument('query_vehicle_id')
+def query_vehicle_id(license_plate):
+    result = database.fetch_one(VEHICLE_ID_SQL, (license_plate,))
+    return result[0] if result else None
+
+# Function to check if the vehicle exists
+@metrics.instrument('vehicle_exists')
+def vehicle_exists(license_plate):
+    return find_vehicle(license_plate) is not None
+
+# Function to check if the accessory exists (answered from the roster cache when possible)
+@metrics.instrument('accessory_exists')
+def accessory_exists(accessory_type):
+    return roster_cache.lookup(('accessory', accessory_type), lambda: query_accessory_exists(accessory_type))
+
+# Direct database check used on a cache miss
+@metrics.instrument('query_accessory_exists')
+def query_accessory_exists(accessory_type):
+    result = database.fetch_one(ACCESSORY_EXISTS_SQL, (accessory_type,))
+    return result is not None
+
+# Accessory types in the list that are not registered, checked in one query (answered from
+# the roster cache when the same set was checked before)
+@metrics.instrument('missing_accessories')
+def missing_accessories(accessory_types):
+    accessory_types = tuple(sorted(set(accessory_types)))
+    if not accessory_types:
+        return frozenset()
+    return roster_cache.lookup(('accessories', accessory_types), lambda: query_missing_accessories(accessory_types))
+
+# Direct database check used on a cache miss
+@metrics.instrument('query_missing_accessories')
+def query_missing_accessories(accessory_types):
+    found = {row[0] for row in fetch_in(database.get_connection(), ACCESSORY_TYPES_SQL, accessory_types)}
+    return frozenset(accessory_types) - found
+
+# Get the lockdown flag for a gate from the cached gate registry
+@metrics.instrument('is_gate_locked_down')
+def is_gate_locked_down(gate_id=DEFAULT_GATE_ID):
+    return gate_registry.registry.is_locked_down(gate_id)
+
+# Find a guest by name (case-insensitive). By default only a pass valid right now matches,
+# read from the partial index over unexpired passes, so the cost does not grow with past
+# visitors. With active_only=False the latest pass matches whatever its state (a guest
+# whose pass ran out while on campus can still leave).
+@metrics.instrument('find_guest')
+def find_guest(name, active_only=True):
+    if active_only:
+        now = datetime.now().isoformat(timespec='seconds')
+        result = database.fetch_one(ACTIVE_GUEST_SQL, (name, now, now))
+    else:
+        result = database.fetch_one(LATEST_GUEST_SQL, (name,))
+    if result is None:
+        return None
+    guest = dict(zip(GUEST_FIELDS, result))
+    guest['type'] = 'guest'
+    return guest
+
+# Roster answered live, through the cache, one lookup at a time
+class LiveRoster:
+    def is_locked_down(self, gate_id):
+        return is_gate_locked_down(gate_id)
+
+    def user_exists(self, user_type, user_id):
+        return user_exists(user_id, user_type)
+
+    def find_vehicle(self, license_plate):
+        return find_vehicle(license_plate)
+
+    def accessory_exists(self, accessory_type):
+        return accessory_exists(accessory_type)
+
+    def missing_accessories(self, accessory_types):
+        return missing_accessories(accessory_types)
+
+    def passback_violation(self, person_type, person_id, direction):
+        return presence_tracker.shared_tracker().passback_violation(person_type, person_id, direction)
+
+# Roster and lockdown state frozen at one moment, loaded in bulk for a batch of requests.
+# Admissions decided earlier in the batch are held here (not in the shared presence tracker,
+# which only hears about them once they are committed) so a second entry is still refused.
+class RosterSnapshot:
+    def __init__(self, locked_gates, students, staff, vehicles, accessory_types):
+        self.locked_gates = locked_gates
+        self.students = students
+        self.staff = staff
+        self.vehicles = vehicles
+        self.accessory_types = accessory_types
+        self.batch_actions = {}
+
+    # Load only the IDs, plates and accessory types the requests mention
+    @classmethod
+    def load(cls, requests):
+        student_ids = {str(r.get('id')) for r in requests if r.get('type') == 'student'}
+        staff_ids = {str(r.get('id')) for r in requests if r.get('type') == 'staff'}
+        plates = {r['license_plate'] for r in requests if r.get('license_plate')}
+        accessory_types = {a for r in requests for a in r.get('accessories', ())}
+
+        # Read everything from one snapshot so the answers agree with each other
+        with database.read_transaction() as conn:
+            locked_gates = {row[0] for row in conn.execute(LOCKED_GATES_SQL)}
+            students = {str(row[0]) for row in fetch_in(conn, SNAPSHOT_STUDENTS_SQL, student_ids)}
+            staff = {str(row[0]) for row in fetch_in(conn, SNAPSHOT_STAFF_SQL, staff_ids)}
+            vehicles = {row[0]: row[1] for row in fetch_in(conn, SNAPSHOT_VEHICLES_SQL, plates)}
+            types = {row[0] for row in fetch_in(conn, ACCESSORY_TYPES_SQL, accessory_types)}
+        return cls(locked_gates, students, staff, vehicles, types)
+
+    def is_locked_down(self, gate_id):
+        return gate_id in self.locked_gates
+
+    def user_exists(self, user_type, user_id):
+        if user_type == 'student':
+            return str(user_id) in self.students
+        if user_type == 'staff':
+            return str(user_id) in self.staff
+        return False
+
+    def find_vehicle(self, license_plate):
+        vehicle_id = self.vehicles.get(license_plate)
+        if vehicle_id is None and FUZZY_PLATE_MATCHING:
+            vehicle_id = plate_index.shared_index().find_unique(license_plate)
+        return vehicle_id
+
+    def accessory_exists(self, accessory_type):
+        return accessory_type in self.accessory_types
+
+    def missing_accessories(self, accessory_types):
+        return set(accessory_types) - self.accessory_types
+
+    # Note an allowed decision made earlier in the batch
+    def note_admission(self, decision):
+        row = decision['log']
+        person = presence_tracker.person_of(row[1], row[2], row[9])
+        if person is not None:
+            self.batch_actions[person] = row[5]
+
+    def passback_violation(self, person_type, person_id, direction):
+        action = self.batch_actions.get((person_type, str(person_id)))
+        if action is None:
+            return presence_tracker.shared_tracker().passback_violation(person_type, person_id, direction)
+        if action == 'enter' and direction == 'enter':
+            return presence_tracker.PASSBACK_REASON
+        return None
+
+# Run an IN (...) query over a set of values, a chunk at a time
+def fetch_in(conn, sql, values):
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        chunk = values[start:start + IN_CHUNK_SIZE]
+        rows.extend(conn.execute(sql.format(', '.join('?' * len(chunk))), chunk).fetchall())
+    return rows
+
+LIVE_ROSTER = LiveRoster()
+
+# Build the Logs row for an access event
+def build_log_row(person, action, gate_id=DEFAULT_GATE_ID, accessories='', vehicle_id=None):
+    person_type = person.get('type')
+    return (
+        datetime.now().isoformat(),
+        person.get('id') if person_type == 'student' else None,
+        person.get('id') if person_type == 'staff' else None,
+        person.get('name'),
+        person.get('email') or '',
+        action,
+        gate_id,
+        accessories,
+        vehicle_id,
+        person.get('guest_id') if person_type == 'guest' else None,
+    )
+
+# Items carried through the gate: the request's 'manifest' ({'type', 'description', 'quantity'}
+# per item) or one of each type listed in 'accessories'
+def manifest_of(request):
+    return request.get('manifest') or [{'type': accessory_type, 'quantity': 1} for accessory_type in request.get('accessories', ())]
+
+def _decision(allowed, reason, request, vehicle_id=None):
+    gate_id = request.get('gate_id', DEFAULT_GATE_ID)
+    accessories = ', '.join(request.get('accessories', ()))
+    action = request.get('direction', 'enter') if allowed else 'denied'
+    return {
+        'allowed': allowed,
+        'reason': reason,
+        'log': build_log_row(request, action, gate_id, accessories, vehicle_id),
+        'manifest': manifest_of(request) if allowed else [],
+    }
+
+# Decide whether a student or staff member may enter.
+# request: {'type', 'id', 'name', 'email', 'gate_id', 'direction', 'license_plate', 'accessories': [types]}
+# where direction is 'enter' (the default) or 'exit'.
+# Returns {'allowed', 'reason', 'log'} where 'log' is the Logs row for this decision.
+def evaluate_access(request, roster=LIVE_ROSTER):
+    user_type = request.get('type')
+    gate_id = request.get('gate_id', DEFAULT_GATE_ID)
+
+    if user_type not in ('student', 'staff'):
+        return _decision(False, "Only students and staff members are allowed to access.", request)
+    if not roster.user_exists(user_type, request.get('id')):
+        return _decision(False, f"{user_type.capitalize()} ID not found in the database. Access denied.", request)
+    if roster.is_locked_down(gate_id):
+        return _decision(False, LOCKDOWN_REASON, request)
+    direction = request.get('direction', 'enter')
+    if ANTI_PASSBACK:
+        violation = roster.passback_violation(user_type, request.get('id'), direction)
+        if violation:
+            return _decision(False, violation, request)
+
+    vehicle_id = None
+    license_plate = request.get('license_plate')
+    if license_plate:
+        vehicle_id = roster.find_vehicle(license_plate)
+        if vehicle_id is None:
+            return _decision(False, "Vehicle not registered. Access denied.", request)
+
+    missing = roster.missing_accessories(request.get('accessories', ()))
+    for accessory_type in request.get('accessories', ()):
+        if accessory_type in missing:
+            return _decision(False, f"Accessory '{accessory_type}' not found. Access denied.", request)
+
+    if direction == 'exit':
+        return _decision(True, f"Exit recorded for {request.get('name')}. The gate is now open.", request, vehicle_id)
+    return _decision(True, f"Access Granted to {request.get('name')}. The gate is now open.", request, vehicle_id)
+
+# Why a guest's recorded age cannot decide the ID check (None when it can)
+def guest_age_problem(guest):
+    age = guest['age']
+    if not isinstance(age, int) or age < 0:
+        return "Guest pass has no valid age on record. Please contact administration."
+    return None
+
+# Whether a guest must present an ID number to enter (a pass with no valid age is refused instead)
+def guest_needs_id(guest):
+    return guest_age_problem(guest) is None and guest['age'] >= guest_passes.ADULT_AGE
+
+# Decide whether a registered guest may enter (adults must present a matching ID number) or leave
+def evaluate_guest_access(guest, id_number=None, gate_id=DEFAULT_GATE_ID, roster=LIVE_ROSTER, direction='enter'):
+    request = dict(guest, type='guest', gate_id=gate_id, direction=direction)
+    problem = guest_age_problem(guest) if direction == 'enter' else None
+    if problem:
+        return _decision(False, problem, request)
+    if direction == 'enter' and guest_needs_id(guest):
+        if not id_number:
+            return _decision(False, f"ID Number is required for guests {guest_passes.ADULT_AGE} and above.", request)
+        if id_number != guest['id_number']:
+            return _decision(False, "ID Number does not match. Access denied.", request)
+    if roster.is_locked_down(gate_id):
+        return _decision(False, LOCKDOWN_REASON, request)
+    if ANTI_PASSBACK:
+        violation = roster.passback_violation('guest', guest['guest_id'], direction)
+        if violation:
+            return _decision(False, violation, request)
+    if direction == 'exit':
+        return _decision(True, f"Exit recorded for {guest['name']}. The gate is now open.", request)
+    return _decision(True, f"Access Granted to {guest['name']}. The gate is now open.", request)
+
+# Decision for a request whose evaluation raised; nothing is logged for it and the
+# error is kept so the caller can report it to whoever sent the request
+def failed_decision(error):
+    return {'allowed': False, 'reason': f"Could not decide this request: {error}", 'log': None, 'manifest': [], 'error': error}
+
+# Decide a batch of requests against one snapshot of lockdown state and roster.
+# A request that raises gets a failed decision without affecting the others.
+def evaluate_batch(requests):
+    snapshot = RosterSnapshot.load(requests)
+    decisions = []
+    for request in requests:
+        try:
+            decisions.append(evaluate_access(request, snapshot))
+        except Exception as error:
+            decisions.append(failed_decision(error))
+    return decisions
+
+# Write one Logs row (queued for the background writer when buffered logging is on)
+@metrics.instrument('log_access')
+def write_log(row):
+    writer = log_writer.get_writer()
+    if writer is not None:
+        writer.submit(row)
+    else:
+        database.execute(log_writer.LOG_INSERT_SQL, row)
+    presence_tracker.notify_logged([row])
+
+# Write the log rows of several decisions, each with its accessory manifest: queued in order
+# on the buffered writer when it is on, otherwise in one transaction
+@metrics.instrument('record_decisions')
+def record_decisions(decisions):
+    writer = log_writer.get_writer()
+    if writer is not None:
+        for decision in decisions:
+            writer.submit(decision['log'], decision.get('manifest'))
+    elif decisions:
+        accessory_ledger.write_decisions(decisions)
+    presence_tracker.notify_logged([decision['log'] for decision in decisions])
+
+# Write the log row of a decision (and its accessory manifest)
+def record_decision(decision):
+    if decision.get('manifest'):
+        record_decisions([decision])
+    else:
+        write_log(decision['log'])
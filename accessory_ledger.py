@@ -0,0 +1,90 @@
+import argparse
+import database
+import log_writer
+from presence_tracker import PERSON_COLUMNS, person_of
+
+MANIFEST_INSERT_SQL = "INSERT INTO Accessory_Manifest (log_id, type, description, quantity) VALUES (?, ?, ?, ?)"
+
+# The person's most recent entry; walks their Logs index backwards from the newest row
+LAST_ENTRY_SQL = "SELECT log_id FROM Logs WHERE {column} = ? AND action = 'enter' ORDER BY log_id DESC LIMIT 1"
+
+CARRIED_IN_SQL = "SELECT type, SUM(quantity) FROM Accessory_Manifest WHERE log_id = ? GROUP BY type"
+
+# Manifest rows for one gate event. Items are {'type', 'description', 'quantity'}.
+def manifest_rows(log_id, manifest):
+    return [(log_id, item['type'], item.get('description'), item.get('quantity') or 1) for item in manifest]
+
+# Insert (Logs row, manifest) pairs on an open transaction. A manifest needs its event's
+# log_id, so rows are inserted one at a time when any pair carries items.
+def write_logs(conn, entries):
+    if not any(manifest for _, manifest in entries):
+        conn.executemany(log_writer.LOG_INSERT_SQL, [row for row, _ in entries])
+        return
+    for row, manifest in entries:
+        log_id = conn.execute(log_writer.LOG_INSERT_SQL, row).lastrowid
+        if manifest:
+            conn.executemany(MANIFEST_INSERT_SQL, manifest_rows(log_id, manifest))
+
+# Write decisions' log rows and accessory manifests in one transaction
+def write_decisions(decisions):
+    with database.transaction() as conn:
+        write_logs(conn, [(decision['log'], decision.get('manifest')) for decision in decisions])
+
+# Total quantity per accessory type
+def quantities(manifest):
+    totals = {}
+    for item in manifest:
+        totals[item['type']] = totals.get(item['type'], 0) + (item.get('quantity') or 1)
+    return totals
+
+# Compare what a person is carrying out ({type: quantity}) with the manifest of their last entry.
+# Returns None when they have no recorded entry, otherwise
+# {'entry_log_id', 'left_behind': {type: quantity}, 'not_brought_in': {type: quantity}}.
+def reconcile(person_type, person_id, carried_out):
+    column = dict(PERSON_COLUMNS)[person_type]
+    with database.transaction() as conn:
+        entry = conn.execute(LAST_ENTRY_SQL.format(column=column), (person_id,)).fetchone()
+        if entry is None:
+            return None
+        carried_in = dict(conn.execute(CARRIED_IN_SQL, (entry[0],)).fetchall())
+    left_behind = {item: count - carried_out.get(item, 0) for item, count in carried_in.items() if count > carried_out.get(item, 0)}
+    not_brought_in = {item: count - carried_in.get(item, 0) for item, count in carried_out.items() if count > carried_in.get(item, 0)}
+    return {'entry_log_id': entry[0], 'left_behind': left_behind, 'not_brought_in': not_brought_in}
+
+# Reconcile an allowed exit decision against the person's last entry (None if there is none)
+def reconcile_exit(decision):
+    row = decision['log']
+    person = person_of(row[1], row[2], row[9])
+    if person is None:
+        return None
+    return reconcile(person[0], person[1], quantities(decision.get('manifest') or ()))
+
+# One line for the guard at the exit
+def describe(reconciliation):
+    if reconciliation is None:
+        return "No entry on record to check accessories against."
+    parts = []
+    for key, label in (('not_brought_in', "Not brought in"), ('left_behind', "Brought in but not carried out")):
+        if reconciliation[key]:
+            parts.append(f"{label}: " + ', '.join(f"{item} x{count}" for item, count in sorted(reconciliation[key].items())))
+    return '. '.join(parts) + '.' if parts else "Accessories match what was brought in."
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show what a person brought in on their last entry and what is still to be carried out.")
+    parser.add_argument('person_type', choices=[person_type for person_type, _ in PERSON_COLUMNS])
+    parser.add_argument('person_id')
+    parser.add_argument('--carrying', action='append', default=[], metavar='TYPE[=QUANTITY]', help="an item being carried out")
+    parser.add_argument('--db', help="database file (default SMART_GATE_DB or smart_gate_management.db)")
+    args = parser.parse_args()
+
+    if args.db:
+        database.set_database_path(args.db)
+    carried_out = {}
+    for item in args.carrying:
+        item_type, _, count = item.partition('=')
+        carried_out[item_type] = carried_out.get(item_type, 0) + int(count or 1)
+    reconciliation = reconcile(args.person_type, args.person_id, carried_out)
+    if reconciliation is not None:
+        for item_type, count in database.fetch_all(CARRIED_IN_SQL, (reconciliation['entry_log_id'],)):
+            print(f"brought in: {item_type} x{count}")
+    print(describe(reconciliation))
@@ -1,156 +1,178 @@
 import tkinter as tk
-from tkinter import messagebox, simpledialog
-import sqlite3
+from tkinter import messagebox, simpledialog, filedialog
 from datetime import datetime
-
-# Initialize the database with the required tables
+import database
+import migrations
+import anomaly_detector
+import auth_cache
+import log_browser
+import log_search
+import gate_registry
+import guest_passes
+import plate_index
+import traffic_rollups
+import presence_tracker
+import roster_import
+import metrics
+import ui_worker
+
+# Create or upgrade the database schema (a no-op when it is already current)
 def initialize_database():
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-
-        # Create Gate_Status table
-        cursor.execute('''CREATE TABLE IF NOT EXISTS Gate_Status (
-                            gate_id INTEGER PRIMARY KEY,
-                            gate_name TEXT NOT NULL,
-                            status TEXT NOT NULL,
-                            is_locked_down INTEGER DEFAULT 0
-                        )''')
-
-        # Create Logs table
-        cursor.execute('''CREATE TABLE IF NOT EXISTS Logs (
-                            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            timestamp TEXT NOT NULL,
-                            student_id INTEGER,
-                            staff_id INTEGER,
-                            user_name TEXT NOT NULL,
-                            email TEXT NOT NULL,
-                            action TEXT NOT NULL,
-                            gate_id INTEGER,
-                            accessories TEXT,
-                            vehicle_id INTEGER,
-                            guest_id INTEGER,
-                            FOREIGN KEY (student_id) REFERENCES Student(student_id),
-                            FOREIGN KEY (staff_id) REFERENCES Staff(staff_id),
-                            FOREIGN KEY (gate_id) REFERENCES Gate_Status(gate_id),
-                            FOREIGN KEY (guest_id) REFERENCES Guests(guest_id)
-                        )''')
-
-        # Create Guests table
-        cursor.execute('''CREATE TABLE IF NOT EXISTS Guests (
-                            guest_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            name TEXT NOT NULL,
-                            contact TEXT,
-                            id_number TEXT,
-                            age INTEGER CHECK(age >= 0),
-                            office_visiting TEXT,
-                            person_visiting TEXT,
-                            entrance_time TEXT NOT NULL
-                        )''')
-
-        # Create Student table
-        cursor.execute('''CREATE TABLE IF NOT EXISTS Student (
-                            student_id INTEGER PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            email TEXT NOT NULL,
-                            contact TEXT,
-                            username TEXT UNIQUE NOT NULL,
-                            password TEXT NOT NULL,
-                            department_id INTEGER,
-                            access_level INTEGER DEFAULT 1,
-                            FOREIGN KEY (department_id) REFERENCES Department(department_id)
-                        )''')
-
-        # Create Staff table
-        cursor.execute('''CREATE TABLE IF NOT EXISTS Staff (
-                            staff_id INTEGER PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            email TEXT NOT NULL,
-                            username TEXT UNIQUE NOT NULL,
-                            password TEXT NOT NULL,
-                            department_id INTEGER,
-                            access_level INTEGER DEFAULT 1,
-                            FOREIGN KEY (department_id) REFERENCES Department(department_id)
-                        )''')
-
-        # Create Vehicle table
-        cursor.execute('''CREATE TABLE IF NOT EXISTS Vehicle (
-                            vehicle_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            make TEXT NOT NULL,
-                            model TEXT NOT NULL,
-                            color TEXT,
-                            license_plate TEXT UNIQUE NOT NULL,
-                            owner_id INTEGER,
-                            owner_type TEXT CHECK(owner_type IN ('Student', 'Staff')),
-                            FOREIGN KEY (owner_id) REFERENCES Student(student_id) ON DELETE CASCADE,
-                            FOREIGN KEY (owner_id) REFERENCES Staff(staff_id) ON DELETE CASCADE
-                        )''')
-
-        # Create Accessories table
-        cursor.execute('''CREATE TABLE IF NOT EXISTS Accessories (
-                            accessory_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            type TEXT NOT NULL,
-                            description TEXT,
-                            quantity INTEGER NOT NULL CHECK(quantity >= 0),
-                            department_id INTEGER,
-                            FOREIGN KEY (department_id) REFERENCES Department(department_id)
-                        )''')
-
-        # Initialize Gate_Status with default value
-        cursor.execute("INSERT OR IGNORE INTO Gate_Status (gate_id, gate_name, status, is_locked_down) VALUES (1, 'Main Gate', 'closed', 0)")
-
-# Initialize the gate status in the database if it doesn't exist
-def initialize_gate_status():
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Gate_Status WHERE gate_id = 1")
-        if cursor.fetchone() is None:
-            cursor.execute("INSERT INTO Gate_Status (gate_id, gate_name, status, is_locked_down) VALUES (1, 'Main Gate', 'closed', 0)")
-        conn.commit()
-
-# Update the gate status in the database
-def update_gate_status(is_locked_down):
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE Gate_Status SET is_locked_down = ?, status = ? WHERE gate_id = 1", (is_locked_down, 'locked' if is_locked_down else 'unlocked'))
-        conn.commit()
-
-# Get the current gate status from the database
-def get_gate_status():
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT is_locked_down FROM Gate_Status WHERE gate_id = 1")
-        result = cursor.fetchone()
-        return result[0] if result else None
-
-# Lockdown the gate
+    migrations.migrate()
+
+# Update the gate status in the database (all gates when gate_id is None)
+def update_gate_status(is_locked_down, gate_id=None):
+    gate_registry.set_lockdown(is_locked_down, gate_id)
+
+# Get the current gate status from the gate registry
+@metrics.instrument('get_gate_status')
+def get_gate_status(gate_id=gate_registry.DEFAULT_GATE_ID):
+    gate = gate_registry.registry.get_gate(gate_id)
+    return gate['is_locked_down'] if gate else None
+
+# Summarise the lockdown state of every gate for the status label
+def describe_gate_status():
+    gates = gate_registry.registry.get_gates()
+    locked = [gate['gate_name'] for gate in gates.values() if gate['is_locked_down']]
+    if len(gates) <= 1:
+        return "Gate is on lockdown" if locked else "Gate is unlocked"
+    if not locked:
+        return "All gates are unlocked"
+    if len(locked) == len(gates):
+        return "All gates are on lockdown"
+    return f"On lockdown: {', '.join(locked)}"
+
+# Label used in the gate picker for "every gate"
+ALL_GATES = "All gates"
+
+# The gate picked in the main window (None means all gates)
+def selected_gate_id():
+    choice = gate_choice_var.get()
+    for gate in gate_registry.registry.get_gates().values():
+        if gate['gate_name'] == choice:
+            return gate['gate_id']
+    return None
+
+# Rebuild the gate picker from the registry
+def refresh_gate_choices():
+    menu = gate_menu['menu']
+    menu.delete(0, 'end')
+    for choice in [ALL_GATES] + [gate['gate_name'] for gate in gate_registry.registry.get_gates().values()]:
+        menu.add_command(label=choice, command=tk._setit(gate_choice_var, choice))
+
+# Lockdown the selected gate (or all gates)
 def lockdown_gate():
-    update_gate_status(True)
-    messagebox.showinfo("Gate Status", "The gate has been locked down.")
-    gate_status_var.set("Gate is on lockdown")
+    gate_id = selected_gate_id()
+    def locked(_):
+        gate_status_var.set(describe_gate_status())
+        messagebox.showinfo("Gate Status", "All gates have been locked down." if gate_id is None else "The gate has been locked down.")
+    ui_worker.submit(update_gate_status, True, gate_id, on_done=locked, description="Locking down...", write=True)
 
-# Unlock the gate
+# Unlock the selected gate (or all gates)
 def unlock_gate():
-    update_gate_status(False)
-    messagebox.showinfo("Gate Status", "The gate has been unlocked.")
-    gate_status_var.set("Gate is unlocked")
-
-# View access logs
+    gate_id = selected_gate_id()
+    def unlocked(_):
+        gate_status_var.set(describe_gate_status())
+        messagebox.showinfo("Gate Status", "All gates have been unlocked." if gate_id is None else "The gate has been unlocked.")
+    ui_worker.submit(update_gate_status, False, gate_id, on_done=unlocked, description="Unlocking...", write=True)
+
+# Add another gate
+def add_gate():
+    gate_name = simpledialog.askstring("Add Gate", "Enter Gate Name:")
+    if not gate_name:
+        return
+    def added(_):
+        refresh_gate_choices()
+        gate_status_var.set(describe_gate_status())
+    ui_worker.submit(gate_registry.add_gate, gate_name, on_done=added, description="Adding gate...", write=True)
+
+# View access logs one page at a time
 def view_access_logs(user_type):
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        if user_type == "verified":
-            cursor.execute("SELECT * FROM Logs WHERE guest_id IS NULL")
-        else:
-            cursor.execute("SELECT * FROM Guests WHERE guest_id IS NOT NULL")
-        logs = cursor.fetchall()
-
-    logs_window = tk.Toplevel()
-    logs_window.title(f"{user_type.capitalize()} User Access Logs")
-    text_area = tk.Text(logs_window, wrap='word')
-    text_area.pack(expand=1, fill='both')
-
-    for log in logs:
-        text_area.insert(tk.END, f"{log}\n")
+    log_browser.LogBrowser(user_type)
+
+# Open the full-text search over access logs and guest records
+def search_logs():
+    log_search.SearchWindow()
+
+# Pre-register event guests from a CSV file (one pass per row, with its validity window)
+def import_event_guests():
+    path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv"), ("All files", "*")])
+    if not path:
+        return
+
+    def import_file():
+        with open(path, newline='') as csv_file:
+            return roster_import.import_csv('guests', csv_file)
+
+    def imported(result):
+        inserted, errors = result
+        message = f"Registered {inserted} guest passes."
+        if errors:
+            message += f"\n{len(errors)} rows rejected, first: line {errors[0][0]}: {errors[0][1]}"
+        messagebox.showinfo("Guests Imported", message)
+
+    ui_worker.submit(import_file, on_done=imported, description="Importing guests...", write=True)
+
+# Open the list of recent anomaly alerts
+def view_alerts():
+    anomaly_detector.AlertWindow()
+
+# Show alerts raised by the gates as they arrive
+def show_new_alerts(rows):
+    alert_id, raised_at, kind, gate_id, person_type, person_id, detail = rows[-1]
+    who = f" {person_type} {person_id}" if person_id is not None else ""
+    alert_var.set(f"{len(rows)} new alert(s). Latest: {kind.replace('_', ' ')} at gate {gate_id}{who} ({raised_at}): {detail}")
+    alert_label.bell()
+
+# Open the traffic report built from the hourly rollup
+def view_traffic_report():
+    traffic_rollups.TrafficReport()
+
+# Show how many students, staff and guests are on campus right now
+def view_occupancy():
+    def show(tracker):
+        counts = ', '.join(f"{person_type}: {tracker.occupancy(person_type)}" for person_type, _ in presence_tracker.PERSON_COLUMNS)
+        messagebox.showinfo("On Campus", f"{tracker.occupancy()} people on campus ({counts})")
+    ui_worker.submit(presence_tracker.shared_tracker, on_done=show, description="Counting people on campus...")
+
+# Insert a student (runs on a database worker thread)
+def insert_student(student_id, name, email, contact, username):
+    with metrics.timed('register_student'), database.transaction() as conn:
+        conn.execute("INSERT INTO Student (student_id, name, email, contact, username, password) VALUES (?, ?, ?, ?, ?, ?)",
+                     (student_id, name, email, contact, username, 'default_password'))
+        auth_cache.bump_roster_version(conn)
+
+# Insert a staff member (runs on a database worker thread)
+def insert_staff(staff_id, name, email, contact, username):
+    with metrics.timed('register_staff'), database.transaction() as conn:
+        conn.execute("INSERT INTO Staff (staff_id, name, email, contact, username, password) VALUES (?, ?, ?, ?, ?, ?)",
+                     (staff_id, name, email, contact, username, 'default_password'))
+        auth_cache.bump_roster_version(conn)
+
+# Insert a vehicle and add it to the plate index (runs on a database worker thread)
+def insert_vehicle(user_id, user_type, make, model, color, license_plate):
+    with metrics.timed('register_vehicle'), database.transaction() as conn:
+        cursor = conn.execute("INSERT INTO Vehicle (owner_id, owner_type, make, model, color, license_plate) VALUES (?, ?, ?, ?, ?, ?)",
+                              (user_id, user_type.capitalize(), make, model, color, license_plate))
+        auth_cache.bump_roster_version(conn)
+    plate_index.notify_vehicle_added(cursor.lastrowid, license_plate)
+
+# Insert an accessory (runs on a database worker thread)
+def insert_accessory(user_id, user_type, accessory_type, description, quantity):
+    with metrics.timed('register_accessory'), database.transaction() as conn:
+        conn.execute("INSERT INTO Accessories (owner_id, owner_type, type, description, quantity) VALUES (?, ?, ?, ?, ?)",
+                     (user_id, user_type.capitalize(), accessory_type, description, quantity))
+        auth_cache.bump_roster_version(conn)
+
+# Insert a guest (runs on a database worker thread)
+def insert_guest(name, contact, id_number, age, office_visiting, person_visiting, pass_hours=guest_passes.DEFAULT_PASS_HOURS):
+    valid_from, valid_until = guest_passes.pass_window(pass_hours)
+    with metrics.timed('register_guest'):
+        database.execute('''INSERT INTO Guests (name, contact, id_number, age, office_visiting, person_visiting, entrance_time,
+                                                valid_from, valid_until)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (name, contact, id_number, age, office_visiting, person_visiting, datetime.now().isoformat(),
+                          valid_from, valid_until))
 
 # Register user and their vehicles and accessories
 def register_user():
@@ -160,41 +182,26 @@ def register_user():
         email = email_entry.get()
         contact = contact_entry.get()
         username = username_entry.get()
-        user_id = None
+        user_id = id_entry.get()
 
         if user_type == 'student':
-            student_id = id_entry.get()
-            if not student_id or not name or not email or not contact or not username:
-                messagebox.showerror("Error", "All fields are required.")
-                return
-            
-            with sqlite3.connect('smart_gate_management.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO Student (student_id, name, email, contact, username, password) VALUES (?, ?, ?, ?, ?, ?)",
-                               (student_id, name, email, contact, username, 'default_password'))
-                conn.commit()
-                user_id = student_id
-        
+            insert_user = insert_student
         elif user_type == 'staff':
-            staff_id = id_entry.get()
-            if not staff_id or not name or not email or not contact or not username:
-                messagebox.showerror("Error", "All fields are required.")
-                return
-            
-            with sqlite3.connect('smart_gate_management.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO Staff (staff_id, name, email, contact, username, password) VALUES (?, ?, ?, ?, ?, ?)",
-                               (staff_id, name, email, contact, username, 'default_password'))
-                conn.commit()
-                user_id = staff_id
-        
+            insert_user = insert_staff
         else:
             messagebox.showerror("Error", "Invalid user type.")
             return
-        
-        if messagebox.askyesno("Register Vehicle and Accessories", f"{user_type.capitalize()} registered successfully. Register vehicle and accessories?"):
-            register_vehicles(user_id, user_type)
-            register_accessories(user_id, user_type)
+
+        if not user_id or not name or not email or not contact or not username:
+            messagebox.showerror("Error", "All fields are required.")
+            return
+
+        def registered(_):
+            if messagebox.askyesno("Register Vehicle and Accessories", f"{user_type.capitalize()} registered successfully. Register vehicle and accessories?"):
+                register_vehicles(user_id, user_type)
+                register_accessories(user_id, user_type)
+
+        ui_worker.submit(insert_user, user_id, name, email, contact, username, on_done=registered, description=f"Registering {user_type}...", write=True)
 
     def register_vehicles(user_id, user_type):
         while True:
@@ -209,11 +216,8 @@ def register_user():
                 messagebox.showerror("Error", "All vehicle details are required.")
                 return None
 
-            with sqlite3.connect('smart_gate_management.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO Vehicle (owner_id, owner_type, make, model, color, license_plate) VALUES (?, ?, ?, ?, ?, ?)",
-                               (user_id, user_type, vehicle_details['make'], vehicle_details['model'], vehicle_details['color'], vehicle_details['license_plate']))
-                conn.commit()
+            ui_worker.submit(insert_vehicle, user_id, user_type, vehicle_details['make'], vehicle_details['model'],
+                             vehicle_details['color'], vehicle_details['license_plate'], write=True)
 
             if not simpledialog.askstring("Add Another Vehicle", "Do you want to add another vehicle? (yes/no):").lower().startswith('y'):
                 break
@@ -230,11 +234,7 @@ def register_user():
                 messagebox.showerror("Error", "All accessory details are required.")
                 return None
 
-            with sqlite3.connect('smart_gate_management.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO Accessories (department_id, type, description, quantity) VALUES (?, ?, ?, ?)",
-                               (user_id, accessory_details['type'], accessory_details['description'], accessory_details['quantity']))
-                conn.commit()
+            ui_worker.submit(insert_accessory, user_id, user_type, accessory_details['type'], accessory_details['description'], accessory_details['quantity'], write=True)
 
             if not simpledialog.askstring("Add Another Accessory", "Do you want to add another accessory? (yes/no):").lower().startswith('y'):
                 break
@@ -276,31 +276,39 @@ def register_guest():
         name = name_entry.get()
         contact = contact_entry.get()
         id_number = id_entry.get()
-        age = int(age_entry.get())
+        try:
+            age = guest_passes.parse_age(age_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Age must be a whole number.")
+            return
         office_visiting = office_entry.get()
         person_visiting = person_entry.get()
+        try:
+            pass_hours = float(hours_entry.get())
+        except ValueError:
+            pass_hours = 0
+        if pass_hours <= 0:
+            messagebox.showerror("Error", "Pass length must be a positive number of hours.")
+            return
 
         if not name or not office_visiting or not person_visiting:
             messagebox.showerror("Error", "Name, office visiting, and person visiting are required.")
             return
         
-        if age >= 18:
+        if age >= guest_passes.ADULT_AGE:
             if not id_number or not contact:
-                messagebox.showerror("Error", "ID number and contact are required for guests above 18.")
+                messagebox.showerror("Error", f"ID number and contact are required for guests {guest_passes.ADULT_AGE} and above.")
                 return
         else:
             id_number = None
             contact = None
 
-        with sqlite3.connect('smart_gate_management.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO Guests (name, contact, id_number, age, office_visiting, person_visiting, entrance_time)
-                              VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                           (name, contact, id_number, age, office_visiting, person_visiting, datetime.now().isoformat()))
-            conn.commit()
+        def registered(_):
+            messagebox.showinfo("Success", "Guest registered successfully.")
+            guest_registration_window.destroy()
 
-        messagebox.showinfo("Success", "Guest registered successfully.")
-        guest_registration_window.destroy()
+        ui_worker.submit(insert_guest, name, contact, id_number, age, office_visiting, person_visiting, pass_hours,
+                         on_done=registered, description="Registering guest...", write=True)
 
     guest_registration_window = tk.Toplevel()
     guest_registration_window.title("Register Guest")
@@ -330,20 +338,37 @@ def register_guest():
     person_entry = tk.Entry(guest_registration_window)
     person_entry.grid(row=5, column=1, padx=10, pady=5, sticky='w')
 
-    tk.Button(guest_registration_window, text="Register", command=submit_guest_registration, bg='white').grid(row=6, column=0, columnspan=2, pady=10)
+    tk.Label(guest_registration_window, text="Pass Valid For (hours):", bg='cyan').grid(row=6, column=0, padx=10, pady=5, sticky='w')
+    hours_entry = tk.Entry(guest_registration_window)
+    hours_entry.insert(0, str(guest_passes.DEFAULT_PASS_HOURS))
+    hours_entry.grid(row=6, column=1, padx=10, pady=5, sticky='w')
+
+    tk.Button(guest_registration_window, text="Register", command=submit_guest_registration, bg='white').grid(row=7, column=0, columnspan=2, pady=10)
 
 # Main application window
 def main_app():
-    global gate_status_var
+    global gate_status_var, gate_choice_var, gate_menu, alert_var, alert_label
     root = tk.Tk()
     root.title("Smart Gate Management System")
     root.configure(bg='cyan')
+    ui_worker.start(root)
 
     gate_status_var = tk.StringVar()
-    gate_status_var.set("Gate is on lockdown" if get_gate_status() else "Gate is unlocked")
+    gate_status_var.set(describe_gate_status())
 
     tk.Label(root, textvariable=gate_status_var, bg='cyan').pack(pady=10)
 
+    alert_var = tk.StringVar()
+    alert_label = tk.Label(root, textvariable=alert_var, bg='cyan', fg='red', wraplength=600)
+    alert_label.pack()
+    anomaly_detector.watch_alerts(root, show_new_alerts)
+
+    gate_choice_var = tk.StringVar(value=ALL_GATES)
+    gate_menu = tk.OptionMenu(root, gate_choice_var, ALL_GATES)
+    gate_menu.configure(bg='white')
+    gate_menu.pack()
+    refresh_gate_choices()
+
     button_frame = tk.Frame(root, bg='cyan')
     button_frame.pack(pady=10)
 
@@ -353,10 +378,20 @@ def main_app():
     tk.Button(button_frame, text="View Guest User Access Logs", command=lambda: view_access_logs("guest"), bg='white').grid(row=1, column=1, padx=10, pady=5)
     tk.Button(button_frame, text="Register User", command=register_user, bg='white').grid(row=2, column=0, padx=10, pady=5)
     tk.Button(button_frame, text="Register Guest", command=register_guest, bg='white').grid(row=2, column=1, padx=10, pady=5)
+    tk.Button(button_frame, text="Add Gate", command=add_gate, bg='white').grid(row=3, column=0, padx=10, pady=5)
+    tk.Button(button_frame, text="Traffic Report", command=view_traffic_report, bg='white').grid(row=3, column=1, padx=10, pady=5)
+    tk.Button(button_frame, text="Who Is On Campus", command=view_occupancy, bg='white').grid(row=4, column=0, padx=10, pady=5)
+    tk.Button(button_frame, text="Search Logs", command=search_logs, bg='white').grid(row=4, column=1, padx=10, pady=5)
+    tk.Button(button_frame, text="Import Event Guests", command=import_event_guests, bg='white').grid(row=5, column=0, padx=10, pady=5)
+    tk.Button(button_frame, text="Anomaly Alerts", command=view_alerts, bg='white').grid(row=5, column=1, padx=10, pady=5)
 
     root.mainloop()
 
 # Initialize database and run the main application
-initialize_database()
-initialize_gate_status()
-main_app()
+if __name__ == '__main__':
+    metrics.start_exporting()
+    initialize_database()
+    guest_passes.start_sweeping()
+    log_search.start_indexing()
+    main_app()
+
@@ -0,0 +1,282 @@
+import argparse
+import collections
+import sqlite3
+import sys
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+import database
+import access_engine
+import ui_worker
+from log_browser import parse_date
+from presence_tracker import person_of
+
+# Admissions through one gate within TAILGATE_S seconds of each other: faster than the
+# barrier cycles, so the later person most likely followed someone through
+TAILGATE_COUNT = 2
+TAILGATE_S = 1.5
+
+# Denials at one gate, or for one ID, within DENIAL_WINDOW_S seconds that make a burst
+GATE_DENIALS = 5
+IDENTITY_DENIALS = 3
+DENIAL_WINDOW_S = 60
+
+# An entry attempt this soon after the same ID was admitted, with no exit in between
+REENTRY_S = 120
+
+# At most one alert per kind and gate or ID in this long
+COOLDOWN_S = 300
+
+# IDs with sliding-window state; the least recently seen are dropped beyond this
+MAX_IDENTITIES = 50000
+
+# Recent alerts kept in memory, and how often the admin console looks for new ones
+ALERT_HISTORY = 200
+ALERT_POLL_MS = 2000
+
+# Rows read per fetch during a replay
+FETCH_SIZE = 5000
+
+ALERT_COLUMNS = ('raised_at', 'kind', 'gate_id', 'person_type', 'person_id', 'detail')
+
+# Alerts the admin console has not shown yet, polled every ALERT_POLL_MS
+NEW_ALERTS_SQL = f"SELECT alert_id, {', '.join(ALERT_COLUMNS)} FROM Anomaly_Alerts WHERE alert_id > ? ORDER BY alert_id LIMIT ?"
+
+# Logs columns in the order access_engine.build_log_row produces them, in time order through
+# the timestamp index (replica uploads arrive late, so log_id order is not time order)
+REPLAY_SQL = """
+    SELECT timestamp, student_id, staff_id, user_name, email, action, gate_id, accessories, vehicle_id, guest_id
+    FROM Logs WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp, log_id
+"""
+
+# Bounds used for a replay without dates (every stored timestamp sorts between them)
+EARLIEST = ''
+LATEST = '9999'
+
+EPOCH = datetime(1970, 1, 1)
+
+# Sliding-window checks over a stream of Logs rows. Each gate and each ID keeps a few
+# ring buffers of recent event times (deques of fixed length), and at most MAX_IDENTITIES
+# IDs are held, so memory stays bounded however long the stream runs.
+class AnomalyDetector:
+    def __init__(self, tailgate_count=TAILGATE_COUNT, tailgate_s=TAILGATE_S, gate_denials=GATE_DENIALS,
+                 identity_denials=IDENTITY_DENIALS, denial_window_s=DENIAL_WINDOW_S, reentry_s=REENTRY_S,
+                 cooldown_s=COOLDOWN_S, max_identities=MAX_IDENTITIES, on_alert=None):
+        self.tailgate_count = tailgate_count
+        self.tailgate_s = tailgate_s
+        self.gate_denials = gate_denials
+        self.identity_denials = identity_denials
+        self.denial_window_s = denial_window_s
+        self.reentry_s = reentry_s
+        self.cooldown_s = cooldown_s
+        self.max_identities = max_identities
+        self.on_alert = on_alert
+        self.alerts = collections.deque(maxlen=ALERT_HISTORY)
+        self.counts = collections.Counter()
+        self.events = 0
+        # gate_id -> (admission times, denial times)
+        self._gates = {}
+        # (person_type, person_id) -> [time admitted (None after an exit), denial times (None until one)]; oldest first
+        self._people = collections.OrderedDict()
+        # (kind, gate_id or person) -> time of the last alert; oldest first
+        self._cooldowns = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    # Check one Logs row (lockdown says it was refused because the gate is locked down).
+    # Returns the alerts it raised.
+    def observe(self, row, lockdown=False):
+        moment = (datetime.fromisoformat(row[0]) - EPOCH).total_seconds()
+        action, gate_id = row[5], row[6]
+        person = person_of(row[1], row[2], row[9])
+        raised = []
+        with self._lock:
+            self.events += 1
+            gate = self._gates.get(gate_id)
+            if gate is None:
+                gate = self._gates[gate_id] = (collections.deque(maxlen=self.tailgate_count), collections.deque(maxlen=self.gate_denials))
+            admissions, denials = gate
+            state = None
+            if person is not None:
+                state = self._people.pop(person, None) or [None, None]
+                self._people[person] = state
+                if len(self._people) > self.max_identities:
+                    self._people.popitem(last=False)
+
+            if state is not None and action != 'exit' and state[0] is not None and moment - state[0] <= self.reentry_s:
+                self._raise(raised, 'rapid_reentry', person, moment, row, person,
+                            f"Entry attempt {moment - state[0]:.0f}s after being admitted, with no exit recorded")
+            if action == 'enter':
+                admissions.append(moment)
+                if len(admissions) == admissions.maxlen and moment - admissions[0] <= self.tailgate_s:
+                    self._raise(raised, 'tailgating', gate_id, moment, row, person,
+                                f"{len(admissions)} admissions within {moment - admissions[0]:.1f}s")
+                if state is not None:
+                    state[0] = moment
+            elif action == 'exit':
+                if state is not None:
+                    state[0] = None
+            elif action == 'denied':
+                denials.append(moment)
+                if len(denials) == denials.maxlen and moment - denials[0] <= self.denial_window_s:
+                    self._raise(raised, 'denial_burst', gate_id, moment, row, None,
+                                f"{len(denials)} denials within {moment - denials[0]:.0f}s")
+                if state is not None:
+                    if state[1] is None:
+                        state[1] = collections.deque(maxlen=self.identity_denials)
+                    state[1].append(moment)
+                    if len(state[1]) == state[1].maxlen and moment - state[1][0] <= self.denial_window_s:
+                        self._raise(raised, 'repeated_denials', person, moment, row, person,
+                                    f"{len(state[1])} denials within {moment - state[1][0]:.0f}s")
+                if lockdown:
+                    self._raise(raised, 'lockdown_attempt', (gate_id, person), moment, row, person, "Entry attempted during lockdown")
+        if self.on_alert is not None:
+            for alert in raised:
+                self.on_alert(alert)
+        return raised
+
+    # Record an alert unless the same kind was raised for the same key within the cooldown
+    def _raise(self, raised, kind, key, moment, row, person, detail):
+        key = (kind, key)
+        last = self._cooldowns.pop(key, None)
+        if last is not None and moment - last < self.cooldown_s:
+            self._cooldowns[key] = last
+            return
+        self._cooldowns[key] = moment
+        if len(self._cooldowns) > self.max_identities:
+            self._cooldowns.popitem(last=False)
+        person_type, person_id = person or (None, None)
+        alert = dict(zip(ALERT_COLUMNS, (row[0], kind, row[6], person_type, person_id, detail)))
+        self.alerts.append(alert)
+        self.counts[kind] += 1
+        raised.append(alert)
+
+# Store an alert for the admin console; if the database is unreachable it stays in memory only
+def save_alert(alert):
+    try:
+        database.execute(f"INSERT INTO Anomaly_Alerts ({', '.join(ALERT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                         tuple(alert[column] for column in ALERT_COLUMNS))
+    except sqlite3.Error:
+        pass
+
+_shared = None
+_shared_lock = threading.Lock()
+
+# The detector for this process's gate decisions, created on first use; its alerts go to Anomaly_Alerts
+def shared_detector():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = AnomalyDetector(on_alert=save_alert)
+        return _shared
+
+# Pass final decisions (admissions and refusals) to the shared detector (if it has been created).
+# Decisions without a Logs row (an unknown guest) are skipped. The decisions have already been
+# logged by the time they get here, so a detector error is reported and never reaches the caller.
+def notify_decisions(decisions):
+    if _shared is None:
+        return
+    for decision in decisions:
+        if decision['log'] is None:
+            continue
+        try:
+            _shared.observe(decision['log'], decision['reason'] == access_engine.LOCKDOWN_REASON)
+        except Exception as error:
+            print(f"anomaly detector: could not check {decision['log'][5]} at gate {decision['log'][6]}: {error}", file=sys.stderr)
+
+# Run a fresh detector over historical Logs in time order, for tuning the thresholds.
+# Lockdown attempts cannot be found this way: Logs does not record why an event was denied.
+def replay(date_from=None, date_to=None, **thresholds):
+    detector = AnomalyDetector(**thresholds)
+    start = parse_date(date_from) if date_from else EARLIEST
+    end = parse_date(date_to, end=True) if date_to else LATEST
+    with database.transaction() as conn:
+        cursor = conn.execute(REPLAY_SQL, (start, end))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                detector.observe(row)
+    return detector
+
+# Alerts stored after the given alert_id, oldest first
+def fetch_alerts(after_id, limit=ALERT_HISTORY):
+    return database.fetch_all(NEW_ALERTS_SQL, (after_id, limit))
+
+# The most recent alerts, newest first
+def recent_alerts(limit=ALERT_HISTORY):
+    return database.fetch_all(f"SELECT alert_id, {', '.join(ALERT_COLUMNS)} FROM Anomaly_Alerts ORDER BY alert_id DESC LIMIT ?", (limit,))
+
+def latest_alert_id():
+    return database.fetch_one("SELECT IFNULL(MAX(alert_id), 0) FROM Anomaly_Alerts")[0]
+
+# Poll for new alerts from the Tk thread and pass each batch to on_alerts (alerts stored
+# before the watch started are skipped)
+def watch_alerts(root, on_alerts, poll_ms=ALERT_POLL_MS):
+    state = {'last_id': 0}
+
+    def poll():
+        ui_worker.submit(fetch_alerts, state['last_id'], on_done=received, on_error=lambda error: root.after(poll_ms, poll))
+
+    def received(rows):
+        if rows:
+            state['last_id'] = rows[-1][0]
+            on_alerts(rows)
+        root.after(poll_ms, poll)
+
+    def started(last_id):
+        state['last_id'] = last_id
+        root.after(poll_ms, poll)
+
+    ui_worker.submit(latest_alert_id, on_done=started, on_error=lambda error: root.after(poll_ms, poll))
+
+# Window listing the most recent alerts
+class AlertWindow:
+    def __init__(self):
+        self.window = tk.Toplevel()
+        self.window.title("Anomaly Alerts")
+        self.tree = ttk.Treeview(self.window, columns=('alert_id',) + ALERT_COLUMNS, show='headings', height=20)
+        for name in ('alert_id',) + ALERT_COLUMNS:
+            self.tree.heading(name, text=name)
+            self.tree.column(name, width=300 if name == 'detail' else 110, stretch=True)
+        self.tree.pack(expand=1, fill='both')
+        tk.Button(self.window, text="Refresh", command=self.load).pack(pady=5)
+        self.load()
+
+    def load(self):
+        ui_worker.submit(recent_alerts, on_done=self.show, description="Loading alerts...")
+
+    def show(self, rows):
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', tk.END, values=['' if value is None else value for value in row])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay historical access logs through the anomaly detector to tune its thresholds.")
+    parser.add_argument('--from', dest='date_from', help="YYYY-MM-DD")
+    parser.add_argument('--to', dest='date_to', help="YYYY-MM-DD (inclusive)")
+    parser.add_argument('--tailgate-count', type=int, default=TAILGATE_COUNT)
+    parser.add_argument('--tailgate-s', type=float, default=TAILGATE_S)
+    parser.add_argument('--gate-denials', type=int, default=GATE_DENIALS)
+    parser.add_argument('--identity-denials', type=int, default=IDENTITY_DENIALS)
+    parser.add_argument('--denial-window-s', type=float, default=DENIAL_WINDOW_S)
+    parser.add_argument('--reentry-s', type=float, default=REENTRY_S)
+    parser.add_argument('--cooldown-s', type=float, default=COOLDOWN_S)
+    parser.add_argument('--list', action='store_true', help="print every alert as it is raised")
+    parser.add_argument('--db', help="database file (default SMART_GATE_DB or smart_gate_management.db)")
+    args = parser.parse_args()
+
+    if args.db:
+        database.set_database_path(args.db)
+    thresholds = {name: getattr(args, name) for name in ('tailgate_count', 'tailgate_s', 'gate_denials', 'identity_denials',
+                                                          'denial_window_s', 'reentry_s', 'cooldown_s')}
+    if args.list:
+        thresholds['on_alert'] = lambda alert: print(*('' if alert[column] is None else alert[column] for column in ALERT_COLUMNS), sep='\t')
+    started = time.perf_counter()
+    detector = replay(args.date_from, args.date_to, **thresholds)
+    elapsed = time.perf_counter() - started
+    print(f"{detector.events} events in {elapsed:.2f}s ({detector.events / max(elapsed, 1e-9):.0f}/s)")
+    for kind, count in sorted(detector.counts.items()):
+        print(f"{kind}: {count}")
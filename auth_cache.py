@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import database
+
+# Maximum number of existence answers kept in memory
+DEFAULT_MAX_ENTRIES = 50000
+
+# How often the roster change counter is re-read. Changes made by this process clear the
+# cache at once; changes from other processes are seen within this many seconds.
+VERSION_CHECK_S = 0.5
+
+# Bump the roster change counter inside the caller's transaction.
+# Every path that adds or changes students, staff, vehicles or accessories calls this.
+def bump_roster_version(conn):
+    global local_roster_changes
+    conn.execute("UPDATE Roster_Version SET version = version + 1 WHERE id = 1")
+    local_roster_changes += 1
+    roster_cache.invalidate()
+
+# Roster changes made by this process. PRAGMA data_version does not move for a
+# connection's own commits, so in-process caches compare this counter as well.
+local_roster_changes = 0
+
+# Read the roster change counter (None if the table has not been created yet)
+def read_roster_version():
+    try:
+        result = database.fetch_one("SELECT version FROM Roster_Version WHERE id = 1")
+    except sqlite3.OperationalError:
+        return None
+    return result[0] if result else None
+
+# LRU cache of "does this ID / plate / accessory type exist" answers.
+# Entries are dropped once the roster change counter is seen to move.
+class AuthorizationCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, check_interval_s=VERSION_CHECK_S):
+        self.max_entries = max_entries
+        self.check_interval_s = check_interval_s
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_check = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    # Return the cached answer for key, calling loader() on a miss
+    def lookup(self, key, loader):
+        self._check_version()
+        if self._version is None:
+            return loader()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = loader()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    # Forget every cached answer, and re-read the change counter on the next lookup
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._next_check = 0
+
+    # Counters for monitoring
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'reloads': self.reloads, 'version': self._version}
+
+    # Re-read the change counter at most every check_interval_s, so a cache hit costs no
+    # query at all. The counter is a table row, the same for every thread's connection.
+    def _check_version(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval_s
+        version = read_roster_version()
+        with self._lock:
+            if version is None or version != self._version:
+                self._entries.clear()
+                self._version = version
+                self.reloads += 1
+
+# Cache shared by the existence checks of this process
+roster_cache = AuthorizationCache()
@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import database
+import admin
+import benchmark_suite
+import anomaly_detector
+
+# Log rows generated for the replay, and synthetic events streamed for the memory check
+LOG_ROWS = 500000
+STREAM_SIZES = (100000, 1000000)
+IDENTITIES = 200000
+
+# Events from many IDs over a few gates, a few per second, with denials and exits mixed in
+def synthetic_events(count, seed=1):
+    rng = random.Random(seed)
+    moment = datetime(2024, 1, 1, 7)
+    for _ in range(count):
+        moment += timedelta(milliseconds=rng.randint(50, 500))
+        student_id = rng.randint(1, IDENTITIES)
+        yield (moment.isoformat(), student_id, None, f"Student {student_id}", '', rng.choice(('enter', 'enter', 'exit', 'denied')),
+               rng.randint(1, 4), '', None, None)
+
+# Events per second and peak Python memory while streaming count events through a detector
+def stream(count):
+    events = list(synthetic_events(count))
+    detector = anomaly_detector.AnomalyDetector()
+    started = time.perf_counter()
+    for row in events:
+        detector.observe(row)
+    rate = count / (time.perf_counter() - started)
+
+    detector = anomaly_detector.AnomalyDetector()
+    tracemalloc.start()
+    for row in synthetic_events(count):
+        detector.observe(row)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rate, peak, len(detector._people), sum(detector.counts.values())
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        LOG_ROWS = int(sys.argv[1])
+    for count in STREAM_SIZES:
+        rate, peak, tracked, alerts = stream(count)
+        print(f"stream {count:8d} events  {rate:9.0f} events/s  peak {peak / 2 ** 20:6.1f} MB  "
+              f"{tracked} IDs tracked  {alerts} alerts")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'anomaly.db'))
+        admin.initialize_database()
+        benchmark_suite.generate(benchmark_suite.scale_for(LOG_ROWS))
+        started = time.perf_counter()
+        detector = anomaly_detector.replay()
+        elapsed = time.perf_counter() - started
+        print(f"replay {detector.events:8d} log rows  {detector.events / elapsed:9.0f} events/s  "
+              + ', '.join(f"{kind} {count}" for kind, count in sorted(detector.counts.items())))
+        database.close_all_connections()
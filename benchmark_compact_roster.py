@@ -0,0 +1,90 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import database
+import admin
+import access_engine
+import benchmark_suite
+import compact_roster
+
+# Students, staff and vehicles generated, and lookups timed per roster
+STUDENTS = 100000
+STAFF = 10000
+VEHICLES = 50000
+LOOKUPS = 20000
+
+def generate():
+    benchmark_suite.insert_batched("INSERT INTO Student (student_id, name, email, contact, username, password, department_id, access_level) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   ((i, f"Student {i}", f"s{i}@campus.edu", '0700000000', f"student{i}", 'default_password', i % 40, 1 + i % 3)
+                                    for i in range(1, STUDENTS + 1)))
+    benchmark_suite.insert_batched("INSERT INTO Staff (staff_id, name, email, username, password, department_id, access_level) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   ((i, f"Staff {i}", f"t{i}@campus.edu", f"staff{i}", 'default_password', i % 40, 2 + i % 3)
+                                    for i in range(1, STAFF + 1)))
+    benchmark_suite.insert_batched("INSERT INTO Vehicle (vehicle_id, make, model, color, license_plate, owner_id, owner_type) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   ((i, 'Toyota', 'Corolla', 'White', benchmark_suite.plate_for(i), i, 'Student') for i in range(1, VEHICLES + 1)))
+
+# Peak and retained Python memory while building a roster
+def traced(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    roster = build()
+    elapsed = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return roster, retained, peak, elapsed
+
+# The roster as dicts of full rows, as a naive in-memory cache would hold it
+def row_dicts():
+    conn = database.get_connection()
+    return {
+        'student': {row[0]: row for row in conn.execute("SELECT * FROM Student")},
+        'staff': {row[0]: row for row in conn.execute("SELECT * FROM Staff")},
+        'vehicle': {row[4]: row for row in conn.execute("SELECT * FROM Vehicle")},
+    }
+
+def latency(lookup, keys):
+    timings = []
+    for key in keys:
+        started = time.perf_counter()
+        lookup(key)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return f"p50 {statistics.median(timings):5.2f}us  p99 {timings[int(len(timings) * 0.99) - 1]:5.2f}us"
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        STUDENTS = int(sys.argv[1])
+    access_engine.FUZZY_PLATE_MATCHING = False
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'roster.db'))
+        admin.initialize_database()
+        generate()
+        people = STUDENTS + STAFF
+
+        rows, retained, peak, elapsed = traced(row_dicts)
+        print(f"row dicts       {retained / people:7.1f} bytes/person retained (vehicles included)  load {elapsed:5.2f}s")
+        del rows
+        roster, retained, peak, elapsed = traced(compact_roster.CompactRoster.load)
+        print(f"compact arrays  {roster.bytes_per_person():7.1f} bytes/person  {roster.nbytes() / 1e6:5.2f} MB with plates  "
+              f"retained {retained / 1e6:5.2f} MB  peak {peak / 1e6:5.2f} MB  load {elapsed:5.2f}s")
+
+        path = os.path.join(tmp, 'roster.snapshot')
+        roster.save(path)
+        started = time.perf_counter()
+        mapped = compact_roster.CompactRoster.open(path)
+        print(f"snapshot        {os.path.getsize(path) / 1e6:5.2f} MB file, mapped in {(time.perf_counter() - started) * 1000:.2f}ms")
+
+        rng = random.Random(7)
+        ids = [rng.randint(1, STUDENTS * 2) for _ in range(LOOKUPS)]
+        plates = [benchmark_suite.plate_for(rng.randint(1, VEHICLES * 2)) for _ in range(LOOKUPS)]
+        print(f"student (mapped)    {latency(lambda i: mapped.user_exists('student', i), ids)}")
+        print(f"student (arrays)    {latency(lambda i: roster.user_exists('student', i), ids)}")
+        print(f"student (live)      {latency(lambda i: access_engine.LIVE_ROSTER.user_exists('student', i), ids)}")
+        print(f"plate (mapped)      {latency(mapped.find_vehicle, plates)}")
+        print(f"plate (live)        {latency(access_engine.LIVE_ROSTER.find_vehicle, plates)}")
+        print(f"access level        {latency(lambda i: mapped.access_level('student', i), ids)}")
+        database.close_all_connections()
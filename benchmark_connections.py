@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+import database
+import admin
+
+# Number of simulated admissions per run
+ADMISSIONS = 2000
+
+# Approximate fsyncs per write transaction for each (journal_mode, synchronous) pair.
+# Rollback journals sync the journal, its header and the database file on every commit;
+# WAL with synchronous=NORMAL only syncs when a checkpoint copies pages back.
+FSYNCS_PER_COMMIT = {
+    ('delete', 2): 3,
+    ('delete', 1): 2,
+    ('wal', 2): 1,
+    ('wal', 1): 0,
+}
+FSYNCS_PER_CHECKPOINT = 2
+
+LOG_SQL = """
+    INSERT INTO Logs (timestamp, student_id, staff_id, user_name, email, action, gate_id, accessories, vehicle_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Create the schema and a small roster in a fresh database file
+def seed_database(path):
+    database.set_database_path(path)
+    admin.initialize_database()
+    database.execute_many("INSERT INTO Student (student_id, name, email, contact, username, password) VALUES (?, ?, ?, ?, ?, ?)",
+                          [(i, f"Student {i}", f"s{i}@campus.edu", '0700000000', f"student{i}", 'default_password') for i in range(1, 1001)])
+    database.execute_many("INSERT INTO Vehicle (make, model, color, license_plate, owner_id, owner_type) VALUES (?, ?, ?, ?, ?, ?)",
+                          [('Toyota', 'Corolla', 'White', f"KAA {i:03d}A", i, 'Student') for i in range(1, 1001)])
+    database.execute("INSERT INTO Accessories (type, description, quantity) VALUES ('Laptop', 'Personal laptop', 1)")
+    database.close_all_connections()
+
+# One admission the way client_interface.py used to do it: a new connection per helper
+def admit_legacy(path, student_id, counters):
+    def connect():
+        counters['connections'] += 1
+        return sqlite3.connect(path)
+
+    with connect() as conn:
+        conn.execute("SELECT * FROM Student WHERE student_id = ?", (student_id,)).fetchone()
+    with connect() as conn:
+        conn.execute("SELECT is_locked_down FROM Gate_Status WHERE gate_id = 1").fetchone()
+    with connect() as conn:
+        conn.execute(LOG_SQL, (datetime.now().isoformat(), student_id, None, f"Student {student_id}", '', 'enter', 1, '', None))
+        conn.commit()
+        counters['commits'] += 1
+    with connect() as conn:
+        conn.execute("SELECT * FROM Vehicle WHERE license_plate = ?", (f"KAA {student_id:03d}A",)).fetchone()
+    with connect() as conn:
+        conn.execute("SELECT * FROM Accessories WHERE type = ?", ('Laptop',)).fetchone()
+
+# The same admission through the shared connection layer
+def admit_pooled(student_id):
+    database.fetch_one("SELECT * FROM Student WHERE student_id = ?", (student_id,))
+    database.fetch_one("SELECT is_locked_down FROM Gate_Status WHERE gate_id = 1")
+    database.execute(LOG_SQL, (datetime.now().isoformat(), student_id, None, f"Student {student_id}", '', 'enter', 1, '', None))
+    database.fetch_one("SELECT * FROM Vehicle WHERE license_plate = ?", (f"KAA {student_id:03d}A",))
+    database.fetch_one("SELECT * FROM Accessories WHERE type = ?", ('Laptop',))
+
+# Read the journal mode and synchronous level a fresh connection would use
+def journal_settings(conn):
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    return journal_mode, synchronous
+
+# Print one result line
+def report(label, elapsed, connections, commits, fsyncs):
+    print(f"{label:<8} {ADMISSIONS / elapsed:>10.0f} adm/s  "
+          f"{connections / ADMISSIONS:>6.3f} conn/adm  "
+          f"{commits / ADMISSIONS:>6.3f} commits/adm  "
+          f"{fsyncs / ADMISSIONS:>6.3f} fsyncs/adm (estimated)")
+
+def run_legacy(path):
+    seed_database(path)
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode = DELETE")
+        settings = journal_settings(conn)
+    counters = {'connections': 0, 'commits': 0}
+    start = time.perf_counter()
+    for i in range(ADMISSIONS):
+        admit_legacy(path, i % 1000 + 1, counters)
+    elapsed = time.perf_counter() - start
+    fsyncs = counters['commits'] * FSYNCS_PER_COMMIT.get(settings, 3)
+    report('legacy', elapsed, counters['connections'], counters['commits'], fsyncs)
+
+def run_pooled(path):
+    seed_database(path)
+    database.set_database_path(path)
+    opened = database.stats['connections_opened']
+    commits = database.stats['commits']
+    start = time.perf_counter()
+    for i in range(ADMISSIONS):
+        admit_pooled(i % 1000 + 1)
+    conn = database.get_connection()
+    busy, wal_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    elapsed = time.perf_counter() - start
+    settings = journal_settings(conn)
+    connections = database.stats['connections_opened'] - opened
+    commits = database.stats['commits'] - commits
+    checkpoints = 1 + wal_frames // 1000
+    fsyncs = commits * FSYNCS_PER_COMMIT.get(settings, 0) + checkpoints * FSYNCS_PER_CHECKPOINT
+    report('pooled', elapsed, connections, commits, fsyncs)
+    database.close_all_connections()
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        ADMISSIONS = int(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        run_legacy(os.path.join(tmp, 'legacy.db'))
+        run_pooled(os.path.join(tmp, 'pooled.db'))
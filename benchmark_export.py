@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import database
+import admin
+import benchmark_suite
+import log_export
+
+# Logs rows generated and appended before the incremental run
+LOG_ROWS = 200000
+NEW_ROWS = 1000
+
+# Export once and print throughput and file size
+def run(label, path, fmt, compress=False, watermark=None):
+    started = time.perf_counter()
+    rows, last_key = log_export.export_logs('verified', path, fmt, compress=compress, watermark=watermark)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<14} {rows:>7} rows {elapsed:6.2f}s {rows / max(elapsed, 1e-9):>9.0f} rows/s  file {os.path.getsize(path) / 1e6:6.1f} MB")
+
+# Peak Python memory of one export (traced separately: tracemalloc slows the export down)
+def peak_memory(path, fmt):
+    tracemalloc.start()
+    log_export.export_logs('verified', path, fmt)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        LOG_ROWS = int(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'export.db'))
+        admin.initialize_database()
+        benchmark_suite.generate(benchmark_suite.scale_for(LOG_ROWS))
+
+        run('csv', os.path.join(tmp, 'logs.csv'), 'csv')
+        run('jsonl', os.path.join(tmp, 'logs.jsonl'), 'jsonl')
+        run('csv.gz', os.path.join(tmp, 'logs.csv.gz'), 'csv', compress=True)
+        print(f"peak memory    csv {peak_memory(os.path.join(tmp, 'traced.csv'), 'csv'):.1f} MB  "
+              f"jsonl {peak_memory(os.path.join(tmp, 'traced.jsonl'), 'jsonl'):.1f} MB")
+        run('first nightly', os.path.join(tmp, 'night1.csv.gz'), 'csv', compress=True, watermark='nightly')
+        database.execute_many("INSERT INTO Logs (timestamp, student_id, user_name, email, action, gate_id) VALUES (datetime('now'), 1, 'Student 1', 's1@campus.edu', 'enter', 1)",
+                              [()] * NEW_ROWS)
+        run('next nightly', os.path.join(tmp, 'night2.csv.gz'), 'csv', compress=True, watermark='nightly')
+        database.close_all_connections()
@@ -0,0 +1,56 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+import database
+import admin
+import face_matcher
+
+# Roster sizes to measure and queries timed per size
+ROSTER_SIZES = [1000, 10000, 50000, 100000]
+QUERIES = 200
+BATCH_SIZE = 64
+
+# Time one roster size: enroll random vectors, build the index, then match
+def run(tmp, size, rng):
+    database.set_database_path(os.path.join(tmp, f"faces_{size}.db"))
+    admin.initialize_database()
+    vectors = rng.standard_normal((size, face_matcher.EMBEDDING_DIM)).astype(np.float32)
+    face_matcher.enroll_faces(('student', i + 1, vectors[i]) for i in range(size))
+    index_dir = os.path.join(tmp, f"index_{size}")
+    face_matcher.build_index(index_dir)
+
+    start = time.perf_counter()
+    matcher = face_matcher.FaceMatcher.load(index_dir)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Queries are noisy copies of enrolled vectors, so each should find its owner
+    picks = rng.integers(0, size, QUERIES)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((QUERIES, face_matcher.EMBEDDING_DIM)).astype(np.float32)
+    latencies = []
+    hits = 0
+    for query, pick in zip(queries, picks):
+        start = time.perf_counter()
+        matches = matcher.match(query, top_k=1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += bool(matches) and matches[0][1] == pick + 1
+
+    start = time.perf_counter()
+    for i in range(0, QUERIES, BATCH_SIZE):
+        matcher.match_batch(queries[i:i + BATCH_SIZE])
+    batch_rate = QUERIES / (time.perf_counter() - start)
+
+    latencies.sort()
+    print(f"{size:>8} enrolled  load {load_ms:6.2f}ms  match p50 {statistics.median(latencies):7.3f}ms "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.3f}ms  batch {batch_rate:9.0f} q/s  hit rate {hits / QUERIES:.2f}")
+    database.close_all_connections()
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        ROSTER_SIZES = [int(size) for size in sys.argv[1:]]
+    rng = np.random.default_rng(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in ROSTER_SIZES:
+            run(tmp, size, rng)
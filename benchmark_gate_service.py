@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import database
+import admin
+import benchmark_suite
+
+# Simulated terminals, test length and roster scale
+DEFAULT_TERMINALS = 64
+DEFAULT_SECONDS = 10
+DEFAULT_LOG_ROWS = 10000
+
+# One terminal: send a request, wait for the decision, repeat until the deadline
+async def terminal(host, port, scale, deadline, rng, latencies, outcomes):
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            break
+        except OSError:
+            await asyncio.sleep(0.05)
+    gate_id = rng.randint(1, 4)
+    request_id = 0
+    while time.perf_counter() < deadline:
+        request_id += 1
+        if rng.random() < 0.9:
+            student_id = rng.randint(1, scale['students'])
+            request = {'type': 'student', 'id': student_id, 'name': f"Student {student_id}", 'email': f"s{student_id}@campus.edu",
+                       'direction': rng.choice(('enter', 'exit'))}
+        else:
+            guest_id = rng.randint(1, scale['guests'])
+            request = {'type': 'guest', 'name': benchmark_suite.guest_name(guest_id), 'id_number': f"ID{guest_id:08d}"}
+        request.update(request_id=request_id, gate_id=gate_id)
+        started = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append((time.perf_counter() - started) * 1000)
+        outcomes['allowed' if response.get('allowed') else 'error' if 'error' in response else 'denied'] += 1
+    writer.close()
+
+async def run_terminals(host, port, terminals, seconds, scale):
+    latencies = []
+    outcomes = {'allowed': 0, 'denied': 0, 'error': 0}
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(terminal(host, port, scale, deadline, random.Random(i), latencies, outcomes) for i in range(terminals)))
+    return latencies, outcomes, time.perf_counter() - started
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test the gate service with many simulated terminals.")
+    parser.add_argument('--terminals', type=int, default=DEFAULT_TERMINALS)
+    parser.add_argument('--seconds', type=float, default=DEFAULT_SECONDS)
+    parser.add_argument('--log-rows', type=int, default=DEFAULT_LOG_ROWS)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'service.db')
+        database.set_database_path(path)
+        admin.initialize_database()
+        scale = benchmark_suite.scale_for(args.log_rows)
+        benchmark_suite.generate(scale)
+        database.close_all_connections()
+
+        server = subprocess.Popen([sys.executable, 'gate_service.py', '--db', path, '--port', str(args.port)],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, text=True)
+        try:
+            server.stdout.readline()
+            latencies, outcomes, elapsed = asyncio.run(run_terminals('127.0.0.1', args.port, args.terminals, args.seconds, scale))
+        finally:
+            server.terminate()
+            server.wait()
+
+        database.set_database_path(path)
+        logged = database.fetch_one("SELECT COUNT(*) FROM Logs")[0] - scale['log_rows']
+        database.close_all_connections()
+
+    latencies.sort()
+    print(f"{args.terminals} terminals for {elapsed:.1f}s: {len(latencies)} requests, {len(latencies) / elapsed:.0f} req/s")
+    print(f"latency ms: p50={statistics.median(latencies):.2f} p99={latencies[int(len(latencies) * 0.99) - 1]:.2f} max={latencies[-1]:.2f}")
+    print(f"allowed={outcomes['allowed']} denied={outcomes['denied']} errors={outcomes['error']} log rows written={logged}")
@@ -0,0 +1,86 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import database
+import admin
+import access_engine
+import benchmark_suite
+import guest_passes
+
+# Past passes generated at each size, today's passes, distinct names (repeat visitors share
+# a name) and lookups timed per size
+HISTORY_SIZES = (10000, 100000, 1000000)
+TODAY = 500
+NAMES = 2000
+LOOKUPS = 5000
+
+# The validity check made through the index over every pass, as a lookup would without the
+# partial index of unexpired passes
+FULL_INDEX_SQL = """
+    SELECT guest_id, name, contact, id_number, age, office_visiting, person_visiting
+    FROM Guests INDEXED BY idx_guests_name_lower
+    WHERE LOWER(name) = LOWER(?) AND valid_from <= ? AND valid_until > ?
+    ORDER BY valid_from DESC LIMIT 1
+"""
+
+def name_for(number):
+    return benchmark_suite.guest_name(number % NAMES)
+
+# Add past passes (for the sweeper to expire) with IDs up to history
+def add_history(start_id, history, now):
+    def rows():
+        for guest_id in range(start_id, history + 1):
+            entered = now - timedelta(days=1, minutes=guest_id)
+            yield (guest_id, name_for(guest_id), '0711000000', f"ID{guest_id:08d}", 30, 'Registry', 'Registrar',
+                   entered.isoformat(), guest_passes.pass_time(entered), guest_passes.pass_time(entered + timedelta(hours=12)))
+    benchmark_suite.insert_batched("""INSERT INTO Guests (guest_id, name, contact, id_number, age, office_visiting, person_visiting,
+                                                          entrance_time, valid_from, valid_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows())
+
+# Today's visitors, with passes valid now; returns their names
+def add_today(now):
+    names = [name_for(number) for number in random.Random(1).sample(range(NAMES), TODAY)]
+    valid_from, valid_until = guest_passes.pass_window(start=now - timedelta(hours=1))
+    benchmark_suite.insert_batched("""INSERT INTO Guests (guest_id, name, contact, id_number, age, office_visiting, person_visiting,
+                                                          entrance_time, valid_from, valid_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                   ((10 ** 9 + number, name, '0711000000', None, 30, 'Registry', 'Registrar', now.isoformat(), valid_from, valid_until)
+                                    for number, name in enumerate(names)))
+    return names
+
+def latency(lookup, names):
+    rng = random.Random(2)
+    timings = []
+    for _ in range(LOOKUPS):
+        name = rng.choice(names).lower()
+        started = time.perf_counter()
+        assert lookup(name) is not None
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return f"p50 {statistics.median(timings):7.1f}us  p99 {timings[int(len(timings) * 0.99) - 1]:7.1f}us"
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        HISTORY_SIZES = tuple(int(size) for size in sys.argv[1:])
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'guests.db'))
+        admin.initialize_database()
+        now = datetime.now()
+        names = add_today(now)
+        generated = 0
+        for history in HISTORY_SIZES:
+            add_history(generated + 1, history, now)
+            generated = history
+            database.execute("UPDATE Guests SET expired = 0")
+            started = time.perf_counter()
+            expired = guest_passes.expire_passes(now)
+            sweep_s = time.perf_counter() - started
+            database.execute("ANALYZE")
+
+            now_text = guest_passes.pass_time(now)
+            print(f"{history:8d} past passes  swept {expired:8d} in {sweep_s:6.2f}s")
+            print(f"    active index  {latency(access_engine.find_guest, names)}")
+            print(f"    full index    {latency(lambda name: database.fetch_one(FULL_INDEX_SQL, (name, now_text, now_text)), names)}")
+        database.close_all_connections()
@@ -0,0 +1,57 @@
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import database
+import admin
+import roster_import
+
+# Rows per generated CSV file
+ROWS = 100000
+
+# Every DUPLICATE_EVERY-th row reuses an earlier username/plate to exercise the error path
+DUPLICATE_EVERY = 100
+
+# Build an in-memory students CSV with a sprinkling of UNIQUE violations
+def generate_students(rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['student_id', 'name', 'email', 'contact', 'username'])
+    for i in range(1, rows + 1):
+        username = f"student{i - 1}" if i % DUPLICATE_EVERY == 0 else f"student{i}"
+        writer.writerow([i, f"Student {i}", f"s{i}@campus.edu", '0700000000', username])
+    output.seek(0)
+    return output
+
+# Build an in-memory vehicles CSV owned by the generated students
+def generate_vehicles(rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['make', 'model', 'color', 'license_plate', 'owner_id', 'owner_type'])
+    for i in range(1, rows + 1):
+        plate = f"KAA {i - 1:06d}" if i % DUPLICATE_EVERY == 0 else f"KAA {i:06d}"
+        writer.writerow(['Toyota', 'Corolla', 'White', plate, i, 'student'])
+    output.seek(0)
+    return output
+
+# Import one generated file and print the throughput
+def run(kind, csv_file, batch_size):
+    start = time.perf_counter()
+    inserted, errors = roster_import.import_csv(kind, csv_file, batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"{kind:<9} batch={batch_size:<6} {inserted:>7} inserted {len(errors):>5} rejected "
+          f"{elapsed:>7.2f}s {inserted / elapsed:>9.0f} rows/s")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        ROWS = int(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_size in (1, roster_import.DEFAULT_BATCH_SIZE):
+            database.set_database_path(os.path.join(tmp, f"import_{batch_size}.db"))
+            admin.initialize_database()
+            rows = ROWS if batch_size > 1 else min(ROWS, 5000)
+            run('students', generate_students(rows), batch_size)
+            run('vehicles', generate_vehicles(rows), batch_size)
+        database.close_all_connections()
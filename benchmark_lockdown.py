@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+import database
+import admin
+import gate_registry
+
+# Simulated gate terminals (one process each) and lockdown toggles
+TERMINALS = 8
+TOGGLES = 50
+
+# A terminal process: watch the gate registry and report when each change arrives
+def terminal(path, ready, changes, stop):
+    database.set_database_path(path)
+    registry = gate_registry.registry
+    registry.check()
+    registry.subscribe(lambda gates, version: changes.put((os.getpid(), version, time.time())))
+    registry.start_watching()
+    ready.set()
+    stop.wait()
+    registry.stop_watching()
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        TERMINALS = int(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'gates.db')
+        database.set_database_path(path)
+        admin.initialize_database()
+        for i in range(2, 6):
+            gate_registry.add_gate(f"Gate {i}")
+
+        context = multiprocessing.get_context('spawn')
+        changes = context.Queue()
+        stop = context.Event()
+        terminals = []
+        for _ in range(TERMINALS):
+            ready = context.Event()
+            process = context.Process(target=terminal, args=(path, ready, changes, stop))
+            process.start()
+            terminals.append((process, ready))
+        for _, ready in terminals:
+            ready.wait()
+
+        sent = {}
+        for i in range(TOGGLES):
+            started = time.time()
+            gate_registry.set_lockdown(i % 2 == 0)
+            sent[gate_registry.registry.version()] = started
+            time.sleep(0.02)
+        time.sleep(0.2)
+        stop.set()
+
+        latencies = []
+        while not changes.empty():
+            pid, version, received = changes.get()
+            if version in sent:
+                latencies.append((received - sent[version]) * 1000)
+        for process, _ in terminals:
+            process.join()
+        database.close_all_connections()
+
+    latencies.sort()
+    expected = TERMINALS * TOGGLES
+    print(f"{TERMINALS} terminals, {TOGGLES} lockdown toggles, {len(latencies)}/{expected} notifications received")
+    if latencies:
+        print(f"propagation latency ms: p50={statistics.median(latencies):.2f} "
+              f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.2f} max={latencies[-1]:.2f}")
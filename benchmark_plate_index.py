@@ -0,0 +1,65 @@
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+import database
+import admin
+import plate_index
+
+# Registered plates and lookups timed
+PLATES = 100000
+LOOKUPS = 5000
+
+# A random plate in the KAA 123A style
+def random_plate(rng):
+    return f"K{rng.choice(string.ascii_uppercase)}{rng.choice(string.ascii_uppercase)} {rng.randint(0, 999):03d}{rng.choice(string.ascii_uppercase)}"
+
+# Damage a plate the way a camera or a guard would
+def misread(plate, rng):
+    kind = rng.randrange(4)
+    if kind == 0:
+        return plate.replace(' ', '')
+    if kind == 1:
+        return plate.replace('0', 'O').replace('1', 'I')
+    position = rng.randrange(len(plate))
+    if kind == 2:
+        return plate[:position] + rng.choice(string.ascii_uppercase) + plate[position + 1:]
+    return plate[:position] + plate[position + 1:]
+
+# Time lookups and report the latency percentiles and how often the right vehicle came back
+def time_lookups(index, label, queries):
+    latencies = []
+    correct = 0
+    for query, vehicle_id in queries:
+        start = time.perf_counter()
+        found = index.find_unique(query)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        correct += found == vehicle_id
+    latencies.sort()
+    print(f"{label:<10} p50 {statistics.median(latencies):7.1f}us  p99 {latencies[int(len(latencies) * 0.99) - 1]:7.1f}us  "
+          f"resolved {correct / len(queries):.3f}")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        PLATES = int(sys.argv[1])
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'plates.db'))
+        admin.initialize_database()
+        plates = list({random_plate(rng) for _ in range(PLATES)})
+        database.execute_many("INSERT INTO Vehicle (make, model, license_plate, owner_type) VALUES ('Toyota', 'Corolla', ?, 'Student')",
+                              [(plate,) for plate in plates])
+        ids = dict(database.fetch_all("SELECT license_plate, vehicle_id FROM Vehicle"))
+
+        start = time.perf_counter()
+        index = plate_index.PlateIndex.load()
+        print(f"loaded {len(index)} plates in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        sample = rng.sample(plates, LOOKUPS)
+        time_lookups(index, 'exact', [(plate, ids[plate]) for plate in sample])
+        time_lookups(index, 'misread', [(misread(plate, rng), ids[plate]) for plate in sample])
+        time_lookups(index, 'unknown', [(random_plate(rng) + 'XX', None) for _ in range(LOOKUPS)])
+        database.close_all_connections()
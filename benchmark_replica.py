@@ -0,0 +1,69 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+import database
+import admin
+import access_engine
+import benchmark_suite
+import gate_registry
+import terminal_replica
+
+# Roster scale, admissions timed and roster changes made between syncs
+LOG_ROWS = 100000
+ADMISSIONS = 2000
+CHANGES = 100
+
+def time_admissions(roster, scale):
+    latencies = []
+    for i in range(ADMISSIONS):
+        student_id = i % scale['students'] + 1
+        request = {'type': 'student', 'id': student_id, 'name': f"Student {student_id}", 'gate_id': 1,
+                   'license_plate': benchmark_suite.plate_for(i % scale['vehicles'] + 1), 'direction': 'exit'}
+        started = time.perf_counter()
+        access_engine.evaluate_access(request, roster)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return f"p50 {statistics.median(latencies):6.1f}us  p99 {latencies[int(len(latencies) * 0.99) - 1]:6.1f}us"
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        LOG_ROWS = int(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        central = os.path.join(tmp, 'central.db')
+        database.set_database_path(central)
+        admin.initialize_database()
+        scale = benchmark_suite.scale_for(LOG_ROWS)
+        benchmark_suite.generate(scale)
+        gate_registry.add_gate("North Gate")
+        replica = terminal_replica.TerminalReplica(os.path.join(tmp, 'replica.db'))
+
+        started = time.perf_counter()
+        replica.sync()
+        print(f"first sync: {replica.stats['rows_pulled']} rows in {time.perf_counter() - started:.2f}s")
+
+        database.execute_many("UPDATE Student SET email = ? WHERE student_id = ?", [('new@campus.edu', i) for i in range(1, CHANGES + 1)])
+        gate_registry.set_lockdown(True, 2)
+        before = replica.stats['rows_pulled']
+        started = time.perf_counter()
+        replica.sync()
+        print(f"delta sync after {CHANGES + 1} changes: {replica.stats['rows_pulled'] - before} rows in {(time.perf_counter() - started) * 1000:.1f}ms")
+        print(f"gate 2 locked in replica: {replica.roster().is_locked_down(2)}")
+
+        print(f"admission (central) {time_admissions(access_engine.LIVE_ROSTER, scale)}")
+        print(f"admission (replica) {time_admissions(replica.roster(), scale)}")
+
+        # Central database unreachable: admissions keep working and queue their logs
+        database.set_database_path(os.path.join(tmp, 'missing', 'central.db'))
+        for i in range(1, 501):
+            decision = access_engine.evaluate_access({'type': 'student', 'id': i, 'name': f"Student {i}", 'gate_id': 1, 'direction': 'exit'},
+                                                     replica.roster())
+            replica.record(decision)
+        print(f"offline: sync ok={replica.sync()} pending={replica.pending_count()}")
+
+        database.set_database_path(central)
+        logs_before = database.fetch_one("SELECT COUNT(*) FROM Logs")[0]
+        replica.sync()
+        print(f"back online: uploaded {database.fetch_one('SELECT COUNT(*) FROM Logs')[0] - logs_before} logs, pending={replica.pending_count()}")
+        database.close_all_connections()
@@ -0,0 +1,69 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+import database
+import admin
+import benchmark_suite
+import log_search
+
+# Logs rows generated, runs per query and rows inserted before timing the index catch-up
+LOG_ROWS = 1000000
+RUNS = 20
+INSERT_ROWS = 50000
+
+# Full-text searches and the LIKE scan each one replaces
+QUERIES = [
+    ("guest name", ('logs', "Kamau 25"), "SELECT * FROM Logs WHERE user_name LIKE '%Kamau 25%' LIMIT 51"),
+    ("name", ('logs', "Student 449"), "SELECT * FROM Logs WHERE user_name LIKE '%Student 449%' LIMIT 51"),
+    ("laptop, one week", ('logs', "accessories:laptop", '2024-02-01', '2024-02-07'),
+     "SELECT * FROM Logs WHERE accessories LIKE '%laptop%' AND timestamp >= '2024-02-01' AND timestamp < '2024-02-08' LIMIT 51"),
+    ("prefix, newest", ('logs', "Brian*"), "SELECT * FROM Logs WHERE user_name LIKE '%Brian%' ORDER BY log_id DESC LIMIT 51"),
+    ("guest by host", ('guests', "Registrar Kamau"), "SELECT * FROM Guests WHERE person_visiting LIKE '%Registrar%' AND name LIKE '%Kamau%' LIMIT 51"),
+    ("rare word", ('logs', "nosuchword"), "SELECT * FROM Logs WHERE user_name LIKE '%nosuchword%' OR email LIKE '%nosuchword%' LIMIT 51"),
+]
+
+def median_ms(operation):
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        operation()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+# Insert INSERT_ROWS log rows in batches and return rows per second
+def insert_rate():
+    rows = [('2024-06-01T00:00:00', 1, 'Student 1', 's1@campus.edu', 'enter', 1, 'Laptop, Bag')] * INSERT_ROWS
+    started = time.perf_counter()
+    for i in range(0, INSERT_ROWS, 1000):
+        database.execute_many("INSERT INTO Logs (timestamp, student_id, user_name, email, action, gate_id, accessories) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              rows[i:i + 1000])
+    return INSERT_ROWS / (time.perf_counter() - started)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        LOG_ROWS = int(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'search.db'))
+        admin.initialize_database()
+        benchmark_suite.generate(benchmark_suite.scale_for(LOG_ROWS))
+        # Index the generated rows (the admin console's background indexer does this), then give
+        # one log row in twenty a laptop (through the update trigger)
+        log_search.catch_up()
+        database.execute("UPDATE Logs SET accessories = 'Laptop' WHERE log_id % 20 = 0")
+        print(f"{database.fetch_one('SELECT COUNT(*) FROM Logs')[0]} log rows")
+
+        for label, args, like_sql in QUERIES:
+            fts_ms = median_ms(lambda: log_search.search(*args))
+            like_ms = median_ms(lambda: database.fetch_all(like_sql))
+            print(f"{label:<18} fts {fts_ms:8.2f}ms   like {like_ms:8.2f}ms")
+        print(f"{'name, newest':<18} fts {median_ms(lambda: log_search.search('logs', 'Student 449', newest_first=True)):8.2f}ms")
+        print(f"{'page 20 of name':<18} fts {median_ms(lambda: log_search.search('logs', 'Student 449', page=19)):8.2f}ms")
+
+        # New rows cost nothing extra on insert; the background indexer picks them up in bulk
+        print(f"log inserts      {insert_rate():9.0f} rows/s")
+        started = time.perf_counter()
+        indexed = log_search.catch_up()
+        print(f"catch-up         {indexed / (time.perf_counter() - started):9.0f} rows/s indexed")
+        database.close_all_connections()
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import database
+import admin
+import access_engine
+import accessory_ledger
+import log_browser
+import log_writer
+
+# Default scale and timing settings
+DEFAULT_LOG_ROWS = 100000
+DEFAULT_ITERATIONS = 2000
+WARMUP_ITERATIONS = 100
+SEED = 42
+
+# Rows inserted per executemany while generating data
+GENERATE_BATCH = 10000
+
+# A benchmark fails the baseline comparison when p50 or p99 grows past this factor
+DEFAULT_TOLERANCE = 1.5
+
+# ...and by more than this many microseconds (tail latency of a 5us call is mostly noise)
+NOISE_FLOOR_US = 50
+
+ACCESSORY_TYPES = ('Laptop', 'Tablet', 'Camera', 'Projector', 'Toolbox', 'Microscope', 'Drone', 'Speaker')
+FIRST_NAMES = ('Amina', 'Brian', 'Chen', 'Daniel', 'Esther', 'Faith', 'George', 'Hassan', 'Irene', 'James', 'Kevin', 'Lucy')
+LAST_NAMES = ('Otieno', 'Wanjiru', 'Kamau', 'Njoroge', 'Achieng', 'Mwangi', 'Kiptoo', 'Mutua', 'Odhiambo', 'Wambui')
+
+# Roster sizes that go with a number of log rows
+def scale_for(log_rows):
+    return {
+        'log_rows': log_rows,
+        'students': max(1000, log_rows // 50),
+        'staff': max(100, log_rows // 500),
+        'vehicles': max(500, log_rows // 200),
+        'accessories': max(100, log_rows // 1000),
+        'guests': max(500, log_rows // 100),
+    }
+
+def plate_for(vehicle_id):
+    letters = string.ascii_uppercase
+    return f"K{letters[vehicle_id // 26000 % 26]}{letters[vehicle_id // 1000 % 26]} {vehicle_id % 1000:03d}{letters[vehicle_id // 676000 % 26]}"
+
+def guest_name(guest_id):
+    return f"{FIRST_NAMES[guest_id % len(FIRST_NAMES)]} {LAST_NAMES[guest_id // len(FIRST_NAMES) % len(LAST_NAMES)]} {guest_id}"
+
+# Insert rows from a generator in batches so memory stays flat at any scale
+def insert_batched(sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= GENERATE_BATCH:
+            database.execute_many(sql, batch)
+            batch = []
+    if batch:
+        database.execute_many(sql, batch)
+
+# Fill an initialized database with a reproducible synthetic campus
+def generate(scale, seed=SEED):
+    rng = random.Random(seed)
+    insert_batched("INSERT INTO Student (student_id, name, email, contact, username, password) VALUES (?, ?, ?, ?, ?, ?)",
+                   ((i, f"Student {i}", f"s{i}@campus.edu", '0700000000', f"student{i}", 'default_password')
+                    for i in range(1, scale['students'] + 1)))
+    insert_batched("INSERT INTO Staff (staff_id, name, email, username, password) VALUES (?, ?, ?, ?, ?)",
+                   ((i, f"Staff {i}", f"t{i}@campus.edu", f"staff{i}", 'default_password')
+                    for i in range(1, scale['staff'] + 1)))
+    insert_batched("INSERT INTO Vehicle (vehicle_id, make, model, color, license_plate, owner_id, owner_type) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   ((i, 'Toyota', 'Corolla', 'White', plate_for(i), rng.randint(1, scale['students']), 'Student')
+                    for i in range(1, scale['vehicles'] + 1)))
+    insert_batched("INSERT INTO Accessories (type, description, quantity) VALUES (?, ?, ?)",
+                   ((rng.choice(ACCESSORY_TYPES) + f" {i % 50}", 'Registered item', rng.randint(1, 3))
+                    for i in range(scale['accessories'])))
+
+    start = datetime(2024, 1, 1)
+    # Past visitors: each pass ran for 12 hours from the guest's entrance and has been swept
+    insert_batched("""INSERT INTO Guests (guest_id, name, contact, id_number, age, office_visiting, person_visiting, entrance_time,
+                                          valid_from, valid_until, expired) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)""",
+                   ((i, guest_name(i), '0711000000', f"ID{i:08d}", rng.randint(10, 70), 'Registry', 'Registrar',
+                     (start + timedelta(minutes=i)).isoformat(), (start + timedelta(minutes=i)).isoformat(timespec='seconds'),
+                     (start + timedelta(minutes=i, hours=12)).isoformat(timespec='seconds')) for i in range(1, scale['guests'] + 1)))
+
+    # Log timestamps advance by a random few seconds so rows arrive in time order
+    def log_rows():
+        timestamp = start
+        for _ in range(scale['log_rows']):
+            timestamp += timedelta(seconds=rng.randint(1, 30))
+            kind = rng.random()
+            student_id = staff_id = guest_id = None
+            if kind < 0.8:
+                student_id = rng.randint(1, scale['students'])
+                name = f"Student {student_id}"
+            elif kind < 0.95:
+                staff_id = rng.randint(1, scale['staff'])
+                name = f"Staff {staff_id}"
+            else:
+                guest_id = rng.randint(1, scale['guests'])
+                name = guest_name(guest_id)
+            yield (timestamp.isoformat(), student_id, staff_id, name, '', rng.choice(('enter', 'enter', 'exit', 'denied')),
+                   rng.randint(1, 4), '', None, guest_id)
+    insert_batched(log_writer.LOG_INSERT_SQL, log_rows())
+
+    # One entry in ten brought an accessory in
+    database.execute("""INSERT INTO Accessory_Manifest (log_id, type, description, quantity)
+                        SELECT log_id, 'Laptop 0', 'Carried item', 1 FROM Logs WHERE action = 'enter' AND log_id % 10 = 0""")
+
+# Time one operation; returns latency percentiles in microseconds and throughput
+def measure(operation, args_for, iterations):
+    for i in range(WARMUP_ITERATIONS):
+        operation(*args_for(i))
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        args = args_for(i)
+        call_started = time.perf_counter_ns()
+        operation(*args)
+        latencies.append((time.perf_counter_ns() - call_started) / 1000)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'p50_us': round(latencies[len(latencies) // 2], 2),
+        'p99_us': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+        'max_us': round(latencies[-1], 2),
+        'ops_per_sec': round(iterations / elapsed, 1),
+    }
+
+# Every timed path, as (name, operation, function producing the arguments for call i)
+def benchmarks(scale, rng):
+    students, staff, vehicles, guests = scale['students'], scale['staff'], scale['vehicles'], scale['guests']
+    accessory_types = [row[0] for row in database.fetch_all("SELECT DISTINCT type FROM Accessories")]
+    last_log_id = database.fetch_one("SELECT MAX(log_id) FROM Logs")[0]
+    dates = [(datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 30))).strftime('%Y-%m-%d') for _ in range(64)]
+    log_row = ('2024-06-01T08:00:00', 1, None, 'Student 1', 's1@campus.edu', 'enter', 1, '', None, None)
+    return [
+        ('user_exists (student, db)', access_engine.query_user_exists, lambda i: (str(rng.randint(1, students)), 'student')),
+        ('user_exists (staff, db)', access_engine.query_user_exists, lambda i: (str(rng.randint(1, staff)), 'staff')),
+        ('user_exists (cached)', access_engine.user_exists, lambda i: (str(i % 500 + 1), 'student')),
+        ('vehicle_exists (db)', access_engine.query_vehicle_id, lambda i: (plate_for(rng.randint(1, vehicles)),)),
+        ('vehicle_exists (cached)', access_engine.vehicle_exists, lambda i: (plate_for(i % 500 + 1),)),
+        ('accessory_exists (db)', access_engine.query_accessory_exists, lambda i: (rng.choice(accessory_types),)),
+        # Generated passes have all expired, so this times the lookup of any pass (as an exit does)
+        ('guest name lookup', access_engine.find_guest, lambda i: (guest_name(rng.randint(1, guests)).lower(), False)),
+        ('missing_accessories (db)', access_engine.query_missing_accessories, lambda i: (tuple(rng.sample(accessory_types, 3)),)),
+        ('exit reconciliation', accessory_ledger.reconcile, lambda i: ('student', rng.randint(1, students), {'Laptop 0': 1})),
+        ('log_access', access_engine.write_log, lambda i: (log_row,)),
+        ('view_access_logs (verified, first page)', log_browser.fetch_log_page, lambda i: ('verified',)),
+        ('view_access_logs (verified, deep page)', log_browser.fetch_log_page,
+         lambda i: ('verified', None, rng.randint(1, last_log_id))),
+        ('view_access_logs (verified, by date)', log_browser.fetch_log_page,
+         lambda i: ('verified', {'date_from': rng.choice(dates)})),
+        ('view_access_logs (verified, by user)', log_browser.fetch_log_page,
+         lambda i: ('verified', {'user_id': str(rng.randint(1, students))})),
+        ('view_access_logs (guest, first page)', log_browser.fetch_log_page, lambda i: ('guest',)),
+        ('view_access_logs (guest, by name)', log_browser.fetch_log_page,
+         lambda i: ('guest', {'name': guest_name(rng.randint(1, guests))})),
+    ]
+
+# Run every benchmark against a database at the given scale
+def run_suite(path, log_rows, iterations, seed=SEED):
+    database.set_database_path(path)
+    admin.initialize_database()
+    scale = scale_for(log_rows)
+    generated_in = None
+    if database.fetch_one("SELECT COUNT(*) FROM Logs")[0] == 0:
+        started = time.perf_counter()
+        generate(scale, seed)
+        generated_in = round(time.perf_counter() - started, 2)
+    database.execute("ANALYZE")
+
+    rng = random.Random(seed)
+    results = {}
+    for name, operation, args_for in benchmarks(scale, rng):
+        results[name] = measure(operation, args_for, iterations)
+        print(f"{name:<42} p50 {results[name]['p50_us']:9.1f}us  p99 {results[name]['p99_us']:9.1f}us  "
+              f"{results[name]['ops_per_sec']:10.1f} ops/s", file=sys.stderr)
+    return {
+        'scale': scale,
+        'seed': seed,
+        'generated_seconds': generated_in,
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'machine': platform.machine()},
+        'results': results,
+    }
+
+# Compare a run with a baseline run; returns the list of regressions found.
+# A benchmark the baseline has no entry for counts as one, so a new benchmark cannot go
+# unchecked: record it with --save-baseline in the change that adds it.
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for name, result in report['results'].items():
+        expected = baseline.get('results', {}).get(name)
+        if expected is None:
+            regressions.append(f"{name}: no baseline entry")
+            continue
+        for metric in ('p50_us', 'p99_us'):
+            ratio = result[metric] / expected[metric] if expected[metric] else 1.0
+            result.setdefault('vs_baseline', {})[metric] = round(ratio, 2)
+            if ratio > tolerance and result[metric] - expected[metric] > NOISE_FLOOR_US:
+                regressions.append(f"{name}: {metric} {expected[metric]} -> {result[metric]} ({ratio:.2f}x)")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the database paths used by the admin console and gate terminal.")
+    parser.add_argument('--log-rows', type=int, default=DEFAULT_LOG_ROWS, help="1000 to 10000000")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--db', help="keep the generated database here and reuse it on the next run")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    parser.add_argument('--baseline', help="compare against this JSON report")
+    parser.add_argument('--save-baseline', help="also write the report to this file as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.db:
+        report = run_suite(args.db, args.log_rows, args.iterations, args.seed)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = run_suite(os.path.join(tmp, 'benchmark.db'), args.log_rows, args.iterations, args.seed)
+            database.close_all_connections()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('scale') != report['scale']:
+            print("Warning: baseline was recorded at a different scale", file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance)
+        report['regressions'] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            baseline_file.write(output + '\n')
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
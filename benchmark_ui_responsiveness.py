@@ -0,0 +1,82 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tkinter as tk
+import database
+import admin
+import benchmark_suite
+import ui_worker
+
+# Log rows generated, the interval the UI is expected to tick at and how many slow queries run
+LOG_ROWS = 200000
+TICK_MS = 10
+QUERIES = 5
+
+# Deliberately unindexed query standing in for a slow report
+SLOW_QUERY = "SELECT action, COUNT(*), MAX(user_name) FROM Logs WHERE email LIKE '%9%' GROUP BY action"
+
+def slow_query():
+    return database.fetch_all(SLOW_QUERY)
+
+# Run the slow queries while timing the gaps between UI ticks; returns the gaps in ms
+def measure(root, run_queries):
+    gaps = []
+    state = {'last': time.perf_counter(), 'done': False}
+
+    def tick():
+        now = time.perf_counter()
+        gaps.append((now - state['last']) * 1000)
+        state['last'] = now
+        if state['done']:
+            root.quit()
+        else:
+            root.after(TICK_MS, tick)
+
+    def finished():
+        state['done'] = True
+
+    root.after(TICK_MS, tick)
+    root.after(TICK_MS * 5, lambda: run_queries(finished))
+    root.mainloop()
+    return gaps
+
+# Old behaviour: the queries run inside the Tk callback
+def run_inline(finished):
+    for _ in range(QUERIES):
+        slow_query()
+    finished()
+
+# New behaviour: the queries run on the worker and report back through root.after
+def run_on_worker(finished):
+    remaining = [QUERIES]
+
+    def done(_):
+        remaining[0] -= 1
+        if remaining[0]:
+            ui_worker.submit(slow_query, on_done=done)
+        else:
+            finished()
+
+    ui_worker.submit(slow_query, on_done=done)
+
+def summary(gaps):
+    gaps = sorted(gaps)
+    return f"ticks {len(gaps):5d}  p50 {statistics.median(gaps):7.1f}ms  p99 {gaps[int(len(gaps) * 0.99) - 1]:7.1f}ms  max {gaps[-1]:7.1f}ms"
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        LOG_ROWS = int(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'ui.db'))
+        admin.initialize_database()
+        benchmark_suite.generate(benchmark_suite.scale_for(LOG_ROWS))
+
+        root = tk.Tk()
+        root.withdraw()
+        ui_worker.start(root)
+        print(f"inline    {summary(measure(root, run_inline))}")
+        print(f"worker    {summary(measure(root, run_on_worker))}")
+        root.destroy()
+        database.close_all_connections()
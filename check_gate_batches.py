@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+import tempfile
+import database
+import admin
+import gate_service
+
+STUDENTS = 3
+
+def student_request(student_id):
+    return {'type': 'student', 'id': student_id, 'name': f"student {student_id}", 'email': '', 'gate_id': 1, 'direction': 'enter'}
+
+# A request that gets past nothing but the batcher and raises while being decided
+# (a guest name that cannot be bound as a query parameter)
+BAD_REQUEST = {'type': 'guest', 'name': ['not', 'a', 'name'], 'gate_id': 1, 'direction': 'enter'}
+
+# Student IDs with a Logs row
+def logged_students():
+    return {row[0] for row in database.fetch_all("SELECT student_id FROM Logs WHERE student_id IS NOT NULL")}
+
+def report(label, ok, detail=''):
+    print(f"{'ok  ' if ok else 'FAIL'}  {label}{': ' + detail if detail and not ok else ''}")
+    return 0 if ok else 1
+
+# One bad request decided with good ones: the good ones are decided and logged, the bad one fails alone
+def check_decide_batch():
+    decisions = gate_service.decide_batch([student_request(1), BAD_REQUEST, student_request(2)])
+    failures = report("good requests decided beside a bad one", decisions[0]['allowed'] and decisions[2]['allowed'],
+                      str([decision['reason'] for decision in decisions]))
+    failures += report("bad request fails alone", decisions[1].get('error') is not None and decisions[1]['log'] is None)
+    failures += report("good requests logged", logged_students() == {1, 2}, str(logged_students()))
+    return failures
+
+# The same through the service's batcher: each terminal gets its own answer
+async def check_service():
+    service = gate_service.GateService(batch_window_ms=20)
+    service._queue = asyncio.Queue()
+    batcher = asyncio.create_task(service._run_batches())
+    loop = asyncio.get_running_loop()
+    futures = [loop.create_future() for _ in range(2)]
+    await service._queue.put((BAD_REQUEST, futures[0]))
+    await service._queue.put((student_request(3), futures[1]))
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    batcher.cancel()
+    service._executor.shutdown()
+
+    failures = report("service answers the bad request with an error", isinstance(results[0], Exception), repr(results[0]))
+    failures += report("service admits the good request batched with it", isinstance(results[1], dict) and results[1]['allowed'], repr(results[1]))
+    failures += report("service batched them together", service.stats['batches'] == 1, str(service.stats))
+    try:
+        await service.submit(BAD_REQUEST)
+        failures += report("submit rejects the bad request before batching", False)
+    except ValueError:
+        failures += report("submit rejects the bad request before batching", True)
+    return failures
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'batches.db'))
+        admin.initialize_database()
+        database.execute_many("INSERT INTO Student (student_id, name, email, username, password) VALUES (?, ?, '', ?, '')",
+                              [(i, f"student {i}", f"student{i}") for i in range(1, STUDENTS + 1)])
+        failures = check_decide_batch()
+        failures += asyncio.run(check_service())
+        database.close_all_connections()
+    sys.exit(1 if failures else 0)
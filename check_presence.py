@@ -0,0 +1,125 @@
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import database
+import admin
+import gate_service
+import log_writer
+import presence_tracker
+from presence_tracker import person_of
+
+# People on the roster and gate events driven through the gate service per round
+STUDENTS = 200
+STAFF = 20
+EVENTS = 2000
+BATCH = 32
+SEED = 7
+
+# Who is inside according to Logs alone: (person_type, person_id) -> gate of their entry
+def inside_from_logs():
+    inside = {}
+    for student_id, staff_id, guest_id, action, gate_id in database.fetch_all(
+            "SELECT student_id, staff_id, guest_id, action, gate_id FROM Logs ORDER BY log_id"):
+        person = person_of(student_id, staff_id, guest_id)
+        if person is None:
+            continue
+        if action == 'enter':
+            inside.setdefault(person, gate_id)
+        elif action == 'exit':
+            inside.pop(person, None)
+    return inside
+
+def inside_of(tracker):
+    return {(person_type, person_id): gate_id for person_type, person_id, gate_id in tracker.inside()}
+
+# Random entries and exits, some from people already inside or outside (so anti-passback refuses
+# them), and now and then a request without a name, which fails its whole batch
+def requests(rng, count):
+    for _ in range(count):
+        if rng.random() < 0.9:
+            user_type, user_id = 'student', rng.randint(1, STUDENTS)
+        else:
+            user_type, user_id = 'staff', rng.randint(1, STAFF)
+        request = {'type': user_type, 'id': user_id, 'name': f"{user_type} {user_id}", 'email': '',
+                   'gate_id': rng.randint(1, 4), 'direction': rng.choice(('enter', 'exit'))}
+        if rng.random() < 0.02:
+            del request['name']
+        yield request
+
+# Drive a round of events through gate_service.decide_batch while another terminal (a separate
+# connection) writes entries in between. Returns the number of failed batches.
+def run_events(rng, count):
+    batch, failed = [], 0
+    for request in requests(rng, count):
+        batch.append(request)
+        if len(batch) < BATCH:
+            continue
+        try:
+            gate_service.decide_batch(batch)
+        except sqlite3.IntegrityError:
+            failed += 1
+        batch = []
+        if rng.random() < 0.2:
+            other_terminal(rng.randint(1, STUDENTS))
+    return failed
+
+# An entry written by another terminal, which this process only sees through Logs
+def other_terminal(student_id):
+    conn = sqlite3.connect(database.DATABASE_PATH)
+    with conn:
+        conn.execute(log_writer.LOG_INSERT_SQL, (
+            '2024-01-01T08:00:00', student_id, None, f"student {student_id}", '', 'enter', 2, '', None, None))
+    conn.close()
+
+# Compare a tracker with Logs; returns the number of differences and prints them
+def compare(label, tracker):
+    tracker.refresh(force=True)
+    expected, actual = inside_from_logs(), inside_of(tracker)
+    phantoms = sorted(set(actual) - set(expected))
+    missing = sorted(set(expected) - set(actual))
+    wrong_gate = sorted(person for person in set(actual) & set(expected) if actual[person] != expected[person])
+    counts_ok = tracker.occupancy() == len(actual)
+    if phantoms or missing or wrong_gate or not counts_ok:
+        print(f"FAIL  {label}: {len(phantoms)} inside but not in Logs {phantoms[:5]}, "
+              f"{len(missing)} missing {missing[:5]}, {len(wrong_gate)} with the wrong gate, occupancy count ok={counts_ok}")
+        return 1
+    print(f"ok    {label}: {len(actual)} inside")
+    return 0
+
+# Record events, checkpoint, restart from the checkpoint and compare with Logs each time
+def check_presence(seed=SEED):
+    rng = random.Random(seed)
+    database.execute_many("INSERT INTO Student (student_id, name, email, username, password) VALUES (?, ?, '', ?, '')",
+                          [(i, f"student {i}", f"student{i}") for i in range(1, STUDENTS + 1)])
+    database.execute_many("INSERT INTO Staff (staff_id, name, email, username, password) VALUES (?, ?, '', ?, '')",
+                          [(i, f"staff {i}", f"staff{i}") for i in range(1, STAFF + 1)])
+    database.execute_many("INSERT OR IGNORE INTO Gate_Status (gate_id, gate_name, status) VALUES (?, ?, 'closed')",
+                          [(gate_id, f"Gate {gate_id}") for gate_id in range(2, 5)])
+
+    failures = 0
+    failed_batches = run_events(rng, EVENTS)
+    failures += compare(f"running tracker ({failed_batches} failed batches)", presence_tracker.shared_tracker())
+
+    presence_tracker.shared_tracker().checkpoint()
+    failures += compare("restart from checkpoint", restart())
+
+    # Events after the checkpoint are replayed from the log tail on the next start
+    failed_batches = run_events(rng, EVENTS)
+    failures += compare("restart from checkpoint plus log tail", restart())
+    return failures
+
+# Drop the process's tracker and connections and load it again, as a fresh start would
+def restart():
+    presence_tracker._shared = None
+    database.close_all_connections()
+    return presence_tracker.shared_tracker()
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'presence.db'))
+        admin.initialize_database()
+        failures = check_presence()
+        database.close_all_connections()
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import database
+import admin
+import access_engine
+import accessory_ledger
+import anomaly_detector
+import gate_registry
+import guest_passes
+import log_browser
+import log_search
+import presence_tracker
+import traffic_rollups
+
+# Every query that runs on a gate event or when the admin console opens a view, taken from
+# the modules that run it (dynamic ones from the same builders the modules call).
+# The list is checked against EXPLAIN QUERY PLAN so a missing index shows up as a SCAN.
+NOW = '2024-01-01T08:00:00'
+HOT_QUERIES = [
+    ("user_exists (student)", access_engine.USER_EXISTS_SQL['student'], (1,)),
+    ("user_exists (staff)", access_engine.USER_EXISTS_SQL['staff'], (1,)),
+    ("find_vehicle", access_engine.VEHICLE_ID_SQL, ('KAA 001A',)),
+    ("accessory_exists", access_engine.ACCESSORY_EXISTS_SQL, ('Laptop',)),
+    ("missing accessories", access_engine.ACCESSORY_TYPES_SQL.format('?, ?, ?'), ('Laptop', 'Camera', 'Tablet')),
+    ("snapshot locked gates", access_engine.LOCKED_GATES_SQL, ()),
+    ("snapshot students", access_engine.SNAPSHOT_STUDENTS_SQL.format('?, ?'), (1, 2)),
+    ("snapshot staff", access_engine.SNAPSHOT_STAFF_SQL.format('?, ?'), (1, 2)),
+    ("snapshot vehicles", access_engine.SNAPSHOT_VEHICLES_SQL.format('?, ?'), ('KAA 001A', 'KAA 002A')),
+    ("guest login", access_engine.ACTIVE_GUEST_SQL, ('jane doe', NOW, NOW)),
+    ("guest exit lookup", access_engine.LATEST_GUEST_SQL, ('jane doe',)),
+    ("gate registry load", gate_registry.LOAD_GATES_SQL, ()),
+    ("presence log tail", presence_tracker.TAIL_SQL, (0,)),
+] + [
+    (f"exit reconciliation entry ({person_type})", accessory_ledger.LAST_ENTRY_SQL.format(column=column), (1,))
+    for person_type, column in presence_tracker.PERSON_COLUMNS
+] + [
+    ("exit reconciliation manifest", accessory_ledger.CARRIED_IN_SQL, (1,)),
+    ("guest pass expiry", guest_passes.EXPIRE_BATCH_SQL, (NOW, 1000)),
+    ("guest pass archive", guest_passes.ARCHIVE_BATCH_SQL, (NOW, 1000)),
+    ("log browser first page", *log_browser.page_query('verified')),
+    ("log browser older page", *log_browser.page_query('verified', older_than=1000)),
+    ("log browser newer page", *log_browser.page_query('verified', newer_than=1000)),
+    ("log browser by gate", *log_browser.page_query('verified', {'gate_id': 1})),
+    ("log browser by user", *log_browser.page_query('verified', {'user_id': 1}, older_than=1000)),
+    ("log browser page by date", *log_browser.page_query('verified', {'date_from': '2024-01-01', 'date_to': '2024-01-31'})),
+    ("log browser older page by date", *log_browser.page_query('verified', {'date_from': '2024-01-01'}, older_than=1000)),
+    ("log browser by gate and date", *log_browser.page_query('verified', {'gate_id': 1, 'date_from': '2024-01-01'})),
+    ("guest browser older page", *log_browser.page_query('guest', older_than=1000)),
+    ("guest browser page by date", *log_browser.page_query('guest', {'date_from': '2024-01-01'}, newer_than=1000)),
+    ("traffic rollup catch-up", traffic_rollups.CATCH_UP_SQL, ()),
+    ("traffic report", *traffic_rollups.counts_query('2024-01-01 07:00', '2024-01-01 09:00', group_by=('gate_id',))),
+    ("log search", *log_search.search_query('logs', '"laptop"')),
+    ("log search by date", *log_search.search_query('logs', '"laptop"', '2024-01-01', '2024-01-31', newest_first=True)),
+    ("guest search", *log_search.search_query('guests', '"kamau"')),
+    ("search index catch-up (logs)", log_search.index_new_rows_sql('logs'), ('logs',)),
+    ("search index catch-up (guests)", log_search.index_new_rows_sql('guests'), ('guests',)),
+    ("new anomaly alerts", anomaly_detector.NEW_ALERTS_SQL, (0, 200)),
+    ("anomaly replay", anomaly_detector.REPLAY_SQL, ('2024-01-01', '2024-02-01')),
+]
+
+# Tables with a row per physical gate, read whole on purpose
+SMALL_TABLES = ('Gate_Status',)
+
+# Return the plan lines that read a whole table instead of searching an index
+# (a full-text index answering a MATCH shows up as a virtual table scan with an M constraint,
+# and SMALL_TABLES may be read whole)
+def find_scans(conn, sql, params):
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row[3] for row in plan if row[3].startswith('SCAN') and 'CONSTANT ROW' not in row[3]
+            and not ('VIRTUAL TABLE INDEX' in row[3] and ':M' in row[3])
+            and row[3].split()[1] not in SMALL_TABLES]
+
+# Check every hot query against a freshly initialized schema; returns the number of failures
+def check_query_plans():
+    failures = 0
+    conn = database.get_connection()
+    for name, sql, params in HOT_QUERIES:
+        scans = find_scans(conn, sql, params)
+        if scans:
+            failures += 1
+            print(f"FAIL  {name}: {'; '.join(scans)}")
+        else:
+            print(f"ok    {name}")
+    return failures
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database_path(os.path.join(tmp, 'plans.db'))
+        admin.initialize_database()
+        failures = check_query_plans()
+        database.close_all_connections()
+    sys.exit(1 if failures else 0)
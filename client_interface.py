@@ -1,11 +1,66 @@
+import os
+import sqlite3
+import threading
 import tkinter as tk
 from tkinter import messagebox, simpledialog
-import sqlite3
-from datetime import datetime
+import compact_roster
+import log_writer
+import migrations
+import access_engine
+import accessory_ledger
+import anomaly_detector
+import gate_registry
+import metrics
+import terminal_replica
+import ui_worker
+
+# Face matching needs numpy, which is only imported when the first embedding arrives;
+# without it the terminal falls back to manual identification
+face_matcher = None
+
+# Local replica of the authorization tables (set up in main when SMART_GATE_REPLICA is set)
+replica = None
+
+# Compact in-memory roster mapped from a snapshot (set up in main when SMART_GATE_ROSTER_SNAPSHOT is set)
+roster_store = None
+
+# Where admission checks are answered: the local replica if there is one, then the compact
+# roster, otherwise the central database
+def terminal_roster():
+    if replica is not None:
+        return replica.roster()
+    if roster_store is not None:
+        return roster_store.roster
+    return access_engine.LIVE_ROSTER
+
+# Log an admission: queued in the replica for upload, or written to the central database
+def record_decision(decision):
+    if replica is not None:
+        replica.record(decision)
+    else:
+        access_engine.record_decision(decision)
+    anomaly_detector.notify_decisions([decision])
+
+# Pass a refusal to the anomaly detector (admissions reach it through record_decision)
+def note_decision(decision):
+    if not decision['allowed']:
+        anomaly_detector.notify_decisions([decision])
+    return decision
 
-# Placeholder function for face recognition and access granting
-def recognize_and_grant_access():
-    recognized_user = recognize_face()
+# Check a student or staff member (runs on a database worker thread)
+def check_access(user):
+    return note_decision(access_engine.evaluate_access(user, terminal_roster()))
+
+# Check a guest (runs on a database worker thread)
+def check_guest_access(guest, id_number):
+    return note_decision(access_engine.evaluate_guest_access(guest, id_number, TERMINAL_GATE_ID, terminal_roster()))
+
+# Face recognition and access granting (embedding comes from the camera pipeline when present)
+def recognize_and_grant_access(embedding=None):
+    recognize_face(embedding, grant_recognized)
+
+# Continue granting access once the person at the gate is identified
+def grant_recognized(recognized_user):
     if recognized_user:
         user_type = recognized_user.get('type')
         if user_type == 'student':
@@ -17,11 +72,22 @@ def recognize_and_grant_access():
     else:
         messagebox.showerror("Access Denied", "User not recognized.")
 
-# Placeholder function for face recognition (replace with actual logic)
-def recognize_face():
+# Identify the person at the gate and pass them (or None) to on_identified: match the face
+# embedding on a database worker if there is one, otherwise ask
+def recognize_face(embedding, on_identified):
+    if embedding is None:
+        on_identified(ask_identity())
+        return
+    def matched(result):
+        available, user = result
+        on_identified(user if available else ask_identity())
+    ui_worker.submit(match_face, embedding, on_done=matched, description="Recognizing face...")
+
+# Ask the person at the gate who they are
+def ask_identity():
     name = simpledialog.askstring("Input", "Enter your name:")
     email = simpledialog.askstring("Input", "Enter your email:")
-    user_type = simpledialog.askstring("Input", "Enter your type (student/staff):")
+    user_type = simpledialog.askstring("Input", "Enter your type (student/staff/guest):")
 
     if not name or not email or not user_type:
         messagebox.showerror("Error", "All fields are required.")
@@ -30,93 +96,45 @@ def recognize_face():
     recognized_user = {'name': name, 'email': email, 'type': user_type}
     return recognized_user
 
-# Function to check if the user exists in the database
-def user_exists(user_id, user_type):
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        if user_type == 'student':
-            cursor.execute("SELECT * FROM Student WHERE student_id = ?", (user_id,))
-        elif user_type == 'staff':
-            cursor.execute("SELECT * FROM Staff WHERE staff_id = ?", (user_id,))
-        result = cursor.fetchone()
-    return result is not None
-
-# Function to check if the vehicle exists in the database
-def vehicle_exists(license_plate):
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Vehicle WHERE license_plate = ?", (license_plate,))
-        result = cursor.fetchone()
-    return result is not None
-
-# Function to check if the accessory exists in the database
-def accessory_exists(accessory_type):
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Accessories WHERE type = ?", (accessory_type,))
-        result = cursor.fetchone()
-    return result is not None
-
-# Logging access events
-def log_access(user, action, accessories='', vehicle_id=None):
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        timestamp = datetime.now().isoformat()
-        cursor.execute("""
-            INSERT INTO Logs (timestamp, student_id, staff_id, user_name, email, action, gate_id, accessories, vehicle_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            timestamp, 
-            user.get('id') if user.get('type') == 'student' else None, 
-            user.get('id') if user.get('type') == 'staff' else None, 
-            user.get('name'), 
-            user.get('email', ''),  # Provide default empty string for email if not present
-            action, 
-            1, 
-            accessories, 
-            vehicle_id
-        ))
-        conn.commit()
-
-# Function to prompt for vehicle details
-def prompt_vehicle_details(user_id, user_type):
-    vehicle_details = {}
-    vehicle_details['make'] = simpledialog.askstring("Vehicle Details", "Enter Vehicle Make:")
-    if not vehicle_details['make']:
-        messagebox.showerror("Error", "Vehicle make is required.")
-        return None
-
-    vehicle_details['model'] = simpledialog.askstring("Vehicle Details", "Enter Vehicle Model:")
-    if not vehicle_details['model']:
-        messagebox.showerror("Error", "Vehicle model is required.")
-        return None
-
-    vehicle_details['color'] = simpledialog.askstring("Vehicle Details", "Enter Vehicle Color:")
-    if not vehicle_details['color']:
-        messagebox.showerror("Error", "Vehicle color is required.")
+# Match an embedding (runs on a database worker thread). Returns (available, user): available
+# is False without numpy, so the terminal asks instead.
+def match_face(embedding):
+    if get_face_matcher() is None:
+        return False, None
+    return True, recognize_face_embedding(embedding)
+
+_face_matcher = None
+_face_matcher_lock = threading.Lock()
+
+# Load the face index once per terminal; None without numpy. The first call imports numpy and
+# may build the index, so it only runs on a database worker, never on the Tk thread.
+def get_face_matcher():
+    global _face_matcher, face_matcher
+    with _face_matcher_lock:
+        if _face_matcher is None:
+            try:
+                import face_matcher
+            except ImportError:
+                return None
+            _face_matcher = face_matcher.FaceMatcher.load_or_build()
+    return _face_matcher
+
+# Match an embedding against everyone enrolled; returns the user dict or None
+def recognize_face_embedding(embedding):
+    matches = get_face_matcher().match(embedding, top_k=1)
+    if not matches:
         return None
-
-    vehicle_details['license_plate'] = simpledialog.askstring("Vehicle Details", "Enter License Plate Number:")
-    if not vehicle_details['license_plate']:
+    person_type, person_id, score = matches[0]
+    return face_matcher.person_details(person_type, person_id)
+
+# Ask for the plate of the vehicle being driven in. Vehicles are registered at the admin
+# console; the gate only matches the plate and logs the vehicle_id it matched.
+def prompt_license_plate():
+    license_plate = simpledialog.askstring("Vehicle Details", "Enter License Plate Number:")
+    if not license_plate:
         messagebox.showerror("Error", "License plate number is required.")
         return None
-
-    if vehicle_exists(vehicle_details['license_plate']):
-        log_vehicle_details(user_id, vehicle_details['make'], vehicle_details['model'], vehicle_details['color'], vehicle_details['license_plate'], user_type)
-        return vehicle_details
-    else:
-        messagebox.showerror("Error", "Vehicle not registered. Access denied.")
-        return None
-
-# Logging vehicle details
-def log_vehicle_details(owner_id, make, model, color, license_plate, owner_type):
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO Vehicles (owner_id, owner_type, make, model, color, license_plate)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (owner_id, owner_type, make, model, color, license_plate))
-        conn.commit()
+    return license_plate.strip()
 
 # Function to prompt for accessory details
 def prompt_accessories_details(user_id, user_type):
@@ -137,58 +155,56 @@ def prompt_accessories_details(user_id, user_type):
             messagebox.showerror("Error", "Accessory quantity is required.")
             return None
 
-        if accessory_exists(accessory['type']):
-            accessories_details.append(accessory)
-        else:
-            messagebox.showerror("Error", f"Accessory '{accessory['type']}' not found. Access denied.")
-            return None
+        accessories_details.append(accessory)
 
-    log_accessories_details(user_id, user_type, accessories_details)
     return accessories_details
 
-# Logging accessory details
-def log_accessories_details(user_id, user_type, accessories):
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        for accessory in accessories:
-            cursor.execute("""
-                INSERT INTO Accessories (user_id, user_type, type, description, quantity)
-                VALUES (?, ?, ?, ?, ?)
-            """, (user_id, user_type, accessory['type'], accessory['description'], accessory['quantity']))
-        conn.commit()
-
-# Function to grant access to verified users
+# Function to grant access to verified users (the decision itself is made by access_engine)
 def grant_access(user, user_type):
-    user_id = simpledialog.askstring("User ID", "Enter your ID:")
-    if not user_exists(user_id, user_type):
-        messagebox.showerror("Access Denied", f"{user_type.capitalize()} ID not found in the database. Access denied.")
-        return
-    
+    user_id = user.get('id') or simpledialog.askstring("User ID", "Enter your ID:")
     user['id'] = user_id
+    user['type'] = user_type
+    user['gate_id'] = TERMINAL_GATE_ID
 
-    with sqlite3.connect('smart_gate_management.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT is_locked_down FROM Gate_Status WHERE gate_id = 1")
-        is_locked_down = cursor.fetchone()[0]
-
-    if is_locked_down:
-        messagebox.showerror("Access Denied", "The gate is currently on lockdown. Access denied.")
-    else:
-        log_access(user, 'enter')
+    # Check identity and lockdown before asking about vehicles and accessories
+    def identity_checked(decision):
+        if not decision['allowed']:
+            messagebox.showerror("Access Denied", decision['reason'])
+            return
 
         has_vehicle = messagebox.askyesno("Vehicle", "Do you have a vehicle?")
         if has_vehicle:
-            vehicle_details = prompt_vehicle_details(user_id, user_type)
-            if not vehicle_details:
+            license_plate = prompt_license_plate()
+            if not license_plate:
                 return
+            user['license_plate'] = license_plate
 
         has_accessories = messagebox.askyesno("Accessories", "Do you have accessories?")
+        accessories_details = None
         if has_accessories:
             accessories_details = prompt_accessories_details(user_id, user_type)
             if not accessories_details:
                 return
+            user['accessories'] = [accessory['type'] for accessory in accessories_details]
+            user['manifest'] = accessories_details
+
+        ui_worker.submit(admit, user, on_done=admitted, description="Checking access...", write=True)
+
+    def admitted(decision):
+        if not decision['allowed']:
+            messagebox.showerror("Access Denied", decision['reason'])
+            return
+        messagebox.showinfo("Access Granted", decision['reason'])
+
+    ui_worker.submit(check_access, user, on_done=identity_checked, description="Checking access...")
 
-        messagebox.showinfo("Access Granted", f"Access Granted to {user['name']}. The gate is now open.")
+# Final check for grant_access, logging the admission with its accessory manifest and the
+# vehicle_id its plate matched (runs on a database worker thread)
+def admit(user):
+    decision = check_access(user)
+    if decision['allowed']:
+        record_decision(decision)
+    return decision
 
 # Function to confirm student identity
 def confirm_student_identity(user):
@@ -198,6 +214,58 @@ def confirm_student_identity(user):
 def confirm_staff_identity(user):
     grant_access(user, 'staff')
 
+# Record someone leaving through this terminal's gate
+def record_exit(embedding=None):
+    recognize_face(embedding, exit_recognized)
+
+# Continue recording the exit once the person at the gate is identified
+def exit_recognized(user):
+    if not user:
+        messagebox.showerror("Error", "User not recognized.")
+        return
+
+    if user.get('type') != 'guest':
+        user['id'] = user.get('id') or simpledialog.askstring("User ID", "Enter your ID:")
+        user['gate_id'] = TERMINAL_GATE_ID
+        user['direction'] = 'exit'
+
+        if messagebox.askyesno("Accessories", "Are you carrying accessories out?"):
+            accessories_details = prompt_accessories_details(user['id'], user.get('type'))
+            if accessories_details is None:
+                return
+            user['accessories'] = [accessory['type'] for accessory in accessories_details]
+            user['manifest'] = accessories_details
+
+    def exit_checked(decision):
+        if decision is None:
+            messagebox.showerror("Error", "Guest not found. Please contact administration.")
+        elif not decision['allowed']:
+            messagebox.showerror("Exit Denied", decision['reason'])
+        elif decision.get('reconciliation') and decision['reconciliation']['not_brought_in']:
+            messagebox.showwarning("Check Accessories", f"{decision['reason']}\n{accessory_ledger.describe(decision['reconciliation'])}")
+        else:
+            messagebox.showinfo("Exit Recorded", f"{decision['reason']}\n{accessory_ledger.describe(decision.get('reconciliation'))}")
+
+    ui_worker.submit(decide_exit, user, on_done=exit_checked, description="Recording exit...", write=True)
+
+# Evaluate and log an exit (runs on a database worker thread); None for an unknown guest
+def decide_exit(user):
+    if user.get('type') == 'guest':
+        guest = access_engine.find_guest(user['name'], active_only=False)
+        if guest is None:
+            return None
+        decision = access_engine.evaluate_guest_access(guest, gate_id=TERMINAL_GATE_ID, roster=terminal_roster(), direction='exit')
+    else:
+        decision = access_engine.evaluate_access(user, terminal_roster())
+    if decision['allowed']:
+        # Compare with what came in before this exit is logged; skipped when the central log is unreachable
+        try:
+            decision['reconciliation'] = accessory_ledger.reconcile_exit(decision)
+        except sqlite3.Error:
+            decision['reconciliation'] = None
+        record_decision(decision)
+    return note_decision(decision)
+
 # Handling guest access
 def access_as_guest():
     def submit_login():
@@ -206,40 +274,36 @@ def access_as_guest():
             messagebox.showerror("Error", "Name cannot be empty.")
             return
 
-        with sqlite3.connect('smart_gate_management.db') as conn:
-            cursor = conn.cursor()
-            # Ensure case-insensitive matching by using LOWER function
-            cursor.execute("SELECT * FROM Guests WHERE LOWER(name) = LOWER(?)", (name.lower(),))
-            result = cursor.fetchone()
-
-        if result:
-            guest_details = {
-                'name': result[1],
-                'contact': result[2],
-                'id_number': result[3],
-                'age': result[4],
-                'office_visiting': result[5],
-                'person_visiting': result[6]
-            }
-
-            if guest_details['age'] >= 18:
+        ui_worker.submit(access_engine.find_guest, name, on_done=guest_found, description="Looking up guest...")
+
+    def guest_found(guest_details):
+        if guest_details:
+            problem = access_engine.guest_age_problem(guest_details)
+            if problem:
+                messagebox.showerror("Error", problem)
+                return
+            id_number = None
+            if access_engine.guest_needs_id(guest_details):
                 id_number = simpledialog.askstring("ID Number", "Enter your ID Number:")
-                if not id_number:
-                    messagebox.showerror("Error", "ID Number is required for guests 18 and above.")
-                    return
-                if id_number != guest_details['id_number']:
-                    messagebox.showerror("Error", "ID Number does not match. Access denied.")
-                    return
-
-            prompt_access(guest_details)
+
+            ui_worker.submit(check_guest_access, guest_details, id_number, on_done=guest_checked, description="Checking access...")
         else:
-            messagebox.showerror("Error", "Guest not found. Please contact administration.")
+            messagebox.showerror("Error", "No valid guest pass found. Please contact administration.")
+
+    def guest_checked(decision):
+        if not decision['allowed']:
+            messagebox.showerror("Error", decision['reason'])
+            return
+        prompt_access(decision)
 
-    def prompt_access(guest_details):
+    def prompt_access(decision):
         access_window = tk.Toplevel()
         access_window.title("Grant Access")
         tk.Label(access_window, text="Do you want to grant access?").pack()
-        tk.Button(access_window, text="Yes", command=lambda: (log_access(guest_details, 'enter'), messagebox.showinfo("Access Granted", f"Access Granted to {guest_details['name']}. The gate is now open."), access_window.destroy())).pack()
+        def granted(_):
+            messagebox.showinfo("Access Granted", decision['reason'])
+            access_window.destroy()
+        tk.Button(access_window, text="Yes", command=lambda: ui_worker.submit(record_decision, decision, on_done=granted, write=True)).pack()
         tk.Button(access_window, text="No", command=access_window.destroy).pack()
 
     login_window = tk.Toplevel()
@@ -251,13 +315,51 @@ def access_as_guest():
 
     tk.Button(login_window, text="Login", command=submit_login).pack()
 
-# Creating the main window
-root = tk.Tk()
-root.title("Smart Gate Management System")
+# Gate this terminal controls (SMART_GATE_ID, default Main Gate)
+TERMINAL_GATE_ID = int(os.environ.get('SMART_GATE_ID', gate_registry.DEFAULT_GATE_ID))
+
+# Start the terminal: background services, then the main window
+def main():
+    global replica, roster_store
+
+    # Export timings when SMART_GATE_METRICS=1
+    metrics.start_exporting()
+
+    # Answer admissions from a local replica kept in sync in the background when SMART_GATE_REPLICA is set
+    if os.environ.get('SMART_GATE_REPLICA'):
+        replica = terminal_replica.TerminalReplica(os.environ['SMART_GATE_REPLICA'])
+        replica.start_sync()
+    else:
+        # Create or upgrade the central schema (a single PRAGMA read when it is current)
+        migrations.migrate()
+
+        # Answer ID and plate checks from a memory-mapped compact roster when SMART_GATE_ROSTER_SNAPSHOT is set
+        if os.environ.get('SMART_GATE_ROSTER_SNAPSHOT'):
+            roster_store = compact_roster.RosterStore(os.environ['SMART_GATE_ROSTER_SNAPSHOT'])
+            roster_store.start_refreshing()
+
+    # Keep the gate state in memory and pick up lockdowns as soon as they are committed
+    gate_registry.registry.start_watching()
+
+    # Watch this terminal's decisions for anomalies; alerts are stored for the admin console
+    anomaly_detector.shared_detector()
+
+    # Buffer access logs in the background when SMART_GATE_BUFFERED_LOGS=1
+    if os.environ.get('SMART_GATE_BUFFERED_LOGS') == '1':
+        log_writer.start_buffered_logging()
+
+    # Creating the main window
+    root = tk.Tk()
+    root.title("Smart Gate Management System")
+    ui_worker.start(root)
+
+    tk.Label(root, text="Smart Gate Management System", font=("Helvetica", 16)).pack(pady=20)
 
-tk.Label(root, text="Smart Gate Management System", font=("Helvetica", 16)).pack(pady=20)
+    tk.Button(root, text="Recognize and Grant Access", command=recognize_and_grant_access).pack(pady=10)
+    tk.Button(root, text="Access as Guest", command=access_as_guest).pack(pady=10)
+    tk.Button(root, text="Record Exit", command=record_exit).pack(pady=10)
 
-tk.Button(root, text="Recognize and Grant Access", command=recognize_and_grant_access).pack(pady=10)
-tk.Button(root, text="Access as Guest", command=access_as_guest).pack(pady=10)
+    root.mainloop()
 
-root.mainloop()
+if __name__ == '__main__':
+    main()
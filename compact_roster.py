@@ -0,0 +1,277 @@
+import argparse
+import array
+import bisect
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import database
+import access_engine
+import plate_index
+from auth_cache import read_roster_version
+
+# Snapshot file a terminal maps at start-up
+DEFAULT_SNAPSHOT = os.environ.get('SMART_GATE_ROSTER_SNAPSHOT', 'roster.snapshot')
+
+# How often a running terminal checks whether the roster changed
+REFRESH_INTERVAL_S = 5
+
+# Rows read per fetch during the bulk load
+FETCH_SIZE = 5000
+
+# Stored in place of a NULL department_id
+NO_DEPARTMENT = -1
+
+# Person types held, with their table and key column
+PERSON_TABLES = (('student', 'Student', 'student_id'), ('staff', 'Staff', 'staff_id'))
+
+# Columns in file order. IDs are sorted and the other person columns run parallel to them;
+# plate_offsets[i]:plate_offsets[i + 1] is the i-th plate (in sorted order) in plate_bytes.
+SECTIONS = ('student_ids', 'student_levels', 'student_departments',
+            'staff_ids', 'staff_levels', 'staff_departments',
+            'plate_offsets', 'plate_bytes', 'plate_vehicle_ids')
+
+# File header (magic, roster version, section count) followed by one entry per section
+# (array typecode, byte offset, item count). Arrays are stored in native byte order.
+MAGIC = b'SGROST01'
+HEADER = struct.Struct('<8sqI')
+SECTION = struct.Struct('<4sQQ')
+
+# Smallest array typecode that holds every value between low and high
+def int_typecode(low, high):
+    return 'i' if -2 ** 31 <= (low or 0) and (high or 0) < 2 ** 31 else 'q'
+
+# Authorization roster held as flat arrays: 4 or 8 bytes per ID, 1 for the access level and
+# 4 for the department, and each plate stored once in a shared byte string. Lookups are
+# binary searches. Lockdown, accessories and anti-passback are answered as LiveRoster does.
+class CompactRoster(access_engine.LiveRoster):
+    def __init__(self, columns, version, plate_base=0):
+        self.columns = columns
+        self.version = version
+        # plate_bytes is a mapped file when opened from a snapshot; plates start at plate_base
+        self._plate_base = plate_base
+
+    # Build from SQLite in one read snapshot, streaming each table in key order
+    @classmethod
+    def load(cls):
+        columns = {}
+        with database.read_transaction() as conn:
+            version = conn.execute("SELECT version FROM Roster_Version WHERE id = 1").fetchone()[0]
+            for person_type, table, key_column in PERSON_TABLES:
+                low, high = conn.execute(f"SELECT MIN({key_column}), MAX({key_column}) FROM {table}").fetchone()
+                ids, levels, departments = array.array(int_typecode(low, high)), array.array('B'), array.array('i')
+                cursor = conn.execute(f"SELECT {key_column}, IFNULL(access_level, 0), IFNULL(department_id, ?) FROM {table} ORDER BY {key_column}",
+                                      (NO_DEPARTMENT,))
+                while True:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+                    for person_id, level, department in rows:
+                        ids.append(person_id)
+                        levels.append(level)
+                        departments.append(department)
+                columns[f'{person_type}_ids'] = ids
+                columns[f'{person_type}_levels'] = levels
+                columns[f'{person_type}_departments'] = departments
+
+            # The UNIQUE index on license_plate returns plates already in byte order
+            low, high = conn.execute("SELECT MIN(vehicle_id), MAX(vehicle_id) FROM Vehicle").fetchone()
+            offsets, plates, vehicle_ids = array.array('I', [0]), bytearray(), array.array(int_typecode(low, high))
+            cursor = conn.execute("SELECT license_plate, vehicle_id FROM Vehicle ORDER BY license_plate")
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for license_plate, vehicle_id in rows:
+                    plates += license_plate.encode()
+                    offsets.append(len(plates))
+                    vehicle_ids.append(vehicle_id)
+            columns['plate_offsets'] = offsets
+            columns['plate_bytes'] = bytes(plates)
+            columns['plate_vehicle_ids'] = vehicle_ids
+        return cls(columns, version)
+
+    # Map a snapshot file; nothing is read until a lookup touches the pages it needs
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as snapshot_file:
+            mapping = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC or count != len(SECTIONS):
+            raise ValueError(f"{path} is not a roster snapshot")
+        view = memoryview(mapping)
+        columns = {}
+        plate_base = 0
+        for number, name in enumerate(SECTIONS):
+            typecode, offset, length = SECTION.unpack_from(mapping, HEADER.size + number * SECTION.size)
+            typecode = typecode.rstrip(b'\0').decode()
+            if name == 'plate_bytes':
+                # Sliced straight from the mapping, which yields bytes that compare as plates
+                columns[name] = mapping
+                plate_base = offset
+            else:
+                columns[name] = view[offset:offset + length * array.array(typecode).itemsize].cast(typecode)
+        return cls(columns, version, plate_base)
+
+    # Write the roster to a snapshot file (replaced atomically)
+    def save(self, path):
+        blobs = []
+        for name in SECTIONS:
+            column = self.columns[name]
+            if name == 'plate_bytes':
+                end = self.columns['plate_offsets'][len(self.columns['plate_offsets']) - 1]
+                blobs.append(('B', bytes(column[self._plate_base:self._plate_base + end]), end))
+            else:
+                blobs.append((column.typecode if isinstance(column, array.array) else column.format, bytes(column), len(column)))
+        offset = HEADER.size + SECTION.size * len(SECTIONS)
+        entries = []
+        for typecode, data, length in blobs:
+            offset += -offset % 8
+            entries.append((typecode, offset, length))
+            offset += len(data)
+
+        with open(path + '.tmp', 'wb') as snapshot_file:
+            snapshot_file.write(HEADER.pack(MAGIC, -1 if self.version is None else self.version, len(SECTIONS)))
+            for typecode, offset, length in entries:
+                snapshot_file.write(SECTION.pack(typecode.encode(), offset, length))
+            for (typecode, offset, length), (_, data, _) in zip(entries, blobs):
+                snapshot_file.write(b'\0' * (offset - snapshot_file.tell()))
+                snapshot_file.write(data)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(path + '.tmp', path)
+
+    # Map the snapshot if it matches the database's roster version, otherwise rebuild it.
+    # When the database cannot be read the snapshot is used as it is.
+    @classmethod
+    def load_or_build(cls, path=DEFAULT_SNAPSHOT):
+        try:
+            version = read_roster_version()
+        except sqlite3.Error:
+            version = None
+        try:
+            roster = cls.open(path)
+        except (OSError, ValueError):
+            roster = None
+        if roster is not None and (version is None or roster.version == version):
+            return roster
+        cls.load().save(path)
+        return cls.open(path)
+
+    def people(self):
+        return sum(len(self.columns[f'{person_type}_ids']) for person_type, _, _ in PERSON_TABLES)
+
+    def vehicles(self):
+        return len(self.columns['plate_vehicle_ids'])
+
+    # Bytes held by the given columns (all of them by default)
+    def nbytes(self, names=SECTIONS):
+        total = 0
+        for name in names:
+            column = self.columns[name]
+            if name == 'plate_bytes':
+                total += self.columns['plate_offsets'][len(self.columns['plate_offsets']) - 1]
+            else:
+                total += len(column) * column.itemsize
+        return total
+
+    # Average bytes of ID, access level and department per person
+    def bytes_per_person(self):
+        return self.nbytes([name for name in SECTIONS if not name.startswith('plate_')]) / max(self.people(), 1)
+
+    # Index of a person in their type's columns, or None
+    def _position(self, user_type, user_id):
+        ids = self.columns.get(f'{user_type}_ids')
+        if ids is None:
+            return None
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        position = bisect.bisect_left(ids, user_id)
+        return position if position < len(ids) and ids[position] == user_id else None
+
+    def user_exists(self, user_type, user_id):
+        return self._position(user_type, user_id) is not None
+
+    def access_level(self, user_type, user_id):
+        position = self._position(user_type, user_id)
+        return None if position is None else self.columns[f'{user_type}_levels'][position]
+
+    def department(self, user_type, user_id):
+        position = self._position(user_type, user_id)
+        if position is None:
+            return None
+        department = self.columns[f'{user_type}_departments'][position]
+        return None if department == NO_DEPARTMENT else department
+
+    # Binary search over the plate table, then the fuzzy index as RosterSnapshot does
+    def find_vehicle(self, license_plate):
+        key = license_plate.encode()
+        offsets, plates, base = self.columns['plate_offsets'], self.columns['plate_bytes'], self._plate_base
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if plates[base + offsets[middle]:base + offsets[middle + 1]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(offsets) - 1 and plates[base + offsets[low]:base + offsets[low + 1]] == key:
+            return self.columns['plate_vehicle_ids'][low]
+        if access_engine.FUZZY_PLATE_MATCHING:
+            return plate_index.shared_index().find_unique(license_plate)
+        return None
+
+# Current compact roster for one snapshot file, swapped for a rebuilt one when the roster
+# version moves. Readers just use .roster; each swap replaces the whole object.
+class RosterStore:
+    def __init__(self, path=DEFAULT_SNAPSHOT):
+        self.path = path
+        self.roster = CompactRoster.load_or_build(path)
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Rebuild if the roster changed; returns True if it did
+    def refresh(self):
+        version = read_roster_version()
+        if version is None or version == self.roster.version:
+            return False
+        CompactRoster.load().save(self.path)
+        self.roster = CompactRoster.open(self.path)
+        return True
+
+    def start_refreshing(self, interval_s=REFRESH_INTERVAL_S):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval_s,), name='roster-refresh', daemon=True)
+        self._thread.start()
+
+    def stop_refreshing(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, interval_s):
+        while not self._stop.wait(interval_s):
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                pass
+        database.close_connection()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the compact roster snapshot terminals map at start-up.")
+    parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT)
+    parser.add_argument('--db', help="database file (default SMART_GATE_DB or smart_gate_management.db)")
+    args = parser.parse_args()
+
+    if args.db:
+        database.set_database_path(args.db)
+    roster = CompactRoster.load()
+    roster.save(args.snapshot)
+    print(f"{roster.people()} people ({roster.bytes_per_person():.1f} bytes each) and {roster.vehicles()} vehicles, "
+          f"{roster.nbytes()} bytes in all, written to {args.snapshot}")
@@ -0,0 +1,156 @@
+import sqlite3
+import threading
+import atexit
+import os
+from contextlib import contextmanager
+import metrics
+
+# Location of the shared database file (can be overridden for benchmarks)
+DATABASE_PATH = os.environ.get('SMART_GATE_DB', 'smart_gate_management.db')
+
+# Pragmas applied once to every pooled connection.
+# WAL lets the admin console and the gate terminal read while the other writes,
+# and synchronous=NORMAL only fsyncs the WAL at checkpoints instead of on every commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Number of prepared statements sqlite3 keeps per connection
+STATEMENT_CACHE_SIZE = 128
+
+# Extra attempts made by execute/execute_many when the database is still locked after busy_timeout
+LOCK_RETRIES = 2
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool = []
+
+# Counters used by the benchmarks
+stats = {'connections_opened': 0, 'commits': 0, 'lock_retries': 0}
+
+# Point the pool at a different database file and drop existing connections
+def set_database_path(path):
+    global DATABASE_PATH
+    close_all_connections()
+    DATABASE_PATH = path
+
+# Open and configure a new connection
+def _open_connection(path):
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    with _pool_lock:
+        _pool.append(conn)
+        stats['connections_opened'] += 1
+    return conn
+
+# Get the long-lived connection that belongs to the calling thread
+def get_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DATABASE_PATH:
+        conn = _open_connection(DATABASE_PATH)
+        _local.conn = conn
+        _local.path = DATABASE_PATH
+    return conn
+
+# Close the calling thread's connection
+def close_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _pool_lock:
+        if conn in _pool:
+            _pool.remove(conn)
+    conn.close()
+
+# Close every pooled connection (registered to run at exit)
+def close_all_connections():
+    with _pool_lock:
+        connections = list(_pool)
+        _pool.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+    _local.conn = None
+
+atexit.register(close_all_connections)
+
+# Run a query and return the first row
+def fetch_one(sql, params=()):
+    return get_connection().execute(sql, params).fetchone()
+
+# Run a query and return all rows
+def fetch_all(sql, params=()):
+    return get_connection().execute(sql, params).fetchall()
+
+# True for the error sqlite raises when another connection held the write lock too long
+def is_lock_error(error):
+    return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+# Run a single write statement in its own transaction
+def execute(sql, params=()):
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            with transaction() as conn:
+                cursor = conn.execute(sql, params)
+            return cursor.lastrowid
+        except sqlite3.OperationalError as error:
+            if not is_lock_error(error) or attempt == LOCK_RETRIES:
+                raise
+            stats['lock_retries'] += 1
+
+# Run a write statement for many rows in one transaction
+def execute_many(sql, rows):
+    rows = rows if isinstance(rows, list) else list(rows)
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            with transaction() as conn:
+                cursor = conn.executemany(sql, rows)
+            return cursor.rowcount
+        except sqlite3.OperationalError as error:
+            if not is_lock_error(error) or attempt == LOCK_RETRIES:
+                raise
+            stats['lock_retries'] += 1
+
+# Group several statements into one transaction; rolls back on error
+@contextmanager
+def transaction():
+    conn = get_connection()
+    try:
+        yield conn
+        conn.commit()
+        stats['commits'] += 1
+    except BaseException:
+        conn.rollback()
+        raise
+
+# Read several statements from one snapshot of the database. The sqlite3 module only opens a
+# transaction before a write, so without the explicit BEGIN each SELECT would see whatever was
+# committed last. Inside another transaction this simply joins it.
+@contextmanager
+def read_transaction():
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+# Time every statement when metrics are on (SMART_GATE_METRICS=1)
+fetch_one = metrics.instrument_query(fetch_one, rows=lambda row: 0 if row is None else 1)
+fetch_all = metrics.instrument_query(fetch_all, rows=len)
+execute = metrics.instrument_query(execute)
+execute_many = metrics.instrument_query(execute_many, rows=lambda count: max(count, 0))
+metrics.register_source('database', lambda: stats)
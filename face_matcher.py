@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import numpy as np
+import database
+
+# Length of every stored face embedding
+EMBEDDING_DIM = 128
+
+# Default cosine-similarity threshold and number of candidates returned
+DEFAULT_THRESHOLD = 0.6
+DEFAULT_TOP_K = 5
+
+# Rows scored at a time so batched matching keeps a bounded working set
+MATCH_CHUNK_ROWS = 65536
+
+# Where the memory-mapped matrix lives
+DEFAULT_INDEX_DIR = os.environ.get('SMART_GATE_FACE_INDEX', 'face_index')
+
+PERSON_TYPES = ('student', 'staff')
+
+# Turn any vector (or matrix of row vectors) into unit-length float32
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+# Store (or replace) the embedding for a student or staff member
+def enroll_face(person_type, person_id, embedding):
+    if person_type not in PERSON_TYPES:
+        raise ValueError(f"person_type must be one of {PERSON_TYPES}")
+    embedding = normalize(embedding)
+    if embedding.shape != (EMBEDDING_DIM,):
+        raise ValueError(f"embedding must have {EMBEDDING_DIM} values")
+    database.execute("INSERT OR REPLACE INTO Face_Embeddings (person_type, person_id, embedding) VALUES (?, ?, ?)",
+                     (person_type, int(person_id), embedding.tobytes()))
+
+# Store many embeddings in one transaction: rows of (person_type, person_id, embedding)
+def enroll_faces(rows):
+    database.execute_many("INSERT OR REPLACE INTO Face_Embeddings (person_type, person_id, embedding) VALUES (?, ?, ?)",
+                          ((person_type, int(person_id), normalize(embedding).tobytes()) for person_type, person_id, embedding in rows))
+
+# Cheap fingerprint of the enrolled set; changes on every insert, replace or delete
+def enrollment_signature():
+    count, last_rowid = database.fetch_one("SELECT COUNT(*), MAX(rowid) FROM Face_Embeddings")
+    return [count, last_rowid]
+
+# Write the enrolled embeddings to a contiguous matrix file plus a label file
+def build_index(index_dir=DEFAULT_INDEX_DIR):
+    os.makedirs(index_dir, exist_ok=True)
+    matrix_path = os.path.join(index_dir, 'embeddings.npy')
+
+    # Read the count and the rows from one snapshot so they agree
+    with database.read_transaction() as conn:
+        signature = enrollment_signature()
+        count = signature[0]
+        labels = np.empty((count, 2), dtype=np.int64)
+        if count == 0:
+            np.save(matrix_path, np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+        else:
+            matrix = np.lib.format.open_memmap(matrix_path, mode='w+', dtype=np.float32, shape=(count, EMBEDDING_DIM))
+            cursor = conn.execute("SELECT person_type, person_id, embedding FROM Face_Embeddings ORDER BY person_type, person_id")
+            row = 0
+            while True:
+                chunk = cursor.fetchmany(4096)
+                if not chunk:
+                    break
+                for person_type, person_id, blob in chunk:
+                    matrix[row] = np.frombuffer(blob, dtype=np.float32)
+                    labels[row] = (PERSON_TYPES.index(person_type), person_id)
+                    row += 1
+            matrix.flush()
+            del matrix
+    np.save(os.path.join(index_dir, 'labels.npy'), labels)
+    with open(os.path.join(index_dir, 'meta.json'), 'w') as meta_file:
+        json.dump({'signature': signature, 'dim': EMBEDDING_DIM}, meta_file)
+
+# 1:N matcher over a memory-mapped matrix of unit-length embeddings
+class FaceMatcher:
+    def __init__(self, matrix, labels):
+        self.matrix = matrix
+        self.labels = labels
+
+    # Map the index files; the matrix pages are only read when first scored
+    @classmethod
+    def load(cls, index_dir=DEFAULT_INDEX_DIR):
+        labels = np.load(os.path.join(index_dir, 'labels.npy'))
+        if len(labels) == 0:
+            return cls(np.zeros((0, EMBEDDING_DIM), dtype=np.float32), labels)
+        matrix = np.load(os.path.join(index_dir, 'embeddings.npy'), mmap_mode='r')
+        return cls(matrix, labels)
+
+    # Load the index, rebuilding it first if enrollments changed since it was written
+    @classmethod
+    def load_or_build(cls, index_dir=DEFAULT_INDEX_DIR):
+        try:
+            with open(os.path.join(index_dir, 'meta.json')) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            meta = {}
+        if meta.get('signature') != enrollment_signature() or meta.get('dim') != EMBEDDING_DIM:
+            build_index(index_dir)
+        return cls.load(index_dir)
+
+    def __len__(self):
+        return len(self.labels)
+
+    # Best matches for one embedding: list of (person_type, person_id, score), best first
+    def match(self, embedding, threshold=DEFAULT_THRESHOLD, top_k=DEFAULT_TOP_K):
+        return self.match_batch(np.asarray(embedding)[None, :], threshold, top_k)[0]
+
+    # Best matches for each row of a (M, EMBEDDING_DIM) query matrix
+    def match_batch(self, embeddings, threshold=DEFAULT_THRESHOLD, top_k=DEFAULT_TOP_K):
+        queries = normalize(embeddings)
+        count = len(self.labels)
+        if count == 0:
+            return [[] for _ in range(len(queries))]
+        k = min(top_k, count)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), k), dtype=np.int64)
+
+        # Score the matrix a chunk of rows at a time and keep a running top-k
+        for start in range(0, count, MATCH_CHUNK_ROWS):
+            scores = queries @ self.matrix[start:start + MATCH_CHUNK_ROWS].T
+            chunk_k = min(k, scores.shape[1])
+            chunk_rows = np.argpartition(-scores, chunk_k - 1, axis=1)[:, :chunk_k]
+            merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, chunk_rows, axis=1)], axis=1)
+            merged_rows = np.concatenate([best_rows, chunk_rows + start], axis=1)
+            keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            matches = []
+            for i in order:
+                if scores[i] < threshold:
+                    break
+                person_type, person_id = self.labels[rows[i]]
+                matches.append((PERSON_TYPES[person_type], int(person_id), float(scores[i])))
+            results.append(matches)
+        return results
+
+# Look up the name and email of a matched person
+def person_details(person_type, person_id):
+    table, key_column = ('Student', 'student_id') if person_type == 'student' else ('Staff', 'staff_id')
+    result = database.fetch_one(f"SELECT name, email FROM {table} WHERE {key_column} = ?", (person_id,))
+    if result is None:
+        return None
+    return {'name': result[0], 'email': result[1], 'type': person_type, 'id': str(person_id)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Enroll face embeddings and build the matcher index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    enroll_parser = subparsers.add_parser('enroll', help="store an embedding saved with numpy.save")
+    enroll_parser.add_argument('person_type', choices=PERSON_TYPES)
+    enroll_parser.add_argument('person_id', type=int)
+    enroll_parser.add_argument('embedding_path')
+    build_parser = subparsers.add_parser('build', help="rebuild the memory-mapped index")
+    build_parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'enroll':
+        enroll_face(args.person_type, args.person_id, np.load(args.embedding_path))
+        print(f"Enrolled {args.person_type} {args.person_id}")
+    else:
+        build_index(args.index_dir)
+        print(f"Built index with {enrollment_signature()[0]} embeddings in {args.index_dir}")
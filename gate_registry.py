@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+import database
+
+# Gate used when none is configured
+DEFAULT_GATE_ID = 1
+
+# How often the watcher thread checks for commits from other processes
+WATCH_INTERVAL_MS = 5
+
+# Every gate, read whole into the registry (the table holds one row per physical gate)
+LOAD_GATES_SQL = "SELECT gate_id, gate_name, status, is_locked_down FROM Gate_Status ORDER BY gate_id"
+
+# Bump the gate change counter inside the caller's transaction
+def bump_gate_version(conn):
+    conn.execute("UPDATE Gate_Version SET version = version + 1 WHERE id = 1")
+
+# Read the gate change counter (None if the table has not been created yet)
+def read_gate_version():
+    try:
+        result = database.fetch_one("SELECT version FROM Gate_Version WHERE id = 1")
+    except sqlite3.OperationalError:
+        return None
+    return result[0] if result else None
+
+# Read every gate from the database
+def load_gates():
+    rows = database.fetch_all(LOAD_GATES_SQL)
+    return {row[0]: {'gate_id': row[0], 'gate_name': row[1], 'status': row[2], 'is_locked_down': bool(row[3])} for row in rows}
+
+# Lock down or unlock one gate, or every gate when gate_id is None
+def set_lockdown(is_locked_down, gate_id=None):
+    status = 'locked' if is_locked_down else 'unlocked'
+    with database.transaction() as conn:
+        if gate_id is None:
+            conn.execute("UPDATE Gate_Status SET is_locked_down = ?, status = ?", (is_locked_down, status))
+        else:
+            conn.execute("UPDATE Gate_Status SET is_locked_down = ?, status = ? WHERE gate_id = ?", (is_locked_down, status, gate_id))
+        bump_gate_version(conn)
+    registry.refresh()
+
+# Add a new gate (unlocked) and return its id
+def add_gate(gate_name):
+    with database.transaction() as conn:
+        cursor = conn.execute("INSERT INTO Gate_Status (gate_name, status, is_locked_down) VALUES (?, 'closed', 0)", (gate_name,))
+        bump_gate_version(conn)
+    registry.refresh()
+    return cursor.lastrowid
+
+# In-memory copy of Gate_Status, refreshed only when the gate change counter moves.
+# Listeners are called with (gates, version) after every change.
+class GateRegistry:
+    def __init__(self):
+        self._gates = {}
+        self._version = None
+        self._loaded = False
+        self._data_versions = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    # Register a callback for gate changes (called on the thread that saw the change)
+    def subscribe(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    # Current gates keyed by gate_id
+    def get_gates(self):
+        self.check()
+        with self._lock:
+            return {gate_id: dict(gate) for gate_id, gate in self._gates.items()}
+
+    def get_gate(self, gate_id):
+        return self.get_gates().get(gate_id)
+
+    # Lockdown flag for one gate (False for unknown gates).
+    # With the watcher running this is a pure in-memory read.
+    def is_locked_down(self, gate_id=DEFAULT_GATE_ID):
+        if self._watcher is None:
+            self.check()
+        gate = self._gates.get(gate_id)
+        return gate['is_locked_down'] if gate else False
+
+    def version(self):
+        return self._version
+
+    # Reload if another connection has changed the gates; returns True if it did.
+    # PRAGMA data_version only moves after another connection commits, so in the
+    # common case this costs no table read at all.
+    def check(self):
+        thread_id = threading.get_ident()
+        data_version = database.fetch_one("PRAGMA data_version")[0]
+        if self._loaded and self._data_versions.get(thread_id) == data_version:
+            return False
+        self._data_versions[thread_id] = data_version
+        version = read_gate_version()
+        if self._loaded and version is not None and version == self._version:
+            return False
+        self._reload(version)
+        return True
+
+    # Reload unconditionally (used after a change made by this process)
+    def refresh(self):
+        self._reload(read_gate_version())
+
+    def _reload(self, version):
+        gates = load_gates()
+        with self._lock:
+            self._gates = gates
+            self._version = version
+            self._loaded = True
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(gates, version)
+
+    # Start a background thread that picks up changes made by other processes
+    def start_watching(self, interval_ms=WATCH_INTERVAL_MS):
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval_ms / 1000,), name='gate-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is None:
+            return
+        self._stop.set()
+        self._watcher.join()
+        self._watcher = None
+
+    def _watch(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except sqlite3.Error:
+                pass
+            self._stop.wait(interval)
+        database.close_connection()
+
+# Registry shared by everything in this process
+registry = GateRegistry()
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+import database
+import migrations
+import access_engine
+import accessory_ledger
+import anomaly_detector
+import metrics
+
+# Requests decided and logged together, and how long the batcher waits for more to arrive
+MAX_BATCH = 256
+BATCH_WINDOW_MS = 2
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Longest request line accepted from a terminal
+MAX_LINE_BYTES = 64 * 1024
+
+# What is wrong with a request that could not be logged (None if nothing). Checked before a
+# request joins a batch, since the batch is written in one transaction.
+def request_problem(request):
+    if request.get('direction', 'enter') not in ('enter', 'exit'):
+        return "direction must be 'enter' or 'exit'"
+    if not isinstance(request.get('gate_id', access_engine.DEFAULT_GATE_ID), int):
+        return "gate_id must be a number"
+    if request.get('type') != 'guest' and not (isinstance(request.get('name'), str) and request['name'].strip()):
+        return "name is required"
+    if request.get('type') == 'guest' and not isinstance(request.get('name', ''), str):
+        return "name must be text"
+    if not isinstance(request.get('id', ''), (int, str)):
+        return "id must be a number or text"
+    if not isinstance(request.get('license_plate', ''), (str, type(None))):
+        return "license_plate must be text"
+    accessories = request.get('accessories', [])
+    if not isinstance(accessories, list) or not all(isinstance(item, str) and item for item in accessories):
+        return "accessories must be a list of accessory types"
+    manifest = request.get('manifest', [])
+    if not isinstance(manifest, list):
+        return "manifest must be a list of items"
+    for item in manifest:
+        if not isinstance(item, dict) or not isinstance(item.get('type'), str) or not item['type']:
+            return "every manifest item needs a type"
+        quantity = item.get('quantity', 1)
+        if not isinstance(quantity, int) or quantity < 1:
+            return "manifest quantities must be positive whole numbers"
+    return None
+
+# Decide one request of a batch against the batch's snapshot
+def decide_request(request, snapshot):
+    if request.get('type') == 'guest':
+        guest = access_engine.find_guest(request.get('name') or '', active_only=request.get('direction') != 'exit')
+        if guest is None:
+            return {'allowed': False, 'reason': "No valid guest pass found. Please contact administration.", 'log': None}
+        decision = access_engine.evaluate_guest_access(guest, request.get('id_number'), request.get('gate_id', access_engine.DEFAULT_GATE_ID),
+                                                       snapshot, request.get('direction', 'enter'))
+    else:
+        decision = access_engine.evaluate_access(request, snapshot)
+    # Check what is carried out against what came in, before this exit is logged
+    if decision['allowed'] and request.get('direction') == 'exit':
+        decision['reconciliation'] = accessory_ledger.reconcile_exit(decision)
+    return decision
+
+# Decide a batch of requests against one roster snapshot and log the admissions in one transaction.
+# Runs on the service's single database thread, so every write goes through one connection.
+# Student/staff requests carry the access_engine request fields; guest requests are
+# {'type': 'guest', 'name', 'id_number', 'gate_id', 'direction'}.
+# A request that raises while being decided gets a failed decision carrying the error;
+# the rest of the batch is decided and logged as usual.
+# The presence tracker only learns of the admissions once they are committed.
+def decide_batch(requests):
+    snapshot = access_engine.RosterSnapshot.load([request for request in requests if request.get('type') != 'guest'])
+    decisions = []
+    for request in requests:
+        try:
+            decision = decide_request(request, snapshot)
+        except Exception as error:
+            decision = access_engine.failed_decision(error)
+        # Hold admissions on the snapshot so a second entry later in the same batch is refused
+        if decision['allowed']:
+            snapshot.note_admission(decision)
+        decisions.append(decision)
+    access_engine.record_decisions([decision for decision in decisions if decision['allowed']])
+    anomaly_detector.notify_decisions(decisions)
+    return decisions
+
+# What a terminal gets back for a decision
+def response_for(request_id, decision):
+    return {
+        'request_id': request_id,
+        'allowed': decision['allowed'],
+        'reason': decision['reason'],
+        'action': decision['log'][5] if decision['log'] else 'denied',
+        'reconciliation': decision.get('reconciliation'),
+    }
+
+# JSON-lines server: one request object per line in, one decision object per line out.
+# A request may carry a 'request_id', which is echoed back with its decision.
+class GateService:
+    def __init__(self, max_batch=MAX_BATCH, batch_window_ms=BATCH_WINDOW_MS):
+        self.max_batch = max_batch
+        self.batch_window = batch_window_ms / 1000
+        self.stats = {'requests': 0, 'batches': 0, 'errors': 0, 'connections': 0}
+        self._queue = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gate-db')
+        metrics.register_source('gate_service', lambda: self.stats)
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self._queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._run_batches())
+        server = await asyncio.start_server(self._handle_terminal, host, port, limit=MAX_LINE_BYTES)
+        print(f"Gate service listening on {host}:{port}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown()
+
+    # Decide one request; resolves once its log row is committed.
+    # A request that could not be logged raises ValueError without joining a batch.
+    async def submit(self, request):
+        problem = request_problem(request)
+        if problem is not None:
+            raise ValueError(problem)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future))
+        return await future
+
+    async def _handle_terminal(self, reader, writer):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                    request_id = request.pop('request_id', None)
+                    response = response_for(request_id, await self.submit(request))
+                except ValueError as error:
+                    response = {'request_id': request_id, 'error': f"Bad request: {error}"}
+                except Exception as error:
+                    self.stats['errors'] += 1
+                    response = {'request_id': request_id, 'error': f"Service error: {error}"}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        finally:
+            self.stats['connections'] -= 1
+            writer.close()
+
+    # Collect whatever arrived in the batch window and hand it to the database thread
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self.batch_window:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            requests = [request for request, _ in batch]
+            try:
+                decisions = await loop.run_in_executor(self._executor, decide_batch, requests)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            for (_, future), decision in zip(batch, decisions):
+                if future.done():
+                    continue
+                if decision.get('error') is not None:
+                    future.set_exception(decision['error'])
+                else:
+                    future.set_result(decision)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve access decisions to gate terminals over JSON-lines TCP.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db', help="database file (default SMART_GATE_DB or smart_gate_management.db)")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--batch-window-ms', type=float, default=BATCH_WINDOW_MS)
+    args = parser.parse_args()
+
+    if args.db:
+        database.set_database_path(args.db)
+    migrations.migrate()
+    metrics.start_exporting()
+    # Watch every decision for tailgating, denial bursts, rapid re-entry and lockdown attempts
+    anomaly_detector.shared_detector()
+    try:
+        asyncio.run(GateService(args.max_batch, args.batch_window_ms).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
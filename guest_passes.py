@@ -0,0 +1,137 @@
+import argparse
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import database
+import migrations
+
+# How long a pass issued at the admin console lasts
+DEFAULT_PASS_HOURS = 12
+
+# Passes expired or archived per transaction, so gate writes never wait long behind the sweeper
+SWEEP_BATCH = 1000
+
+# Expired passes stay in Guests (for exits and the guest log view) this long before archiving
+ARCHIVE_AFTER_DAYS = 30
+
+# How often the sweeper runs
+SWEEP_INTERVAL_S = 60
+
+# Columns moved to Guests_Archive, in table order
+ARCHIVE_COLUMNS = ('guest_id', 'name', 'contact', 'id_number', 'age', 'office_visiting', 'person_visiting',
+                   'entrance_time', 'valid_from', 'valid_until')
+
+# One batch of passes to expire, and of expired passes to archive
+EXPIRE_BATCH_SQL = "SELECT guest_id FROM Guests WHERE expired = 0 AND valid_until <= ? LIMIT ?"
+ARCHIVE_BATCH_SQL = "SELECT guest_id FROM Guests WHERE expired = 1 AND valid_until <= ? LIMIT ?"
+
+# Guests this age or older must show an ID number matching their pass
+ADULT_AGE = 18
+
+# Pass times are stored as ISO text to the second so they compare as strings
+def pass_time(moment):
+    return moment.isoformat(timespec='seconds')
+
+# Turn 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM[:SS]' into a pass time. A bare date is the start of
+# that day, or the end of it (midnight after) when end is set.
+def parse_pass_time(text, end=False):
+    text = text.strip().replace('T', ' ')
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return pass_time(datetime.strptime(text, fmt))
+        except ValueError:
+            continue
+    day = datetime.strptime(text, '%Y-%m-%d')
+    return pass_time(day + timedelta(days=1) if end else day)
+
+# Parse a guest's age as a whole number of years, or raise ValueError
+def parse_age(text):
+    try:
+        age = int(str(text).strip())
+    except ValueError:
+        raise ValueError("age must be a whole number")
+    if age < 0:
+        raise ValueError("age cannot be negative")
+    return age
+
+# Validity window for a pass starting now (or at start), as (valid_from, valid_until)
+def pass_window(hours=DEFAULT_PASS_HOURS, start=None):
+    start = start or datetime.now()
+    return pass_time(start), pass_time(start + timedelta(hours=hours))
+
+# Mark passes whose window has closed as expired, a batch per transaction.
+# Returns the number of passes expired.
+def expire_passes(now=None, batch_size=SWEEP_BATCH):
+    now = pass_time(now or datetime.now())
+    expired = 0
+    while True:
+        with database.transaction() as conn:
+            count = conn.execute(f"UPDATE Guests SET expired = 1 WHERE guest_id IN ({EXPIRE_BATCH_SQL})",
+                                 (now, batch_size)).rowcount
+        expired += count
+        if count < batch_size:
+            return expired
+
+# Move passes expired for more than ARCHIVE_AFTER_DAYS to Guests_Archive, a batch per
+# transaction. Returns the number of passes archived.
+def archive_passes(now=None, batch_size=SWEEP_BATCH, after_days=ARCHIVE_AFTER_DAYS):
+    now = now or datetime.now()
+    cutoff = pass_time(now - timedelta(days=after_days))
+    columns = ', '.join(ARCHIVE_COLUMNS)
+    archived = 0
+    while True:
+        with database.transaction() as conn:
+            guest_ids = [row[0] for row in conn.execute(ARCHIVE_BATCH_SQL, (cutoff, batch_size))]
+            if guest_ids:
+                marks = ', '.join('?' * len(guest_ids))
+                conn.execute(f"""INSERT OR REPLACE INTO Guests_Archive ({columns}, archived_at)
+                                 SELECT {columns}, ? FROM Guests WHERE guest_id IN ({marks})""", [pass_time(now)] + guest_ids)
+                conn.execute(f"DELETE FROM Guests WHERE guest_id IN ({marks})", guest_ids)
+        archived += len(guest_ids)
+        if len(guest_ids) < batch_size:
+            return archived
+
+# One sweeper pass; returns (passes expired, passes archived)
+def sweep(now=None):
+    return expire_passes(now), archive_passes(now)
+
+# Background sweeper, started and stopped like the gate registry's watcher
+_stop = threading.Event()
+_thread = None
+
+def start_sweeping(interval_s=SWEEP_INTERVAL_S):
+    global _thread
+    if _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=(interval_s,), name='guest-pass-sweeper', daemon=True)
+    _thread.start()
+
+def stop_sweeping():
+    global _thread
+    if _thread is None:
+        return
+    _stop.set()
+    _thread.join()
+    _thread = None
+
+def _run(interval_s):
+    while True:
+        try:
+            sweep()
+        except sqlite3.Error:
+            pass
+        if _stop.wait(interval_s):
+            break
+    database.close_connection()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Expire guest passes whose window has closed and archive old ones.")
+    parser.add_argument('--db', help="database file (default SMART_GATE_DB or smart_gate_management.db)")
+    args = parser.parse_args()
+
+    if args.db:
+        database.set_database_path(args.db)
+    migrations.migrate()
+    expired, archived = sweep()
+    print(f"Expired {expired} guest passes, archived {archived}")
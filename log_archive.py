@@ -0,0 +1,211 @@
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime
+import database
+import traffic_rollups
+import presence_tracker
+from log_browser import LOG_COLUMNS
+
+# Where archived segments and their index live
+ARCHIVE_DIR = os.environ.get('SMART_GATE_ARCHIVE', 'log_archive')
+
+# Months kept in the Logs table, counting the current one
+DEFAULT_HOT_MONTHS = 3
+
+# Rows read from SQLite per fetch while writing a segment
+FETCH_SIZE = 5000
+
+MANIFEST_NAME = 'segments.json'
+
+# Columns stored per archived row (guest_id too, so guest entries survive archiving)
+ARCHIVE_COLUMNS = LOG_COLUMNS + ('guest_id',)
+
+# Accessory manifest rows of the archived events, kept in a file beside each segment
+MANIFEST_COLUMNS = ('manifest_id', 'log_id', 'type', 'description', 'quantity')
+
+# Hot Logs rows held by a segment
+SEGMENT_ROWS_SQL = "SELECT log_id FROM Logs WHERE log_id BETWEEN ? AND ? AND timestamp >= ? AND timestamp < ?"
+
+# First day of the month that is `months_back` months before the given date
+def month_start(today, months_back=0):
+    month_index = today.year * 12 + today.month - 1 - months_back
+    return f"{month_index // 12:04d}-{month_index % 12 + 1:02d}-01"
+
+# First day of the month after the given YYYY-MM
+def next_month(month):
+    year, month_number = int(month[:4]), int(month[5:7])
+    return month_start(datetime(year + month_number // 12, month_number % 12 + 1, 1))
+
+# Read the segment index (list of dicts, oldest first)
+def load_manifest(archive_dir=ARCHIVE_DIR):
+    try:
+        with open(os.path.join(archive_dir, MANIFEST_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return []
+
+# Replace the segment index atomically
+def save_manifest(segments, archive_dir=ARCHIVE_DIR):
+    path = os.path.join(archive_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as manifest_file:
+        json.dump(segments, manifest_file, indent=1)
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+    os.replace(path + '.tmp', path)
+
+# Remove the hot rows a segment already holds, with their accessory manifests, in one
+# transaction. Running this again is harmless, so it also finishes an archive run that
+# stopped between writing a segment and deleting rows.
+def delete_archived_rows(segment):
+    params = (segment['min_log_id'], segment['max_log_id'], segment['month'] + '-01', next_month(segment['month']))
+    with database.transaction() as conn:
+        conn.execute(f"DELETE FROM Accessory_Manifest WHERE log_id IN ({SEGMENT_ROWS_SQL})", params)
+        conn.execute(f"DELETE FROM Logs WHERE log_id IN ({SEGMENT_ROWS_SQL})", params)
+
+# Write rows from a cursor to a gzip file of JSON lines (as path + '.tmp'); returns the row count
+def write_rows(cursor, path):
+    count = 0
+    with gzip.open(path + '.tmp', 'wt') as output:
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                return count
+            for row in rows:
+                output.write(json.dumps(row, separators=(',', ':')) + '\n')
+            count += len(rows)
+
+# Move a file written by write_rows into place once it is on disk
+def commit_file(path):
+    with open(path + '.tmp', 'rb') as written:
+        os.fsync(written.fileno())
+    os.replace(path + '.tmp', path)
+
+# Copy one month of Logs, and the accessory manifests of those events, into a new compressed
+# segment; returns its index entry (or None)
+def write_segment(month, archive_dir, sequence):
+    start, end = month + '-01', next_month(month)
+    file_name = f"logs-{month}-{sequence:04d}.jsonl.gz"
+    manifest_name = f"manifest-{month}-{sequence:04d}.jsonl.gz"
+    path = os.path.join(archive_dir, file_name)
+    segment = {'file': file_name, 'month': month, 'rows': 0,
+               'min_timestamp': None, 'max_timestamp': None, 'min_log_id': None, 'max_log_id': None,
+               'manifest_file': manifest_name, 'manifest_rows': 0}
+
+    # One read snapshot, so the rows written are exactly the rows later deleted
+    with database.read_transaction() as conn:
+        cursor = conn.execute(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM Logs WHERE timestamp >= ? AND timestamp < ? ORDER BY log_id",
+                              (start, end))
+        with gzip.open(path + '.tmp', 'wt') as segment_file:
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    segment_file.write(json.dumps(row, separators=(',', ':')) + '\n')
+                    timestamp, log_id = row[1], row[0]
+                    if segment['rows'] == 0:
+                        segment['min_timestamp'] = segment['max_timestamp'] = timestamp
+                        segment['min_log_id'] = segment['max_log_id'] = log_id
+                    segment['min_timestamp'] = min(segment['min_timestamp'], timestamp)
+                    segment['max_timestamp'] = max(segment['max_timestamp'], timestamp)
+                    segment['min_log_id'] = min(segment['min_log_id'], log_id)
+                    segment['max_log_id'] = max(segment['max_log_id'], log_id)
+                    segment['rows'] += 1
+
+        if segment['rows'] == 0:
+            os.remove(path + '.tmp')
+            return None
+        cursor = conn.execute(f"""SELECT {', '.join(f'm.{column}' for column in MANIFEST_COLUMNS)}
+                                  FROM Accessory_Manifest m JOIN Logs l ON l.log_id = m.log_id
+                                  WHERE l.timestamp >= ? AND l.timestamp < ? ORDER BY m.manifest_id""", (start, end))
+        segment['manifest_rows'] = write_rows(cursor, os.path.join(archive_dir, manifest_name))
+
+    commit_file(os.path.join(archive_dir, manifest_name))
+    commit_file(path)
+    return segment
+
+# Move every closed month older than the hot window out of Logs.
+# Returns the new segment entries.
+def archive_closed_months(hot_months=DEFAULT_HOT_MONTHS, archive_dir=ARCHIVE_DIR, today=None):
+    os.makedirs(archive_dir, exist_ok=True)
+    # Count everything into the traffic rollup and the presence checkpoint before it leaves the table
+    traffic_rollups.catch_up()
+    presence_tracker.PresenceTracker.load().checkpoint()
+    segments = load_manifest(archive_dir)
+    for segment in segments:
+        delete_archived_rows(segment)
+
+    cutoff = month_start(today or datetime.now(), hot_months - 1)
+    months = [row[0] for row in database.fetch_all("SELECT DISTINCT substr(timestamp, 1, 7) FROM Logs WHERE timestamp < ? ORDER BY 1", (cutoff,))]
+    created = []
+    for month in months:
+        sequence = 1 + sum(1 for segment in segments if segment['month'] == month)
+        segment = write_segment(month, archive_dir, sequence)
+        if segment is None:
+            continue
+        segments.append(segment)
+        save_manifest(segments, archive_dir)
+        delete_archived_rows(segment)
+        created.append(segment)
+    return created
+
+# Read the rows of one segment
+def read_segment(segment, archive_dir=ARCHIVE_DIR):
+    with gzip.open(os.path.join(archive_dir, segment['file']), 'rt') as segment_file:
+        for line in segment_file:
+            yield tuple(json.loads(line))
+
+# Read the accessory manifest rows archived with a segment (none for segments written
+# before manifests were archived)
+def read_segment_manifest(segment, archive_dir=ARCHIVE_DIR):
+    if not segment.get('manifest_file'):
+        return
+    with gzip.open(os.path.join(archive_dir, segment['manifest_file']), 'rt') as manifest_file:
+        for line in manifest_file:
+            yield tuple(json.loads(line))
+
+# Logs between two ISO timestamps (end exclusive), oldest first, from the archive and
+# the hot table alike. Segments whose min/max timestamps miss the range are skipped unopened.
+def query_logs(start=None, end=None, archive_dir=ARCHIVE_DIR):
+    for segment in sorted(load_manifest(archive_dir), key=lambda segment: segment['min_timestamp']):
+        if start is not None and segment['max_timestamp'] < start:
+            continue
+        if end is not None and segment['min_timestamp'] >= end:
+            continue
+        for row in read_segment(segment, archive_dir):
+            if (start is None or row[1] >= start) and (end is None or row[1] < end):
+                yield row
+
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("timestamp < ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor = database.get_connection().execute(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM Logs {where} ORDER BY timestamp, log_id", params)
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archive closed months of Logs into compressed segments.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    archive_parser = subparsers.add_parser('archive')
+    archive_parser.add_argument('--hot-months', type=int, default=DEFAULT_HOT_MONTHS)
+    query_parser = subparsers.add_parser('query')
+    query_parser.add_argument('--from', dest='start')
+    query_parser.add_argument('--to', dest='end')
+    args = parser.parse_args()
+
+    if args.command == 'archive':
+        for segment in archive_closed_months(args.hot_months):
+            print(f"Archived {segment['rows']} rows from {segment['month']} into {segment['file']}")
+    else:
+        for row in query_logs(args.start, args.end):
+            print(row)
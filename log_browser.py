@@ -0,0 +1,204 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from datetime import datetime, timedelta
+import database
+import ui_worker
+
+# Rows fetched and rendered per page
+PAGE_SIZE = 100
+
+LOG_COLUMNS = ('log_id', 'timestamp', 'student_id', 'staff_id', 'user_name', 'email', 'action', 'gate_id', 'accessories', 'vehicle_id')
+GUEST_COLUMNS = ('guest_id', 'name', 'contact', 'id_number', 'age', 'office_visiting', 'person_visiting', 'entrance_time')
+
+# Table, key column, time column and columns for each kind of log
+LOG_SOURCES = {
+    'verified': ('Logs', 'log_id', 'timestamp', LOG_COLUMNS, "guest_id IS NULL"),
+    'guest': ('Guests', 'guest_id', 'entrance_time', GUEST_COLUMNS, None),
+}
+
+# Turn a YYYY-MM-DD string into an ISO timestamp bound (end dates are inclusive)
+def parse_date(value, end=False):
+    day = datetime.strptime(value, '%Y-%m-%d')
+    if end:
+        day += timedelta(days=1)
+    return day.isoformat()
+
+# Build the WHERE clause for the server-side filters.
+# Dates filter the time column itself: replica uploads insert rows late with the time they
+# happened, so keys do not grow with time and a date range cannot become a key range.
+def build_filters(user_type, filters):
+    table, key_column, time_column, columns, base_clause = LOG_SOURCES[user_type]
+    clauses = [base_clause] if base_clause else []
+    params = []
+
+    if filters.get('date_from'):
+        clauses.append(f"{time_column} >= ?")
+        params.append(parse_date(filters['date_from']))
+    if filters.get('date_to'):
+        clauses.append(f"{time_column} < ?")
+        params.append(parse_date(filters['date_to'], end=True))
+
+    if user_type == 'verified':
+        if filters.get('gate_id'):
+            clauses.append("gate_id = ?")
+            params.append(filters['gate_id'])
+        if filters.get('user_id'):
+            # One person's rows are few: seek the student/staff indexes instead of walking guest_id
+            if base_clause in clauses:
+                clauses[clauses.index(base_clause)] = '+' + base_clause
+            clauses.append("(student_id = ? OR staff_id = ?)")
+            params.extend([filters['user_id'], filters['user_id']])
+        if filters.get('action'):
+            clauses.append("action = ?")
+            params.append(filters['action'])
+    elif filters.get('name'):
+        clauses.append("LOWER(name) = LOWER(?)")
+        params.append(filters['name'])
+
+    return clauses, params
+
+# SQL and parameters for one page of logs, newest first, seeking from the edge of the previous page.
+# older_than / newer_than are keys from the page currently on screen; a newer page is read
+# oldest first and reversed by fetch_log_page.
+# With a date filter, pages follow the time index instead of the key (a replica upload that
+# arrived late sits at the time it happened), seeking from the edge row's (time, key).
+def page_query(user_type, filters=None, older_than=None, newer_than=None, page_size=PAGE_SIZE):
+    table, key_column, time_column, columns, base_clause = LOG_SOURCES[user_type]
+    filters = filters or {}
+    clauses, params = build_filters(user_type, filters)
+
+    by_time = bool(filters.get('date_from') or filters.get('date_to'))
+    if by_time and base_clause in clauses:
+        # guest_id IS NULL matches nearly every row: keep its index from displacing the time index
+        clauses[clauses.index(base_clause)] = '+' + base_clause
+
+    order = 'DESC'
+    edge_key = older_than if older_than is not None else newer_than
+    if edge_key is not None:
+        comparison = '<' if older_than is not None else '>'
+        if by_time:
+            clauses.append(f"({time_column}, {key_column}) {comparison} ((SELECT {time_column} FROM {table} WHERE {key_column} = ?), ?)")
+            params.extend([edge_key, edge_key])
+        else:
+            clauses.append(f"{key_column} {comparison} ?")
+            params.append(edge_key)
+        if older_than is None:
+            order = 'ASC'
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    order_by = f"{time_column} {order}, {key_column} {order}" if by_time else f"{key_column} {order}"
+    return f"SELECT {', '.join(columns)} FROM {table} {where} ORDER BY {order_by} LIMIT ?", params + [page_size]
+
+# Fetch one page of logs, newest first (see page_query)
+def fetch_log_page(user_type, filters=None, older_than=None, newer_than=None, page_size=PAGE_SIZE):
+    rows = database.fetch_all(*page_query(user_type, filters, older_than, newer_than, page_size))
+    if older_than is None and newer_than is not None:
+        rows.reverse()
+    return rows
+
+# Log viewer window that only ever holds one page of rows
+class LogBrowser:
+    def __init__(self, user_type, page_size=PAGE_SIZE):
+        self.user_type = user_type
+        self.page_size = page_size
+        self.columns = LOG_SOURCES[user_type][3]
+        self.filters = {}
+        self.rows = []
+        self.pending = None
+
+        self.window = tk.Toplevel()
+        self.window.title(f"{user_type.capitalize()} User Access Logs")
+
+        filter_frame = tk.Frame(self.window)
+        filter_frame.pack(fill='x', padx=5, pady=5)
+        filter_fields = [('date_from', "From (YYYY-MM-DD)"), ('date_to', "To (YYYY-MM-DD)")]
+        if user_type == 'verified':
+            filter_fields += [('gate_id', "Gate"), ('user_id', "User ID"), ('action', "Action")]
+        else:
+            filter_fields += [('name', "Name")]
+        self.filter_entries = {}
+        for column, (key, label) in enumerate(filter_fields):
+            tk.Label(filter_frame, text=label).grid(row=0, column=column, sticky='w')
+            entry = tk.Entry(filter_frame, width=14)
+            entry.grid(row=1, column=column, padx=2)
+            self.filter_entries[key] = entry
+        tk.Button(filter_frame, text="Apply", command=self.apply_filters).grid(row=1, column=len(filter_fields), padx=5)
+
+        table_frame = tk.Frame(self.window)
+        table_frame.pack(expand=1, fill='both')
+        self.tree = ttk.Treeview(table_frame, columns=self.columns, show='headings', height=25)
+        for name in self.columns:
+            self.tree.heading(name, text=name)
+            self.tree.column(name, width=110, stretch=True)
+        scrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side='left', expand=1, fill='both')
+        scrollbar.pack(side='right', fill='y')
+
+        nav_frame = tk.Frame(self.window)
+        nav_frame.pack(fill='x', pady=5)
+        tk.Button(nav_frame, text="< Newer", command=self.newer_page).pack(side='left', padx=5)
+        tk.Button(nav_frame, text="Older >", command=self.older_page).pack(side='left', padx=5)
+        tk.Button(nav_frame, text="Export...", command=self.export).pack(side='left', padx=5)
+        self.status_var = tk.StringVar()
+        tk.Label(nav_frame, textvariable=self.status_var).pack(side='right', padx=5)
+
+        self.load_page()
+
+    # Read the filter entries and reload from the newest row
+    def apply_filters(self):
+        filters = {key: entry.get().strip() for key, entry in self.filter_entries.items() if entry.get().strip()}
+        for key in ('date_from', 'date_to'):
+            if key in filters:
+                try:
+                    parse_date(filters[key])
+                except ValueError:
+                    messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format.")
+                    return
+        self.filters = filters
+        self.load_page()
+
+    def older_page(self):
+        if self.rows:
+            self.load_page(older_than=self.rows[-1][0])
+
+    def newer_page(self):
+        if self.rows:
+            self.load_page(newer_than=self.rows[0][0])
+
+    # Fetch one page on a database worker; a newer request supersedes one still running
+    def load_page(self, older_than=None, newer_than=None):
+        if self.pending is not None:
+            self.pending.cancel()
+        self.status_var.set("Loading...")
+        self.pending = ui_worker.submit(fetch_log_page, self.user_type, self.filters, older_than, newer_than, self.page_size,
+                                        on_done=lambda rows: self.show_page(rows, older_than, newer_than),
+                                        description="Loading logs...")
+
+    # Write every row matching the current filters to a file chosen by the user
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension='.csv',
+                                            filetypes=[("CSV", '*.csv'), ("JSON Lines", '*.jsonl'), ("Compressed", '*.gz')])
+        if not path:
+            return
+        import log_export  # log_export imports this module
+        name = path[:-3] if path.endswith('.gz') else path
+        fmt = 'jsonl' if name.endswith('.jsonl') else 'csv'
+        ui_worker.submit(log_export.export_logs, self.user_type, path, fmt, self.filters, path.endswith('.gz'),
+                         on_done=lambda result: messagebox.showinfo("Export", f"Exported {result[0]} rows to {path}", parent=self.window),
+                         description="Exporting logs...")
+
+    # Replace the rendered rows with the page just fetched
+    def show_page(self, rows, older_than=None, newer_than=None):
+        self.pending = None
+        if not rows and (older_than is not None or newer_than is not None):
+            self.status_var.set("No more rows")
+            return
+        self.rows = rows
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', tk.END, values=['' if value is None else value for value in row])
+        if rows:
+            self.status_var.set(f"Showing {self.columns[0]} {rows[0][0]} to {rows[-1][0]}")
+        else:
+            self.status_var.set("No matching rows")
@@ -0,0 +1,119 @@
+import argparse
+import csv
+import functools
+import gzip
+import io
+import json
+import os
+import database
+import migrations
+from log_browser import LOG_SOURCES, build_filters
+
+# Rows read from the cursor per fetch; memory use stays at one chunk whatever the table size
+FETCH_SIZE = 5000
+
+FORMATS = ('csv', 'jsonl')
+
+# gzip level for compressed exports (the default 9 is over twice as slow for files a few percent smaller)
+GZIP_LEVEL = 6
+
+# Matching rows in key order, read FETCH_SIZE at a time from one cursor
+def iter_rows(conn, source, filters=None, after_key=None):
+    table, key_column, time_column, columns, base_clause = LOG_SOURCES[source]
+    clauses, params = build_filters(source, filters or {})
+    if after_key is not None:
+        clauses.append(f"{key_column} > ?")
+        params.append(after_key)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} {where} ORDER BY {key_column}", params)
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+# Rows as CSV lines, header first
+def csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+# Rows as one JSON object per line
+def jsonl_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), separators=(',', ':')) + '\n'
+
+ENCODERS = {'csv': csv_lines, 'jsonl': jsonl_lines}
+
+# Last key a named incremental export has written for a source (None before its first run)
+def get_watermark(name, source):
+    row = database.fetch_one("SELECT last_key FROM Export_Watermark WHERE name = ? AND source = ?", (name, source))
+    return row[0] if row else None
+
+def set_watermark(name, source, last_key):
+    database.execute("""INSERT INTO Export_Watermark (name, source, last_key) VALUES (?, ?, ?)
+                        ON CONFLICT (name, source) DO UPDATE SET last_key = excluded.last_key""", (name, source, last_key))
+
+# Stream the rows of a log source ('verified' or 'guest') into a CSV or JSONL file, gzipped
+# when compress is set. The file appears under its final name only once it is complete.
+# With a watermark name only rows past that export's last run are written, and the watermark
+# moves to the last key written after the file is in place; a crash in between means the
+# next run repeats those rows rather than skipping them.
+# Returns (rows written, last key written or None).
+def export_logs(source, path, fmt='csv', filters=None, compress=False, watermark=None):
+    columns = LOG_SOURCES[source][3]
+    after_key = get_watermark(watermark, source) if watermark else None
+    written = [0, None]
+
+    def counted(rows):
+        for row in rows:
+            written[0] += 1
+            written[1] = row[0]
+            yield row
+
+    opener = functools.partial(gzip.open, compresslevel=GZIP_LEVEL) if compress else open
+    try:
+        # One read transaction, so the file is a consistent snapshot
+        with database.read_transaction() as conn, opener(path + '.tmp', 'wt', newline='') as export_file:
+            for chunk in ENCODERS[fmt](counted(iter_rows(conn, source, filters, after_key)), columns):
+                export_file.write(chunk)
+        with open(path + '.tmp', 'rb') as export_file:
+            os.fsync(export_file.fileno())
+        os.replace(path + '.tmp', path)
+    except BaseException:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        raise
+
+    if watermark and written[1] is not None:
+        set_watermark(watermark, source, written[1])
+    return written[0], written[1]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export access logs or guest entries to CSV or JSON Lines.")
+    parser.add_argument('output', help="file to write (a .gz suffix turns on compression)")
+    parser.add_argument('--source', choices=sorted(LOG_SOURCES), default='verified')
+    parser.add_argument('--format', choices=FORMATS, help="default: from the file name, otherwise csv")
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--from', dest='date_from', help="YYYY-MM-DD")
+    parser.add_argument('--to', dest='date_to', help="YYYY-MM-DD (inclusive)")
+    parser.add_argument('--gate', dest='gate_id', type=int)
+    parser.add_argument('--incremental', metavar='NAME', help="only rows added since the last export with this name")
+    parser.add_argument('--db', help="database file (default SMART_GATE_DB or smart_gate_management.db)")
+    args = parser.parse_args()
+
+    if args.db:
+        database.set_database_path(args.db)
+    migrations.migrate()
+    name = args.output[:-3] if args.output.endswith('.gz') else args.output
+    fmt = args.format or ('jsonl' if name.endswith(('.jsonl', '.json')) else 'csv')
+    filters = {'date_from': args.date_from, 'date_to': args.date_to, 'gate_id': args.gate_id}
+    rows, last_key = export_logs(args.source, args.output, fmt, filters, args.gzip or args.output.endswith('.gz'), args.incremental)
+    print(f"Exported {rows} rows to {args.output}" + (f" (up to key {last_key})" if last_key is not None else ""))
@@ -0,0 +1,259 @@
+import argparse
+import re
+import sqlite3
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox
+import database
+import ui_worker
+from log_browser import LOG_COLUMNS, GUEST_COLUMNS, parse_date
+
+# Results per page in the search window
+PAGE_SIZE = 50
+
+# How often the background indexer folds new rows into the search indexes; a search sees
+# rows written up to this long ago
+INDEX_INTERVAL_S = 2
+
+# Searchable sources: table, key column, time column, columns shown, columns indexed.
+# Logs includes guest entries, so a name search finds guests at the gate too.
+# Only rows still in these tables are found: months moved out by log_archive and guest
+# passes moved to Guests_Archive by the sweeper leave the index with them (use
+# log_archive query for archived months).
+SEARCH_SOURCES = {
+    'logs': ('Logs', 'log_id', 'timestamp', LOG_COLUMNS + ('guest_id',), ('user_name', 'email', 'accessories')),
+    'guests': ('Guests', 'guest_id', 'entrance_time', GUEST_COLUMNS, ('name', 'person_visiting', 'office_visiting')),
+}
+
+# Words, optionally column:word and/or a trailing * for a prefix match
+TERM_PATTERN = re.compile(r'(?:(\w+):)?(\w+)(\*?)')
+
+# External-content FTS5 index per source, filled in bulk from rows past a watermark (as the
+# traffic rollup is) so the insert path of every gate event stays as fast as it was. Triggers
+# only handle updates and deletes of rows already indexed. (Run by the migrations module.)
+def search_index_sql():
+    statements = ["""CREATE TABLE IF NOT EXISTS Search_Watermark (
+                         source TEXT PRIMARY KEY,
+                         last_key INTEGER NOT NULL
+                     )"""]
+    for source, (table, key_column, _, _, indexed) in SEARCH_SOURCES.items():
+        index = f"{table}_Search"
+        lower = table.lower()
+        columns = ', '.join(indexed)
+        new_values = ', '.join(f"NEW.{column}" for column in indexed)
+        old_values = ', '.join(f"OLD.{column}" for column in indexed)
+        indexed_row = f"OLD.{key_column} <= (SELECT last_key FROM Search_Watermark WHERE source = '{source}')"
+        statements.append(f"INSERT OR IGNORE INTO Search_Watermark (source, last_key) VALUES ('{source}', 0)")
+        statements.append(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+                                  {columns}, content='{table}', content_rowid='{key_column}', tokenize='unicode61 remove_diacritics 2')""")
+        statements.append(f"""CREATE TRIGGER IF NOT EXISTS trg_{lower}_search_delete AFTER DELETE ON {table} WHEN {indexed_row} BEGIN
+                                   INSERT INTO {index} ({index}, rowid, {columns}) VALUES ('delete', OLD.{key_column}, {old_values});
+                               END""")
+        statements.append(f"""CREATE TRIGGER IF NOT EXISTS trg_{lower}_search_update AFTER UPDATE OF {columns} ON {table} WHEN {indexed_row} BEGIN
+                                   INSERT INTO {index} ({index}, rowid, {columns}) VALUES ('delete', OLD.{key_column}, {old_values});
+                                   INSERT INTO {index} (rowid, {columns}) VALUES (NEW.{key_column}, {new_values});
+                               END""")
+    return statements
+
+# Copy a source's rows past its watermark into its index
+def index_new_rows_sql(source):
+    table, key_column, _, _, indexed = SEARCH_SOURCES[source]
+    columns = ', '.join(indexed)
+    return f"""INSERT INTO {table}_Search (rowid, {columns})
+               SELECT {key_column}, {columns} FROM {table}
+               WHERE {key_column} > (SELECT last_key FROM Search_Watermark WHERE source = ?)"""
+
+# Index every row past the watermark, then move the watermark (call inside a write transaction)
+def index_new_rows(conn):
+    indexed_rows = 0
+    for source, (table, key_column, _, _, _) in SEARCH_SOURCES.items():
+        indexed_rows += conn.execute(index_new_rows_sql(source), (source,)).rowcount
+        conn.execute(f"""UPDATE Search_Watermark SET last_key = MAX(last_key, IFNULL((SELECT MAX({key_column}) FROM {table}), 0))
+                         WHERE source = ?""", (source,))
+    return indexed_rows
+
+# Bring the search indexes up to date; returns the number of rows indexed
+def catch_up():
+    with database.transaction() as conn:
+        return index_new_rows(conn)
+
+# Background indexer, started and stopped like the guest pass sweeper, so searches only read
+_stop = threading.Event()
+_thread = None
+
+def start_indexing(interval_s=INDEX_INTERVAL_S):
+    global _thread
+    if _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, args=(interval_s,), name='search-indexer', daemon=True)
+    _thread.start()
+
+def stop_indexing():
+    global _thread
+    if _thread is None:
+        return
+    _stop.set()
+    _thread.join()
+    _thread = None
+
+def _run(interval_s):
+    while True:
+        try:
+            catch_up()
+        except sqlite3.Error:
+            pass
+        if _stop.wait(interval_s):
+            break
+    database.close_connection()
+
+# Turn what the user typed into an FTS5 query. Words must all match (OR between two words
+# allows either); column:word limits a word to one column and word* matches a prefix.
+# Everything else is dropped, so user input can never be an FTS5 syntax error.
+def match_expression(source, text):
+    indexed = SEARCH_SOURCES[source][4]
+    parts = []
+    for column, word, star in TERM_PATTERN.findall(text):
+        if word == 'OR' and not column and not star:
+            if parts and parts[-1] != 'OR':
+                parts.append('OR')
+            continue
+        term = f'"{word}"{star}'
+        parts.append(f"{column} : {term}" if column in indexed else term)
+    while parts and parts[-1] == 'OR':
+        parts.pop()
+    if not parts:
+        raise ValueError("Enter at least one word to search for.")
+    return ' '.join(parts)
+
+# SQL and parameters for one page of matches to an FTS5 expression, best first (or newest first),
+# limited to a date range. Dates filter the time column of the joined rows (keys do not grow
+# with time once replica uploads arrive late). One row more than a page is asked for.
+def search_query(source, expression, date_from=None, date_to=None, page=0, page_size=PAGE_SIZE, newest_first=False):
+    table, key_column, time_column, columns, _ = SEARCH_SOURCES[source]
+    index = f"{table}_Search"
+    clauses = [f"{index} MATCH ?"]
+    params = [expression]
+    if date_from:
+        clauses.append(f"{table}.{time_column} >= ?")
+        params.append(parse_date(date_from))
+    if date_to:
+        clauses.append(f"{table}.{time_column} < ?")
+        params.append(parse_date(date_to, end=True))
+    order = f"{index}.rowid DESC" if newest_first else f"{index}.rank"
+    sql = f"""SELECT {', '.join(f'{table}.{column}' for column in columns)}
+              FROM {index} JOIN {table} ON {table}.{key_column} = {index}.rowid
+              WHERE {' AND '.join(clauses)}
+              ORDER BY {order} LIMIT ? OFFSET ?"""
+    return sql, params + [page_size + 1, page * page_size]
+
+# One page of matches for what the user typed (see search_query). Reads the index as the
+# background indexer left it, so no write lock is taken on the search path.
+# Returns (rows, more) where more says whether another page follows.
+def search(source, text, date_from=None, date_to=None, page=0, page_size=PAGE_SIZE, newest_first=False):
+    expression = match_expression(source, text)
+    rows = database.fetch_all(*search_query(source, expression, date_from, date_to, page, page_size, newest_first))
+    return rows[:page_size], len(rows) > page_size
+
+# Search window for the admin console; one page of results at a time
+class SearchWindow:
+    def __init__(self):
+        self.page = 0
+        self.query = None
+        self.pending = None
+        self.window = tk.Toplevel()
+        self.window.title("Search Logs")
+
+        form = tk.Frame(self.window)
+        form.pack(fill='x', padx=5, pady=5)
+        tk.Label(form, text="Search for").grid(row=0, column=0, sticky='w')
+        self.text_entry = tk.Entry(form, width=40)
+        self.text_entry.grid(row=1, column=0, padx=2)
+        self.text_entry.bind('<Return>', lambda event: self.start_search())
+        self.source_var = tk.StringVar(value='logs')
+        tk.OptionMenu(form, self.source_var, *SEARCH_SOURCES).grid(row=1, column=1, padx=2)
+        self.date_entries = {}
+        for column, (key, label) in enumerate([('date_from', "From (YYYY-MM-DD)"), ('date_to', "To (YYYY-MM-DD)")], start=2):
+            tk.Label(form, text=label).grid(row=0, column=column, sticky='w')
+            entry = tk.Entry(form, width=14)
+            entry.grid(row=1, column=column, padx=2)
+            self.date_entries[key] = entry
+        self.newest_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(form, text="Newest first", variable=self.newest_var).grid(row=1, column=4, padx=2)
+        tk.Button(form, text="Search", command=self.start_search).grid(row=1, column=5, padx=5)
+
+        self.tree = ttk.Treeview(self.window, show='headings', height=25)
+        self.tree.pack(expand=1, fill='both')
+
+        nav_frame = tk.Frame(self.window)
+        nav_frame.pack(fill='x', pady=5)
+        self.previous_button = tk.Button(nav_frame, text="< Previous", command=lambda: self.load(self.page - 1), state='disabled')
+        self.previous_button.pack(side='left', padx=5)
+        self.next_button = tk.Button(nav_frame, text="Next >", command=lambda: self.load(self.page + 1), state='disabled')
+        self.next_button.pack(side='left', padx=5)
+        self.status_var = tk.StringVar()
+        tk.Label(nav_frame, textvariable=self.status_var).pack(side='right', padx=5)
+
+    # Read the form and show the first page
+    def start_search(self):
+        query = {'source': self.source_var.get(), 'text': self.text_entry.get(), 'newest_first': self.newest_var.get()}
+        for key, entry in self.date_entries.items():
+            query[key] = entry.get().strip() or None
+        try:
+            match_expression(query['source'], query['text'])
+        except ValueError as error:
+            messagebox.showerror("Error", str(error), parent=self.window)
+            return
+        try:
+            for key in ('date_from', 'date_to'):
+                if query[key]:
+                    parse_date(query[key])
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format.", parent=self.window)
+            return
+        self.query = query
+        columns = SEARCH_SOURCES[query['source']][3]
+        self.tree.configure(columns=columns)
+        for name in columns:
+            self.tree.heading(name, text=name)
+            self.tree.column(name, width=110, stretch=True)
+        self.load(0)
+
+    def load(self, page):
+        if self.query is None or page < 0:
+            return
+        if self.pending is not None:
+            self.pending.cancel()
+        self.status_var.set("Searching...")
+        self.pending = ui_worker.submit(lambda: search(page=page, **self.query), on_done=lambda result: self.show(page, *result),
+                                        description="Searching...")
+
+    def show(self, page, rows, more):
+        self.pending = None
+        self.page = page
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', tk.END, values=['' if value is None else value for value in row])
+        self.previous_button.configure(state='normal' if page > 0 else 'disabled')
+        self.next_button.configure(state='normal' if more else 'disabled')
+        if rows:
+            self.status_var.set(f"Page {page + 1}: results {page * PAGE_SIZE + 1} to {page * PAGE_SIZE + len(rows)}")
+        else:
+            self.status_var.set("No matches")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Full-text search over access logs and guest records.")
+    parser.add_argument('text', help="words to find; column:word and word* are supported")
+    parser.add_argument('--source', choices=sorted(SEARCH_SOURCES), default='logs')
+    parser.add_argument('--from', dest='date_from', help="YYYY-MM-DD")
+    parser.add_argument('--to', dest='date_to', help="YYYY-MM-DD (inclusive)")
+    parser.add_argument('--page', type=int, default=1)
+    parser.add_argument('--newest-first', action='store_true')
+    args = parser.parse_args()
+
+    catch_up()
+    rows, more = search(args.source, args.text, args.date_from, args.date_to, args.page - 1, newest_first=args.newest_first)
+    for row in rows:
+        print(*('' if value is None else value for value in row), sep='\t')
+    if more:
+        print(f"(more results: --page {args.page + 1})")
@@ -0,0 +1,157 @@
+import atexit
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import database
+import metrics
+
+LOG_INSERT_SQL = """
+    INSERT INTO Logs (timestamp, student_id, staff_id, user_name, email, action, gate_id, accessories, vehicle_id, guest_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Default group-commit settings
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_FLUSH_INTERVAL_MS = 200
+
+# Attempts made for a batch before it is reported as lost
+FLUSH_RETRIES = 3
+
+_STOP = object()
+
+# Background writer that groups queued Logs rows (each with its accessory manifest, if any)
+# into one transaction per flush, in the order they were queued
+class LogWriter:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            'events_written': 0,
+            'events_lost': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    # Queue one Logs row and its accessory manifest; returns immediately
+    def submit(self, row, manifest=None):
+        self._queue.put((row, manifest))
+
+    # Block until everything queued so far has been written
+    def flush(self):
+        self._queue.join()
+
+    # Write what is left in the queue and stop the writer thread
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    # Snapshot of the writer counters
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot['queue_depth'] = self._queue.qsize()
+        snapshot['avg_flush_ms'] = snapshot['total_flush_ms'] / snapshot['flushes'] if snapshot['flushes'] else 0.0
+        return snapshot
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            if stopping:
+                batch.extend(self._drain())
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+        database.close_connection()
+
+    # Take everything still queued without blocking
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if item is _STOP:
+                self._queue.task_done()
+            else:
+                rows.append(item)
+
+    def _write(self, batch):
+        import accessory_ledger  # accessory_ledger imports this module
+        for attempt in range(1, FLUSH_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                if any(manifest for _, manifest in batch):
+                    with database.transaction() as conn:
+                        accessory_ledger.write_logs(conn, batch)
+                else:
+                    database.execute_many(LOG_INSERT_SQL, [row for row, _ in batch])
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._stats['flush_errors'] += 1
+                print(f"log writer: flush of {len(batch)} events failed (attempt {attempt}): {e}", file=sys.stderr)
+                time.sleep(0.05 * attempt)
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats['events_written'] += len(batch)
+                self._stats['flushes'] += 1
+                self._stats['last_flush_ms'] = elapsed_ms
+                self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+                self._stats['total_flush_ms'] += elapsed_ms
+            return
+        with self._lock:
+            self._stats['events_lost'] += len(batch)
+
+_writer = None
+
+# Turn on buffered logging for this process
+def start_buffered_logging(batch_size=DEFAULT_BATCH_SIZE, flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS):
+    global _writer
+    if _writer is None:
+        _writer = LogWriter(batch_size, flush_interval_ms)
+        metrics.register_source('log_writer', _writer.stats)
+    return _writer
+
+# The active writer, or None when logging is synchronous
+def get_writer():
+    return _writer
+
+# Drain the queue and go back to synchronous logging
+def stop_buffered_logging():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+atexit.register(stop_buffered_logging)
@@ -0,0 +1,210 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Metrics are collected only when SMART_GATE_METRICS=1 at start-up; otherwise nothing is
+# wrapped and the hot paths run exactly as before
+ENABLED = os.environ.get('SMART_GATE_METRICS') == '1'
+
+# Queries and calls slower than this many milliseconds go to the slow-query log (unset: off)
+SLOW_QUERY_MS = float(os.environ['SMART_GATE_SLOW_QUERY_MS']) if os.environ.get('SMART_GATE_SLOW_QUERY_MS') else None
+SLOW_QUERY_LOG = os.environ.get('SMART_GATE_SLOW_LOG', 'slow_queries.log')
+
+# Where the Prometheus text snapshot is written or served
+EXPORT_FILE = os.environ.get('SMART_GATE_METRICS_FILE')
+EXPORT_PORT = int(os.environ['SMART_GATE_METRICS_PORT']) if os.environ.get('SMART_GATE_METRICS_PORT') else None
+EXPORT_INTERVAL_S = 10
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Longest SQL text kept as a label
+SQL_LABEL_LENGTH = 80
+
+_lock = threading.Lock()
+_series = {}
+_sources = {}
+_sql_labels = {}
+_slow_log = None
+
+# Latency histogram plus call, error and row counters for one operation
+class Series:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.rows = 0
+
+    def observe(self, seconds, rows, failed):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.rows += rows
+        self.errors += failed
+
+# Record one timed call. family is 'call' or 'query'; name is the function or SQL text.
+def observe(family, name, seconds, rows=0, failed=False, detail=None):
+    with _lock:
+        series = _series.get((family, name))
+        if series is None:
+            series = _series[(family, name)] = Series()
+        series.observe(seconds, rows, failed)
+    if SLOW_QUERY_MS is not None and seconds * 1000 >= SLOW_QUERY_MS:
+        log_slow(family, name, seconds, detail)
+
+# Append one line to the slow-query log (logging is imported on the first slow call)
+def log_slow(family, name, seconds, detail):
+    global _slow_log
+    if _slow_log is None:
+        import logging
+        _slow_log = logging.getLogger('smart_gate.slow_queries')
+        handler = logging.FileHandler(SLOW_QUERY_LOG)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        _slow_log.addHandler(handler)
+        _slow_log.setLevel(logging.INFO)
+        _slow_log.propagate = False
+    message = f"{seconds * 1000:.2f} ms {family} {name}"
+    if detail is not None:
+        message += f" {detail!r}"[:300]
+    _slow_log.info(message)
+
+# Label for a SQL statement: whitespace collapsed and cut short (computed once per statement)
+def sql_label(sql):
+    label = _sql_labels.get(sql)
+    if label is None:
+        label = _sql_labels[sql] = ' '.join(sql.split())[:SQL_LABEL_LENGTH]
+    return label
+
+# Wrap a named function so each call is timed (returns it unchanged when metrics are off)
+def instrument(name, rows=None):
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                observe('call', name, time.perf_counter() - started, failed=True, detail=args)
+                raise
+            observe('call', name, time.perf_counter() - started, rows(result) if rows else 0, detail=args)
+            return result
+        return timed_function
+    return decorate
+
+# Wrap a database helper taking (sql, params) so each statement is timed under its SQL text
+def instrument_query(function, rows=None):
+    if not ENABLED:
+        return function
+
+    @functools.wraps(function)
+    def timed_query(sql, params=()):
+        started = time.perf_counter()
+        try:
+            result = function(sql, params)
+        except Exception:
+            observe('query', sql_label(sql), time.perf_counter() - started, failed=True)
+            raise
+        detail = params if isinstance(params, (tuple, list, dict)) and len(params) < 20 else None
+        observe('query', sql_label(sql), time.perf_counter() - started, rows(result) if rows else 0, detail=detail)
+        return result
+    return timed_query
+
+# Time a block of code (a no-op context when metrics are off)
+def timed(name):
+    if not ENABLED:
+        return nullcontext()
+    return _timed(name)
+
+@contextmanager
+def _timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe('call', name, time.perf_counter() - started, failed=True)
+        raise
+    observe('call', name, time.perf_counter() - started)
+
+# Publish the counters a component already keeps (source returns a dict of numbers)
+def register_source(name, source):
+    _sources[name] = source
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Everything collected so far in the Prometheus text format
+def render():
+    with _lock:
+        series = {key: (list(s.buckets), s.count, s.total, s.errors, s.rows) for key, s in _series.items()}
+    lines = []
+    for family, label in (('call', 'name'), ('query', 'sql')):
+        metric = f"smart_gate_{family}_seconds"
+        lines.append(f"# HELP {metric} Latency of instrumented {family}s.")
+        lines.append(f"# TYPE {metric} histogram")
+        for (series_family, name), (buckets, count, total, errors, rows) in sorted(series.items()):
+            if series_family != family:
+                continue
+            label_text = f'{label}="{_escape(name)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), buckets):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label_text}}} {total:.6f}")
+            lines.append(f"{metric}_count{{{label_text}}} {count}")
+            lines.append(f"smart_gate_{family}_errors_total{{{label_text}}} {errors}")
+            lines.append(f"smart_gate_{family}_rows_total{{{label_text}}} {rows}")
+    for source_name, source in sorted(_sources.items()):
+        for key, value in sorted(source().items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"smart_gate_{source_name}_{key} {value}")
+    return '\n'.join(lines) + '\n'
+
+# Write a snapshot to a file atomically
+def write_snapshot(path):
+    with open(path + '.tmp', 'w') as snapshot_file:
+        snapshot_file.write(render())
+    os.replace(path + '.tmp', path)
+
+# Serve render() at /metrics on a background thread (http.server is only imported when a
+# port is configured, so start-up does not pay for it)
+def serve_http(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+# Start the file and/or HTTP exporters configured by SMART_GATE_METRICS_FILE / _PORT
+def start_exporting():
+    if not ENABLED:
+        return
+    if EXPORT_FILE:
+        def export_loop():
+            while True:
+                write_snapshot(EXPORT_FILE)
+                time.sleep(EXPORT_INTERVAL_S)
+        threading.Thread(target=export_loop, name='metrics-file', daemon=True).start()
+    if EXPORT_PORT:
+        serve_http(EXPORT_PORT)
@@ -0,0 +1,307 @@
+import argparse
+import database
+
+# Schema changes in the order they were made. PRAGMA user_version records how many have been
+# applied, so a current database costs one PRAGMA read at start-up instead of re-running the DDL.
+# Add new migrations at the end of MIGRATIONS; never edit one that has shipped.
+
+# Add a column unless it is already there (databases edited by hand before versioning)
+def add_column(conn, table, column, definition):
+    if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+# 1: the schema as it stood before versioning. Everything is IF NOT EXISTS so databases created
+# by earlier releases are adopted as version 1 unchanged.
+def create_base_schema(conn):
+    import terminal_replica
+
+    # Create Gate_Status table
+    conn.execute('''CREATE TABLE IF NOT EXISTS Gate_Status (
+                    gate_id INTEGER PRIMARY KEY,
+                    gate_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    is_locked_down INTEGER DEFAULT 0
+                )''')
+
+    # Create Logs table
+    conn.execute('''CREATE TABLE IF NOT EXISTS Logs (
+                    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    student_id INTEGER,
+                    staff_id INTEGER,
+                    user_name TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    gate_id INTEGER,
+                    accessories TEXT,
+                    vehicle_id INTEGER,
+                    guest_id INTEGER,
+                    FOREIGN KEY (student_id) REFERENCES Student(student_id),
+                    FOREIGN KEY (staff_id) REFERENCES Staff(staff_id),
+                    FOREIGN KEY (gate_id) REFERENCES Gate_Status(gate_id),
+                    FOREIGN KEY (guest_id) REFERENCES Guests(guest_id)
+                )''')
+
+    # Create Guests table
+    conn.execute('''CREATE TABLE IF NOT EXISTS Guests (
+                    guest_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    contact TEXT,
+                    id_number TEXT,
+                    age INTEGER CHECK(age >= 0),
+                    office_visiting TEXT,
+                    person_visiting TEXT,
+                    entrance_time TEXT NOT NULL
+                )''')
+
+    # Create Student table
+    conn.execute('''CREATE TABLE IF NOT EXISTS Student (
+                    student_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    contact TEXT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    department_id INTEGER,
+                    access_level INTEGER DEFAULT 1,
+                    FOREIGN KEY (department_id) REFERENCES Department(department_id)
+                )''')
+
+    # Create Staff table
+    conn.execute('''CREATE TABLE IF NOT EXISTS Staff (
+                    staff_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    department_id INTEGER,
+                    access_level INTEGER DEFAULT 1,
+                    FOREIGN KEY (department_id) REFERENCES Department(department_id)
+                )''')
+
+    # Create Vehicle table
+    conn.execute('''CREATE TABLE IF NOT EXISTS Vehicle (
+                    vehicle_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    make TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    color TEXT,
+                    license_plate TEXT UNIQUE NOT NULL,
+                    owner_id INTEGER,
+                    owner_type TEXT CHECK(owner_type IN ('Student', 'Staff')),
+                    FOREIGN KEY (owner_id) REFERENCES Student(student_id) ON DELETE CASCADE,
+                    FOREIGN KEY (owner_id) REFERENCES Staff(staff_id) ON DELETE CASCADE
+                )''')
+
+    # Create Accessories table
+    conn.execute('''CREATE TABLE IF NOT EXISTS Accessories (
+                    accessory_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    type TEXT NOT NULL,
+                    description TEXT,
+                    quantity INTEGER NOT NULL CHECK(quantity >= 0),
+                    department_id INTEGER,
+                    FOREIGN KEY (department_id) REFERENCES Department(department_id)
+                )''')
+
+    # Create Roster_Version table (change counter for cached roster lookups)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Roster_Version (
+                    id INTEGER PRIMARY KEY CHECK(id = 1),
+                    version INTEGER NOT NULL
+                )''')
+    conn.execute("INSERT OR IGNORE INTO Roster_Version (id, version) VALUES (1, 0)")
+
+    # Create Face_Embeddings table (unit-length float32 vectors for face matching)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Face_Embeddings (
+                    person_type TEXT NOT NULL CHECK(person_type IN ('student', 'staff')),
+                    person_id INTEGER NOT NULL,
+                    embedding BLOB NOT NULL,
+                    PRIMARY KEY (person_type, person_id)
+                )''')
+
+    # Create Gate_Version table (change counter for cached gate state)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Gate_Version (
+                    id INTEGER PRIMARY KEY CHECK(id = 1),
+                    version INTEGER NOT NULL
+                )''')
+    conn.execute("INSERT OR IGNORE INTO Gate_Version (id, version) VALUES (1, 0)")
+
+    # Create Traffic_Rollup table (event counts per hour, gate, action and user type)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Traffic_Rollup (
+                    hour TEXT NOT NULL,
+                    gate_id INTEGER NOT NULL,
+                    action TEXT NOT NULL,
+                    user_type TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (hour, gate_id, action, user_type)
+                ) WITHOUT ROWID''')
+
+    # Create Rollup_Watermark table (last log_id folded into Traffic_Rollup)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Rollup_Watermark (
+                    id INTEGER PRIMARY KEY CHECK(id = 1),
+                    last_log_id INTEGER NOT NULL
+                )''')
+    conn.execute("INSERT OR IGNORE INTO Rollup_Watermark (id, last_log_id) VALUES (1, 0)")
+
+    # Create Presence_State table (everyone on campus as of the presence checkpoint)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Presence_State (
+                    person_type TEXT NOT NULL CHECK(person_type IN ('student', 'staff', 'guest')),
+                    person_id TEXT NOT NULL,
+                    gate_id INTEGER,
+                    PRIMARY KEY (person_type, person_id)
+                ) WITHOUT ROWID''')
+
+    # Create Presence_Checkpoint table (last log_id reflected in Presence_State)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Presence_Checkpoint (
+                    id INTEGER PRIMARY KEY CHECK(id = 1),
+                    last_log_id INTEGER NOT NULL
+                )''')
+    conn.execute("INSERT OR IGNORE INTO Presence_Checkpoint (id, last_log_id) VALUES (1, 0)")
+
+    # Create Change_Log table (one row per change to the tables terminals replicate)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Change_Log (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    row_key INTEGER NOT NULL
+                )''')
+    for statement in terminal_replica.change_tracking_sql():
+        conn.execute(statement)
+
+    # Create Replica_Uploads table (last queued log each terminal replica has uploaded)
+    conn.execute('''CREATE TABLE IF NOT EXISTS Replica_Uploads (
+                    replica_id TEXT PRIMARY KEY,
+                    last_local_id INTEGER NOT NULL
+                )''')
+
+    # Create indexes for the lookups done on every gate event and log view
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_guests_name_lower ON Guests (LOWER(name))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_guests_entrance_time ON Guests (entrance_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_accessories_type ON Accessories (type)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_guest_id ON Logs (guest_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_gate_timestamp ON Logs (gate_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON Logs (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_student_id ON Logs (student_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_staff_id ON Logs (staff_id)")
+
+    # Initialize Gate_Status with default value
+    conn.execute("INSERT OR IGNORE INTO Gate_Status (gate_id, gate_name, status, is_locked_down) VALUES (1, 'Main Gate', 'closed', 0)")
+
+# 2: Staff gets the contact column the registration form has always written
+def add_staff_contact(conn):
+    add_column(conn, 'Staff', 'contact', 'TEXT')
+
+# 3: accessories record who registered them (they were filed under department_id = user ID)
+def add_accessory_owner(conn):
+    add_column(conn, 'Accessories', 'owner_id', 'INTEGER')
+    add_column(conn, 'Accessories', 'owner_type', "TEXT CHECK(owner_type IN ('Student', 'Staff'))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_accessories_owner ON Accessories (owner_type, owner_id)")
+
+# 4: Export_Watermark (last key each named incremental export has written, per log source)
+def add_export_watermarks(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS Export_Watermark (
+                    name TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    last_key INTEGER NOT NULL,
+                    PRIMARY KEY (name, source)
+                ) WITHOUT ROWID''')
+
+# 5: Logs_Search and Guests_Search, FTS5 indexes over the searchable text, and Search_Watermark
+# (last key indexed per source); the rows already there are indexed now
+def add_search_indexes(conn):
+    import log_search
+
+    for statement in log_search.search_index_sql():
+        conn.execute(statement)
+    log_search.index_new_rows(conn)
+
+# 6: guest passes. Each guest gets a validity window and an expired flag the sweeper sets;
+# guest login reads a partial index over unexpired passes only, and swept passes move to
+# Guests_Archive. Existing guests get a 12 hour pass from their entrance time.
+def add_guest_passes(conn):
+    add_column(conn, 'Guests', 'valid_from', 'TEXT')
+    add_column(conn, 'Guests', 'valid_until', 'TEXT')
+    add_column(conn, 'Guests', 'expired', 'INTEGER NOT NULL DEFAULT 0')
+    conn.execute("""UPDATE Guests SET valid_from = strftime('%Y-%m-%dT%H:%M:%S', entrance_time),
+                                      valid_until = strftime('%Y-%m-%dT%H:%M:%S', entrance_time, '+12 hours')
+                    WHERE valid_from IS NULL""")
+    conn.execute("UPDATE Guests SET expired = 1 WHERE valid_until IS NULL OR valid_until <= strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_guests_active_name ON Guests (LOWER(name), valid_from) WHERE expired = 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_guests_expiry ON Guests (expired, valid_until)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS Guests_Archive (
+                    guest_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    contact TEXT,
+                    id_number TEXT,
+                    age INTEGER,
+                    office_visiting TEXT,
+                    person_visiting TEXT,
+                    entrance_time TEXT NOT NULL,
+                    valid_from TEXT,
+                    valid_until TEXT,
+                    archived_at TEXT NOT NULL
+                )''')
+
+# 7: Anomaly_Alerts (alerts the gate processes' anomaly detectors raise, for the admin console)
+def add_anomaly_alerts(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS Anomaly_Alerts (
+                    alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    raised_at TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    gate_id INTEGER,
+                    person_type TEXT,
+                    person_id TEXT,
+                    detail TEXT
+                )''')
+
+# 8: Accessory_Manifest (items carried through the gate, one row per item type per Logs event)
+def add_accessory_manifest(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS Accessory_Manifest (
+                    manifest_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    log_id INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    description TEXT,
+                    quantity INTEGER NOT NULL CHECK(quantity > 0),
+                    FOREIGN KEY (log_id) REFERENCES Logs(log_id)
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_manifest_log_id ON Accessory_Manifest (log_id, type)")
+
+MIGRATIONS = (
+    create_base_schema,
+    add_staff_contact,
+    add_accessory_owner,
+    add_export_watermarks,
+    add_search_indexes,
+    add_guest_passes,
+    add_anomaly_alerts,
+    add_accessory_manifest,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version():
+    return database.fetch_one("PRAGMA user_version")[0]
+
+# Bring the database up to SCHEMA_VERSION; returns the number of migrations applied.
+# All pending migrations run in one write transaction, so a failure leaves the old version
+# in place and a second process starting at the same time waits and then finds nothing to do.
+def migrate():
+    if schema_version() == SCHEMA_VERSION:
+        return 0
+    with database.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"Database schema version {version} is newer than this program supports ({SCHEMA_VERSION}).")
+        for migration in MIGRATIONS[version:]:
+            migration(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return SCHEMA_VERSION - version
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations.")
+    parser.add_argument('--status', action='store_true', help="only show the schema version")
+    args = parser.parse_args()
+
+    if args.status:
+        print(f"schema version {schema_version()} of {SCHEMA_VERSION}")
+    else:
+        applied = migrate()
+        print(f"applied {applied} migration(s), schema version {SCHEMA_VERSION}")
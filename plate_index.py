@@ -0,0 +1,142 @@
+import threading
+import database
+import auth_cache
+from auth_cache import read_roster_version
+
+# Characters a camera or a guard commonly confuses, folded to one form
+CONFUSABLE_CHARACTERS = str.maketrans({'O': '0', 'Q': '0', 'I': '1'})
+
+# Largest edit distance accepted by the fuzzy lookup
+MAX_DISTANCE = 1
+
+# Canonical form of a plate: upper case, no spaces or dashes, confusables folded
+def normalize_plate(plate):
+    return ''.join(ch for ch in plate.upper() if ch.isalnum()).translate(CONFUSABLE_CHARACTERS)
+
+# Every string made by deleting one character
+def deletions(key):
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+# Edit distance counting insertions, deletions, substitutions and adjacent swaps
+def edit_distance(a, b):
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+# Plate lookup tolerant of OCR errors.
+# Plates are stored under their normalized key, and every key is also filed under each
+# of its single-character deletions. Two keys within one edit of each other always share
+# an entry, so a fuzzy lookup is a handful of dict probes plus a final distance check.
+class PlateIndex:
+    def __init__(self):
+        self._plates = {}
+        self._neighbours = {}
+        self._last_vehicle_id = 0
+        self._version = None
+        self._data_versions = {}
+        self._local_changes = 0
+        self._lock = threading.Lock()
+
+    # Build the index from every row of the Vehicle table in one pass
+    @classmethod
+    def load(cls):
+        index = cls()
+        index._version = read_roster_version()
+        index._data_versions[threading.get_ident()] = database.fetch_one("PRAGMA data_version")[0]
+        index._local_changes = auth_cache.local_roster_changes
+        index._add_rows(database.fetch_all("SELECT vehicle_id, license_plate FROM Vehicle"), advance=True)
+        return index
+
+    def __len__(self):
+        return sum(len(vehicles) for vehicles in self._plates.values())
+
+    # Add one vehicle (used right after an insert). The refresh watermark is left alone
+    # so vehicles other processes inserted with lower ids are still picked up.
+    def add(self, vehicle_id, license_plate):
+        self._add_rows([(vehicle_id, license_plate)], advance=False)
+
+    def _add_rows(self, rows, advance):
+        with self._lock:
+            for vehicle_id, license_plate in rows:
+                key = normalize_plate(license_plate)
+                vehicles = self._plates.setdefault(key, [])
+                if (vehicle_id, license_plate) not in vehicles:
+                    vehicles.append((vehicle_id, license_plate))
+                for variant in deletions(key):
+                    self._neighbours.setdefault(variant, set()).add(key)
+                if advance:
+                    self._last_vehicle_id = max(self._last_vehicle_id, vehicle_id)
+
+    # Pull in vehicles registered since the last refresh.
+    # Vehicle ids only grow, so only rows past the last seen id are read.
+    # PRAGMA data_version is per connection, so each thread's last value is kept separately.
+    def refresh(self):
+        thread_id = threading.get_ident()
+        data_version = database.fetch_one("PRAGMA data_version")[0]
+        local_changes = auth_cache.local_roster_changes
+        if self._data_versions.get(thread_id) == data_version and local_changes == self._local_changes:
+            return
+        self._data_versions[thread_id] = data_version
+        self._local_changes = local_changes
+        version = read_roster_version()
+        if version == self._version and version is not None:
+            return
+        self._version = version
+        self._add_rows(database.fetch_all("SELECT vehicle_id, license_plate FROM Vehicle WHERE vehicle_id > ?", (self._last_vehicle_id,)), advance=True)
+
+    # Vehicles whose plate is within max_distance edits of the given plate.
+    # Returns (distance, vehicle_id, license_plate) tuples, closest first.
+    def lookup(self, license_plate, max_distance=MAX_DISTANCE):
+        key = normalize_plate(license_plate)
+        with self._lock:
+            if key in self._plates:
+                return [(0, vehicle_id, plate) for vehicle_id, plate in self._plates[key]]
+            if max_distance < 1:
+                return []
+            candidates = set(self._neighbours.get(key, ()))
+            for variant in deletions(key):
+                if variant in self._plates:
+                    candidates.add(variant)
+                candidates.update(self._neighbours.get(variant, ()))
+            matches = []
+            for candidate in candidates:
+                distance = edit_distance(key, candidate)
+                if distance <= max_distance:
+                    matches.extend((distance, vehicle_id, plate) for vehicle_id, plate in self._plates[candidate])
+        matches.sort()
+        return matches
+
+    # The vehicle_id of the single closest plate, or None if there is no match or a tie
+    def find_unique(self, license_plate, max_distance=MAX_DISTANCE):
+        matches = self.lookup(license_plate, max_distance)
+        if not matches:
+            return None
+        if len(matches) > 1 and matches[1][0] == matches[0][0]:
+            return None
+        return matches[0][1]
+
+_shared = None
+_shared_lock = threading.Lock()
+
+# The index shared by this process, loaded on first use and kept current
+def shared_index():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PlateIndex.load()
+        else:
+            _shared.refresh()
+        return _shared
+
+# Record a vehicle added by this process in the shared index (if it has been loaded)
+def notify_vehicle_added(vehicle_id, license_plate):
+    if _shared is not None:
+        _shared.add(vehicle_id, license_plate)
@@ -0,0 +1,173 @@
+import argparse
+import atexit
+import sqlite3
+import threading
+import database
+import log_writer
+
+# Person types tracked and the Logs column holding each one's ID
+PERSON_COLUMNS = (('student', 'student_id'), ('staff', 'staff_id'), ('guest', 'guest_id'))
+
+# Events replayed after this many are applied, so the next start-up replays a short tail
+CHECKPOINT_EVERY = 5000
+
+# Rows read per fetch while replaying the log tail
+FETCH_SIZE = 5000
+
+# Reason given for an entry refused by anti-passback
+PASSBACK_REASON = "Already recorded as on campus. Exit must be recorded before entering again."
+
+TAIL_SQL = """
+    SELECT log_id, student_id, staff_id, guest_id, action, gate_id
+    FROM Logs WHERE log_id > ? ORDER BY log_id
+"""
+
+# The (person_type, person_id) a Logs row belongs to, or None
+def person_of(student_id, staff_id, guest_id):
+    for (person_type, _), person_id in zip(PERSON_COLUMNS, (student_id, staff_id, guest_id)):
+        if person_id is not None:
+            return person_type, str(person_id)
+    return None
+
+# Who is on campus right now, rebuilt from the last checkpoint plus the Logs written since.
+# Only people inside are stored (key -> gate they came in through), and a running count per
+# person type makes occupancy a dictionary read.
+class PresenceTracker:
+    def __init__(self):
+        self._inside = {}
+        self._counts = {person_type: 0 for person_type, _ in PERSON_COLUMNS}
+        self._last_log_id = 0
+        self._data_versions = {}
+        self._since_checkpoint = 0
+        self._lock = threading.RLock()
+
+    # Restore the checkpoint and replay every log row written after it, all from one read
+    # snapshot so the saved state and its last_log_id come from the same checkpoint
+    @classmethod
+    def load(cls):
+        tracker = cls()
+        with database.read_transaction() as conn:
+            tracker._last_log_id = conn.execute("SELECT last_log_id FROM Presence_Checkpoint WHERE id = 1").fetchone()[0]
+            for person_type, person_id, gate_id in conn.execute("SELECT person_type, person_id, gate_id FROM Presence_State"):
+                tracker._inside[(person_type, person_id)] = gate_id
+                tracker._counts[person_type] += 1
+            tracker._replay(conn)
+        return tracker
+
+    # Apply one event; enter and exit set the state, so replaying an event twice is harmless
+    def apply(self, person_type, person_id, action, gate_id=None):
+        key = (person_type, str(person_id))
+        with self._lock:
+            if action == 'enter' and key not in self._inside:
+                self._inside[key] = gate_id
+                self._counts[person_type] += 1
+            elif action == 'exit' and key in self._inside:
+                del self._inside[key]
+                self._counts[person_type] -= 1
+
+    # Apply the Logs row built by access_engine.build_log_row
+    def apply_log_row(self, row):
+        person = person_of(row[1], row[2], row[9])
+        if person is not None:
+            self.apply(person[0], person[1], row[5], row[6])
+
+    def _replay(self, conn):
+        cursor = conn.execute(TAIL_SQL, (self._last_log_id,))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            with self._lock:
+                for log_id, student_id, staff_id, guest_id, action, gate_id in rows:
+                    person = person_of(student_id, staff_id, guest_id)
+                    if person is not None:
+                        self.apply(person[0], person[1], action, gate_id)
+                    self._last_log_id = log_id
+                self._since_checkpoint += len(rows)
+
+    # Pick up events other terminals have written; skipped when nothing was committed.
+    # PRAGMA data_version is per connection, so each thread's last value is kept separately.
+    def refresh(self, force=False):
+        thread_id = threading.get_ident()
+        data_version = database.fetch_one("PRAGMA data_version")[0]
+        if self._data_versions.get(thread_id) == data_version and not force:
+            return
+        self._data_versions[thread_id] = data_version
+        with database.read_transaction() as conn:
+            self._replay(conn)
+        if self._since_checkpoint >= CHECKPOINT_EVERY:
+            self.checkpoint()
+
+    # Save the inside set together with the last log_id it reflects
+    def checkpoint(self):
+        writer = log_writer.get_writer()
+        if writer is not None:
+            writer.flush()
+        with self._lock:
+            with database.transaction() as conn:
+                self._replay(conn)
+                conn.execute("DELETE FROM Presence_State")
+                conn.executemany("INSERT INTO Presence_State (person_type, person_id, gate_id) VALUES (?, ?, ?)",
+                                 ((person_type, person_id, gate_id) for (person_type, person_id), gate_id in self._inside.items()))
+                conn.execute("UPDATE Presence_Checkpoint SET last_log_id = ? WHERE id = 1", (self._last_log_id,))
+            self._since_checkpoint = 0
+
+    def is_inside(self, person_type, person_id):
+        return (person_type, str(person_id)) in self._inside
+
+    # Number of people inside, for one person type or everyone
+    def occupancy(self, person_type=None):
+        if person_type is not None:
+            return self._counts[person_type]
+        return sum(self._counts.values())
+
+    # (person_type, person_id, gate_id) for everyone inside
+    def inside(self, person_type=None):
+        with self._lock:
+            return [(key[0], key[1], gate_id) for key, gate_id in self._inside.items() if person_type in (None, key[0])]
+
+    # Reason an entry must be refused (None when it may go ahead)
+    def passback_violation(self, person_type, person_id, direction='enter'):
+        if direction == 'enter' and self.is_inside(person_type, person_id):
+            return PASSBACK_REASON
+        return None
+
+_shared = None
+_shared_lock = threading.Lock()
+
+# The tracker shared by this process, loaded on first use and kept current
+def shared_tracker():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PresenceTracker.load()
+            atexit.register(checkpoint_at_exit)
+        else:
+            _shared.refresh()
+        return _shared
+
+# Save the shared tracker on the way out; an unreachable database only costs a longer replay
+def checkpoint_at_exit():
+    try:
+        _shared.checkpoint()
+    except sqlite3.Error:
+        pass
+
+# Record events this process just logged in the shared tracker (if it has been loaded)
+def notify_logged(rows):
+    if _shared is not None:
+        for row in rows:
+            _shared.apply_log_row(row)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show campus occupancy and save a presence checkpoint.")
+    parser.add_argument('--list', action='store_true', help="list everyone on campus")
+    args = parser.parse_args()
+
+    tracker = PresenceTracker.load()
+    tracker.checkpoint()
+    for person_type, _ in PERSON_COLUMNS:
+        print(f"{person_type}: {tracker.occupancy(person_type)}")
+    if args.list:
+        for person_type, person_id, gate_id in sorted(tracker.inside()):
+            print(person_type, person_id, gate_id, sep='\t')
@@ -0,0 +1,148 @@
+import argparse
+import csv
+import sqlite3
+import sys
+import time
+from datetime import datetime
+import database
+import auth_cache
+import guest_passes
+
+# Rows written per transaction
+DEFAULT_BATCH_SIZE = 1000
+
+# Target table, columns, required columns and defaults for each kind of import
+IMPORT_SPECS = {
+    'students': {
+        'table': 'Student',
+        'columns': ['student_id', 'name', 'email', 'contact', 'username', 'password', 'department_id', 'access_level'],
+        'required': ['student_id', 'name', 'email', 'username'],
+        'defaults': {'password': 'default_password', 'access_level': 1},
+    },
+    'staff': {
+        'table': 'Staff',
+        'columns': ['staff_id', 'name', 'email', 'username', 'password', 'department_id', 'access_level'],
+        'required': ['staff_id', 'name', 'email', 'username'],
+        'defaults': {'password': 'default_password', 'access_level': 1},
+    },
+    'vehicles': {
+        'table': 'Vehicle',
+        'columns': ['make', 'model', 'color', 'license_plate', 'owner_id', 'owner_type'],
+        'required': ['make', 'model', 'license_plate'],
+        'defaults': {},
+    },
+    # Guest passes registered ahead of an event; entrance_time is when the row was imported.
+    # Adults also need id_number and contact, as at the admin console.
+    'guests': {
+        'table': 'Guests',
+        'columns': ['name', 'contact', 'id_number', 'age', 'office_visiting', 'person_visiting', 'valid_from', 'valid_until', 'entrance_time'],
+        'required': ['name', 'age', 'office_visiting', 'person_visiting', 'valid_from', 'valid_until'],
+        'defaults': {'entrance_time': lambda: datetime.now().isoformat()},
+        'roster': False,
+    },
+}
+
+# Turn one CSV record into an insert tuple, or raise ValueError with the reason
+def prepare_row(spec, record):
+    values = []
+    for column in spec['columns']:
+        value = (record.get(column) or '').strip()
+        if not value:
+            if column in spec['required']:
+                raise ValueError(f"missing {column}")
+            value = spec['defaults'].get(column)
+            if callable(value):
+                value = value()
+        elif column == 'owner_type':
+            value = value.capitalize()
+        elif column == 'age':
+            value = guest_passes.parse_age(value)
+        elif column in ('valid_from', 'valid_until'):
+            try:
+                value = guest_passes.parse_pass_time(value, end=column == 'valid_until')
+            except ValueError:
+                raise ValueError(f"{column} must be YYYY-MM-DD or YYYY-MM-DD HH:MM")
+        values.append(value)
+    if 'valid_until' in spec['columns'] and values[spec['columns'].index('valid_until')] <= values[spec['columns'].index('valid_from')]:
+        raise ValueError("valid_until must be after valid_from")
+    if 'age' in spec['columns']:
+        row = dict(zip(spec['columns'], values))
+        if row['age'] >= guest_passes.ADULT_AGE and not (row['id_number'] and row['contact']):
+            raise ValueError(f"id_number and contact are required for guests {guest_passes.ADULT_AGE} and above")
+    return tuple(values)
+
+# Yield (line number, insert tuple) pairs, reporting malformed rows as they stream past
+def read_rows(spec, csv_file, errors):
+    reader = csv.DictReader(csv_file)
+    for record in reader:
+        try:
+            yield reader.line_num, prepare_row(spec, record)
+        except ValueError as e:
+            errors.append((reader.line_num, str(e)))
+
+# Insert one batch in a single transaction. If a constraint fails the batch is
+# replayed row by row in a new transaction so only the offending rows are skipped.
+def write_batch(sql, batch, errors):
+    try:
+        with database.transaction() as conn:
+            conn.executemany(sql, [row for _, row in batch])
+        return len(batch)
+    except sqlite3.IntegrityError:
+        pass
+
+    inserted = 0
+    with database.transaction() as conn:
+        for line_number, row in batch:
+            try:
+                conn.execute(sql, row)
+                inserted += 1
+            except sqlite3.IntegrityError as e:
+                errors.append((line_number, str(e)))
+    return inserted
+
+# Stream a CSV file into the roster. Returns (rows inserted, list of (line, error)).
+def import_csv(kind, csv_file, batch_size=DEFAULT_BATCH_SIZE):
+    spec = IMPORT_SPECS[kind]
+    sql = f"INSERT INTO {spec['table']} ({', '.join(spec['columns'])}) VALUES ({', '.join('?' * len(spec['columns']))})"
+    errors = []
+    inserted = 0
+    batch = []
+    for item in read_rows(spec, csv_file, errors):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            inserted += write_batch(sql, batch, errors)
+            batch = []
+    if batch:
+        inserted += write_batch(sql, batch, errors)
+
+    if inserted and spec.get('roster', True):
+        with database.transaction() as conn:
+            auth_cache.bump_roster_version(conn)
+    return inserted, errors
+
+# Write the per-row error report as CSV
+def write_error_report(errors, output):
+    writer = csv.writer(output)
+    writer.writerow(['line', 'error'])
+    writer.writerows(errors)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk import students, staff, vehicles or event guest passes from a CSV file.")
+    parser.add_argument('kind', choices=sorted(IMPORT_SPECS))
+    parser.add_argument('csv_path')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--errors', help="write rejected rows to this CSV file instead of stderr")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.csv_path, newline='') as csv_file:
+        inserted, errors = import_csv(args.kind, csv_file, args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    if args.errors:
+        with open(args.errors, 'w', newline='') as output:
+            write_error_report(errors, output)
+    else:
+        for line_number, error in errors:
+            print(f"line {line_number}: {error}", file=sys.stderr)
+    print(f"Imported {inserted} {args.kind} rows, rejected {len(errors)}, in {elapsed:.2f}s ({inserted / elapsed:.0f} rows/s)")
@@ -0,0 +1,280 @@
+import argparse
+import sqlite3
+import threading
+import time
+import uuid
+import database
+import access_engine
+import accessory_ledger
+import presence_tracker
+
+# Authorization tables copied to terminals: key column and the columns a terminal needs
+REPLICATED_TABLES = {
+    'Student': ('student_id', ('student_id',)),
+    'Staff': ('staff_id', ('staff_id',)),
+    'Vehicle': ('vehicle_id', ('vehicle_id', 'license_plate')),
+    'Accessories': ('accessory_id', ('accessory_id', 'type')),
+    'Gate_Status': ('gate_id', ('gate_id', 'gate_name', 'is_locked_down')),
+}
+
+# Changes applied per round trip, and queued logs uploaded per transaction
+PULL_BATCH = 5000
+UPLOAD_BATCH = 1000
+
+# Seconds between background sync attempts
+SYNC_INTERVAL_S = 2
+
+REPLICA_SCHEMA = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "CREATE TABLE IF NOT EXISTS Student (student_id INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS Staff (staff_id INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS Vehicle (vehicle_id INTEGER PRIMARY KEY, license_plate TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_vehicle_plate ON Vehicle (license_plate)",
+    "CREATE TABLE IF NOT EXISTS Accessories (accessory_id INTEGER PRIMARY KEY, type TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_accessories_type ON Accessories (type)",
+    "CREATE TABLE IF NOT EXISTS Gate_Status (gate_id INTEGER PRIMARY KEY, gate_name TEXT, is_locked_down INTEGER)",
+    "CREATE TABLE IF NOT EXISTS Replica_State (id INTEGER PRIMARY KEY CHECK(id = 1), replica_id TEXT NOT NULL, last_seq INTEGER NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS Pending_Logs (
+           local_id INTEGER PRIMARY KEY AUTOINCREMENT,
+           timestamp TEXT NOT NULL, student_id INTEGER, staff_id INTEGER, user_name TEXT NOT NULL, email TEXT NOT NULL,
+           action TEXT NOT NULL, gate_id INTEGER, accessories TEXT, vehicle_id INTEGER, guest_id INTEGER
+       )""",
+    """CREATE TABLE IF NOT EXISTS Pending_Manifest (
+           local_id INTEGER NOT NULL, type TEXT NOT NULL, description TEXT, quantity INTEGER NOT NULL
+       )""",
+    "CREATE INDEX IF NOT EXISTS idx_pending_manifest_local_id ON Pending_Manifest (local_id)",
+)
+
+PENDING_COLUMNS = "timestamp, student_id, staff_id, user_name, email, action, gate_id, accessories, vehicle_id, guest_id"
+
+# Triggers that file every insert, update and delete of a replicated table in Change_Log
+# (run by the migrations module on the central database)
+def change_tracking_sql():
+    statements = []
+    for table, (key_column, _) in REPLICATED_TABLES.items():
+        lower = table.lower()
+        statements.append(f"""CREATE TRIGGER IF NOT EXISTS trg_{lower}_insert AFTER INSERT ON {table} BEGIN
+                                   INSERT INTO Change_Log (table_name, row_key) VALUES ('{table}', NEW.{key_column});
+                               END""")
+        statements.append(f"""CREATE TRIGGER IF NOT EXISTS trg_{lower}_update AFTER UPDATE ON {table} BEGIN
+                                   INSERT INTO Change_Log (table_name, row_key) VALUES ('{table}', NEW.{key_column});
+                                   INSERT INTO Change_Log (table_name, row_key) SELECT '{table}', OLD.{key_column}
+                                   WHERE OLD.{key_column} IS NOT NEW.{key_column};
+                               END""")
+        statements.append(f"""CREATE TRIGGER IF NOT EXISTS trg_{lower}_delete AFTER DELETE ON {table} BEGIN
+                                   INSERT INTO Change_Log (table_name, row_key) VALUES ('{table}', OLD.{key_column});
+                               END""")
+    return statements
+
+# Drop change rows every replica has already applied (replicas further behind do a full copy).
+# The newest row is always kept so replicas can still tell how far behind they are.
+def prune_changes(keep_after_seq):
+    database.execute("DELETE FROM Change_Log WHERE seq <= ? AND seq < (SELECT MAX(seq) FROM Change_Log)", (keep_after_seq,))
+
+# Authorization answered from the terminal's local replica
+class ReplicaRoster:
+    def __init__(self, replica):
+        self.replica = replica
+
+    def _exists(self, sql, params):
+        return self.replica.query_one(sql, params) is not None
+
+    def is_locked_down(self, gate_id):
+        row = self.replica.query_one("SELECT is_locked_down FROM Gate_Status WHERE gate_id = ?", (gate_id,))
+        return bool(row and row[0])
+
+    def user_exists(self, user_type, user_id):
+        if user_type == 'student':
+            return self._exists("SELECT 1 FROM Student WHERE student_id = ?", (user_id,))
+        if user_type == 'staff':
+            return self._exists("SELECT 1 FROM Staff WHERE staff_id = ?", (user_id,))
+        return False
+
+    def find_vehicle(self, license_plate):
+        row = self.replica.query_one("SELECT vehicle_id FROM Vehicle WHERE license_plate = ?", (license_plate,))
+        return row[0] if row else None
+
+    def accessory_exists(self, accessory_type):
+        return self._exists("SELECT 1 FROM Accessories WHERE type = ?", (accessory_type,))
+
+    def missing_accessories(self, accessory_types):
+        accessory_types = set(accessory_types)
+        if not accessory_types:
+            return accessory_types
+        found = {row[0] for row in self.replica.query_in("SELECT DISTINCT type FROM Accessories WHERE type IN ({})", accessory_types)}
+        return accessory_types - found
+
+    # Anti-passback needs the central log; while it is unreachable entries are not refused
+    def passback_violation(self, person_type, person_id, direction):
+        try:
+            return presence_tracker.shared_tracker().passback_violation(person_type, person_id, direction)
+        except sqlite3.Error:
+            return None
+
+# Local copy of the authorization tables plus a queue of logs waiting for upload.
+# Pulls only the rows named in Change_Log since its last sequence number (-1 until the first copy).
+class TerminalReplica:
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        for statement in REPLICA_SCHEMA:
+            self._conn.execute(statement)
+        self._conn.execute("INSERT OR IGNORE INTO Replica_State (id, replica_id, last_seq) VALUES (1, ?, -1)", (uuid.uuid4().hex,))
+        self._conn.commit()
+        self.replica_id, self.last_seq = self._conn.execute("SELECT replica_id, last_seq FROM Replica_State").fetchone()
+        self.online = None
+        self.stats = {'pulls': 0, 'full_copies': 0, 'rows_pulled': 0, 'rows_uploaded': 0, 'sync_errors': 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def query_one(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def query_in(self, sql, values):
+        with self._lock:
+            return access_engine.fetch_in(self._conn, sql, values)
+
+    def roster(self):
+        return ReplicaRoster(self)
+
+    # Queue a decision's log row and accessory manifest locally; they reach the central
+    # Logs and Accessory_Manifest together on the next upload
+    def record(self, decision):
+        with self._lock:
+            local_id = self._conn.execute(f"INSERT INTO Pending_Logs ({PENDING_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", decision['log']).lastrowid
+            if decision.get('manifest'):
+                self._conn.executemany("INSERT INTO Pending_Manifest (local_id, type, description, quantity) VALUES (?, ?, ?, ?)",
+                                       accessory_ledger.manifest_rows(local_id, decision['manifest']))
+            self._conn.commit()
+        presence_tracker.notify_logged([decision['log']])
+
+    def pending_count(self):
+        return self.query_one("SELECT COUNT(*) FROM Pending_Logs")[0]
+
+    # Bring the replica up to date; returns the number of rows copied
+    def pull(self):
+        oldest = database.fetch_one("SELECT MIN(seq) FROM Change_Log")[0]
+        if self.last_seq < 0 or (oldest is not None and oldest > self.last_seq + 1):
+            return self._full_copy()
+
+        copied = 0
+        while True:
+            changes = database.fetch_all("SELECT seq, table_name, row_key FROM Change_Log WHERE seq > ? ORDER BY seq LIMIT ?",
+                                         (self.last_seq, PULL_BATCH))
+            if not changes:
+                break
+            keys = {}
+            for _, table, row_key in changes:
+                keys.setdefault(table, set()).add(row_key)
+            updates = {}
+            for table, table_keys in keys.items():
+                key_column, columns = REPLICATED_TABLES[table]
+                sql = f"SELECT {', '.join(columns)} FROM {table} WHERE {key_column} IN ({{}})"
+                updates[table] = access_engine.fetch_in(database.get_connection(), sql, table_keys)
+            self._apply(keys, updates, changes[-1][0])
+            copied += sum(len(rows) for rows in updates.values())
+            if len(changes) < PULL_BATCH:
+                break
+        self.stats['pulls'] += 1
+        return copied
+
+    # Replace every replicated row (first sync, or after falling behind a prune)
+    def _full_copy(self):
+        last_seq = database.fetch_one("SELECT IFNULL(MAX(seq), 0) FROM Change_Log")[0]
+        updates = {}
+        for table, (key_column, columns) in REPLICATED_TABLES.items():
+            updates[table] = database.fetch_all(f"SELECT {', '.join(columns)} FROM {table}")
+        self._apply({table: None for table in REPLICATED_TABLES}, updates, last_seq)
+        self.stats['full_copies'] += 1
+        return sum(len(rows) for rows in updates.values())
+
+    # Delete the changed keys (every row for tables mapped to None), insert their current rows
+    # and move last_seq, in one local transaction
+    def _apply(self, keys, updates, last_seq):
+        with self._lock:
+            for table, table_keys in keys.items():
+                key_column = REPLICATED_TABLES[table][0]
+                if table_keys is None:
+                    self._conn.execute(f"DELETE FROM {table}")
+                    continue
+                self._conn.executemany(f"DELETE FROM {table} WHERE {key_column} = ?", [(key,) for key in table_keys])
+            for table, rows in updates.items():
+                columns = REPLICATED_TABLES[table][1]
+                self._conn.executemany(f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+            self._conn.execute("UPDATE Replica_State SET last_seq = ? WHERE id = 1", (last_seq,))
+            self._conn.commit()
+        self.last_seq = last_seq
+        self.stats['rows_pulled'] += sum(len(rows) for rows in updates.values())
+
+    # Send queued logs to the central database in batches; returns the number uploaded.
+    # Replica_Uploads records the last local_id stored centrally in the same transaction as
+    # the rows, so a batch interrupted before the local delete is never inserted twice.
+    def upload(self):
+        uploaded = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(f"SELECT local_id, {PENDING_COLUMNS} FROM Pending_Logs ORDER BY local_id LIMIT ?",
+                                          (UPLOAD_BATCH,)).fetchall()
+                manifests = {}
+                if rows:
+                    for local_id, item_type, description, quantity in self._conn.execute(
+                            "SELECT local_id, type, description, quantity FROM Pending_Manifest WHERE local_id <= ?", (rows[-1][0],)):
+                        manifests.setdefault(local_id, []).append({'type': item_type, 'description': description, 'quantity': quantity})
+            if not rows:
+                return uploaded
+            with database.transaction() as conn:
+                done = conn.execute("SELECT last_local_id FROM Replica_Uploads WHERE replica_id = ?", (self.replica_id,)).fetchone()
+                new_rows = [row for row in rows if done is None or row[0] > done[0]]
+                accessory_ledger.write_logs(conn, [(row[1:], manifests.get(row[0])) for row in new_rows])
+                conn.execute("""INSERT INTO Replica_Uploads (replica_id, last_local_id) VALUES (?, ?)
+                                ON CONFLICT (replica_id) DO UPDATE SET last_local_id = excluded.last_local_id""",
+                             (self.replica_id, rows[-1][0]))
+            with self._lock:
+                self._conn.execute("DELETE FROM Pending_Logs WHERE local_id <= ?", (rows[-1][0],))
+                self._conn.execute("DELETE FROM Pending_Manifest WHERE local_id <= ?", (rows[-1][0],))
+                self._conn.commit()
+            uploaded += len(new_rows)
+            self.stats['rows_uploaded'] += len(new_rows)
+
+    # One pull and upload; failures mark the replica offline and are retried next time
+    def sync(self):
+        try:
+            self.pull()
+            self.upload()
+            self.online = True
+        except sqlite3.Error:
+            self.online = False
+            self.stats['sync_errors'] += 1
+            database.close_connection()
+        return self.online
+
+    def start_sync(self, interval_s=SYNC_INTERVAL_S):
+        if self._thread is not None:
+            return
+        def run():
+            while not self._stop.is_set():
+                self.sync()
+                self._stop.wait(interval_s)
+        self._thread = threading.Thread(target=run, name='replica-sync', daemon=True)
+        self._thread.start()
+
+    def stop_sync(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sync a terminal replica with the central database once.")
+    parser.add_argument('replica_path')
+    args = parser.parse_args()
+
+    replica = TerminalReplica(args.replica_path)
+    started = time.perf_counter()
+    online = replica.sync()
+    print(f"{'Synced' if online else 'Central database unreachable'} in {time.perf_counter() - started:.2f}s: "
+          f"last_seq={replica.last_seq} rows_pulled={replica.stats['rows_pulled']} "
+          f"uploaded={replica.stats['rows_uploaded']} pending={replica.pending_count()}")
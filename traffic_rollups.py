@@ -0,0 +1,148 @@
+import argparse
+import tkinter as tk
+from tkinter import ttk, messagebox
+from datetime import datetime
+import database
+import ui_worker
+
+# Who a Logs row belongs to
+USER_TYPE_SQL = """
+    CASE WHEN student_id IS NOT NULL THEN 'student'
+         WHEN staff_id IS NOT NULL THEN 'staff'
+         WHEN guest_id IS NOT NULL THEN 'guest'
+         ELSE 'other' END
+"""
+
+# Fold every Logs row past the watermark into the hourly rollup, then move the watermark.
+# Both statements run in one write transaction, so no row is counted twice or missed.
+CATCH_UP_SQL = f"""
+    INSERT INTO Traffic_Rollup (hour, gate_id, action, user_type, count)
+    SELECT strftime('%Y-%m-%d %H:00', timestamp), IFNULL(gate_id, 0), action, {USER_TYPE_SQL}, COUNT(*)
+    FROM Logs
+    WHERE log_id > (SELECT last_log_id FROM Rollup_Watermark WHERE id = 1)
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (hour, gate_id, action, user_type) DO UPDATE SET count = count + excluded.count
+"""
+ADVANCE_WATERMARK_SQL = """
+    UPDATE Rollup_Watermark SET last_log_id = MAX(last_log_id, IFNULL((SELECT MAX(log_id) FROM Logs), 0)) WHERE id = 1
+"""
+
+# Columns a report can be grouped by
+GROUP_COLUMNS = ('hour', 'gate_id', 'action', 'user_type')
+
+# Bring the rollup up to date; returns the number of hourly buckets touched
+def catch_up():
+    with database.transaction() as conn:
+        buckets = conn.execute(CATCH_UP_SQL).rowcount
+        conn.execute(ADVANCE_WATERMARK_SQL)
+    return buckets
+
+# Turn 'YYYY-MM-DD' or 'YYYY-MM-DD HH[:MM]' into an hour bucket key
+def parse_hour(text):
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d %H', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text.strip(), fmt).strftime('%Y-%m-%d %H:00')
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date or hour: {text}")
+
+# SQL and parameters for event counts between two hours (end exclusive), summed over
+# whichever columns are not in group_by
+def counts_query(hour_from=None, hour_to=None, gate_id=None, action=None, user_type=None, group_by=GROUP_COLUMNS):
+    clauses, params = [], []
+    if hour_from is not None:
+        clauses.append("hour >= ?")
+        params.append(hour_from)
+    if hour_to is not None:
+        clauses.append("hour < ?")
+        params.append(hour_to)
+    for column, value in (('gate_id', gate_id), ('action', action), ('user_type', user_type)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    for column in group_by:
+        if column not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {column}")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    if not group_by:
+        return f"SELECT IFNULL(SUM(count), 0) FROM Traffic_Rollup {where}", params
+    columns = ', '.join(group_by)
+    return f"SELECT {columns}, SUM(count) FROM Traffic_Rollup {where} GROUP BY {columns} ORDER BY {columns}", params
+
+# Event counts (see counts_query). Reads the rollup only, so the cost depends on the number of buckets.
+def traffic_counts(hour_from=None, hour_to=None, gate_id=None, action=None, user_type=None, group_by=GROUP_COLUMNS):
+    sql, params = counts_query(hour_from, hour_to, gate_id, action, user_type, group_by)
+    catch_up()
+    return database.fetch_all(sql, params)
+
+# Total number of events matching the filters
+def traffic_total(hour_from=None, hour_to=None, gate_id=None, action=None, user_type=None):
+    return traffic_counts(hour_from, hour_to, gate_id, action, user_type, group_by=())[0][0]
+
+# Window showing rollup counts for a range of hours
+class TrafficReport:
+    def __init__(self):
+        self.pending = None
+        self.window = tk.Toplevel()
+        self.window.title("Gate Traffic Report")
+
+        filter_frame = tk.Frame(self.window)
+        filter_frame.pack(fill='x', padx=5, pady=5)
+        filter_fields = [('hour_from', "From (YYYY-MM-DD [HH])"), ('hour_to', "To (YYYY-MM-DD [HH])"),
+                         ('gate_id', "Gate"), ('action', "Action"), ('user_type', "User type")]
+        self.filter_entries = {}
+        for column, (key, label) in enumerate(filter_fields):
+            tk.Label(filter_frame, text=label).grid(row=0, column=column, sticky='w')
+            entry = tk.Entry(filter_frame, width=18)
+            entry.grid(row=1, column=column, padx=2)
+            self.filter_entries[key] = entry
+        tk.Button(filter_frame, text="Apply", command=self.load).grid(row=1, column=len(filter_fields), padx=5)
+
+        self.tree = ttk.Treeview(self.window, columns=GROUP_COLUMNS + ('count',), show='headings', height=25)
+        for name in GROUP_COLUMNS + ('count',):
+            self.tree.heading(name, text=name)
+            self.tree.column(name, width=120, stretch=True)
+        self.tree.pack(expand=1, fill='both')
+        self.status_var = tk.StringVar()
+        tk.Label(self.window, textvariable=self.status_var).pack(anchor='e', padx=5)
+
+        self.load()
+
+    # Read the filters and show the matching buckets
+    def load(self):
+        filters = {key: entry.get().strip() or None for key, entry in self.filter_entries.items()}
+        try:
+            for key in ('hour_from', 'hour_to'):
+                if filters[key] is not None:
+                    filters[key] = parse_hour(filters[key])
+            if filters['gate_id'] is not None:
+                filters['gate_id'] = int(filters['gate_id'])
+        except ValueError:
+            messagebox.showerror("Error", "Use YYYY-MM-DD or YYYY-MM-DD HH for hours and a number for the gate.")
+            return
+        if self.pending is not None:
+            self.pending.cancel()
+        self.status_var.set("Loading...")
+        self.pending = ui_worker.submit(lambda: traffic_counts(**filters), on_done=self.show, description="Loading traffic report...")
+
+    # Render the buckets fetched by load
+    def show(self, rows):
+        self.pending = None
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', tk.END, values=row)
+        self.status_var.set(f"{sum(row[-1] for row in rows)} events in {len(rows)} buckets")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Update and query the hourly gate traffic rollup.")
+    parser.add_argument('--from', dest='hour_from', type=parse_hour)
+    parser.add_argument('--to', dest='hour_to', type=parse_hour)
+    parser.add_argument('--gate', dest='gate_id', type=int)
+    parser.add_argument('--action')
+    parser.add_argument('--user-type')
+    parser.add_argument('--group-by', default=','.join(GROUP_COLUMNS), help="comma separated, empty for a total")
+    args = parser.parse_args()
+
+    group_by = tuple(column for column in args.group_by.split(',') if column)
+    for row in traffic_counts(args.hour_from, args.hour_to, args.gate_id, args.action, args.user_type, group_by):
+        print(*row, sep='\t')
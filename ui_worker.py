@@ -0,0 +1,136 @@
+import queue
+import sqlite3
+import tkinter as tk
+from tkinter import ttk, messagebox
+from concurrent.futures import ThreadPoolExecutor
+import database
+
+# How often finished work is handed back to the Tk thread
+POLL_MS = 15
+
+# Work still running after this long gets a progress window with a Cancel button
+PROGRESS_DELAY_MS = 300
+
+# Database threads serving the UI's reads (each keeps its own pooled connection). Writes
+# run on one more thread of their own, one at a time in the order they were submitted,
+# so the last click wins (a Lockdown followed by Unlock always ends unlocked).
+WORKER_THREADS = 2
+
+# One piece of database work submitted from the UI
+class Task:
+    def __init__(self, worker, function, args, on_done, on_error, description):
+        self.worker = worker
+        self.function = function
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.description = description
+        self.cancelled = False
+        self.finished = False
+        self._conn = None
+
+    # Stop the task: skipped if not started yet, interrupted mid-query otherwise.
+    # Its callbacks are never run.
+    def cancel(self):
+        self.cancelled = True
+        conn = self._conn
+        if conn is not None:
+            conn.interrupt()
+
+    # Runs on a worker thread
+    def run(self):
+        if self.cancelled:
+            outcome = ('cancelled', None)
+        else:
+            self._conn = database.get_connection()
+            try:
+                outcome = ('done', self.function(*self.args))
+            except sqlite3.OperationalError as error:
+                outcome = ('cancelled', None) if self.cancelled else ('error', error)
+            except Exception as error:
+                outcome = ('error', error)
+            finally:
+                self._conn = None
+        self.worker.results.put((self, outcome))
+
+# Runs database work on background threads and delivers results on the Tk thread via root.after
+class DatabaseWorker:
+    def __init__(self, root, threads=WORKER_THREADS):
+        self.root = root
+        self.results = queue.Queue()
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='ui-db')
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='ui-db-write')
+        self._progress = {}
+        self.root.after(POLL_MS, self._poll)
+
+    def submit(self, function, *args, on_done=None, on_error=None, description=None, write=False):
+        task = Task(self, function, args, on_done, on_error, description)
+        (self._writer if write else self._executor).submit(task.run)
+        if description:
+            self.root.after(PROGRESS_DELAY_MS, lambda: self._show_progress(task))
+        return task
+
+    def _poll(self):
+        # Reschedule first: a callback may open a modal dialog
+        self.root.after(POLL_MS, self._poll)
+        while True:
+            try:
+                task, (kind, value) = self.results.get_nowait()
+            except queue.Empty:
+                return
+            task.finished = True
+            self._hide_progress(task)
+            if kind == 'cancelled' or task.cancelled:
+                continue
+            if kind == 'error':
+                if task.on_error is not None:
+                    task.on_error(value)
+                else:
+                    messagebox.showerror("Database Error", str(value))
+            elif task.on_done is not None:
+                task.on_done(value)
+
+    def _show_progress(self, task):
+        if task.finished or task.cancelled:
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Working")
+        window.resizable(False, False)
+        tk.Label(window, text=task.description).pack(padx=20, pady=(15, 5))
+        bar = ttk.Progressbar(window, mode='indeterminate', length=220)
+        bar.pack(padx=20, pady=5)
+        bar.start(15)
+        tk.Button(window, text="Cancel", command=lambda: (task.cancel(), self._hide_progress(task))).pack(pady=(5, 15))
+        window.protocol('WM_DELETE_WINDOW', lambda: (task.cancel(), self._hide_progress(task)))
+        self._progress[task] = window
+
+    def _hide_progress(self, task):
+        window = self._progress.pop(task, None)
+        if window is not None:
+            window.destroy()
+
+_worker = None
+
+# Start delivering background results to this Tk root
+def start(root):
+    global _worker
+    _worker = DatabaseWorker(root)
+    return _worker
+
+# Run function(*args) off the UI thread and pass the result to on_done (or the exception to
+# on_error) on the UI thread. Pass write=True for work that changes the database, so writes
+# commit in the order they were submitted. Without a started worker (scripts, benchmarks)
+# it runs inline.
+def submit(function, *args, on_done=None, on_error=None, description=None, write=False):
+    if _worker is not None:
+        return _worker.submit(function, *args, on_done=on_done, on_error=on_error, description=description, write=write)
+    try:
+        result = function(*args)
+    except Exception as error:
+        if on_error is None:
+            raise
+        on_error(error)
+        return None
+    if on_done is not None:
+        on_done(result)
+    return None